@@ -25,23 +25,46 @@ ROTATE = 0
 # Netzwerk-Interfaces in Priorität
 PREFERRED_IFACES = ("wlan0", "eth0")
 
+# APRS-Stationen in der Nähe (shari_aprs mit [RECEIVE] ENABLED=true)
+#   None  -> Seite ausblenden
+APRS_SOCKET = "/tmp/shari_aprs.sock"
+APRS_RADIUS_KM = 50
+
+# Wie oft ein Wert neu gelesen wird (Sekunden), dazwischen wird der letzte Wert angezeigt
+SAMPLE_TTL = {
+    "net": 5,      # Interface, IP, Status
+    "wifi": 2,     # SSID, Signal, Bitrate (nl80211; ohne nl80211 startet jedes Lesen "iw")
+    "load": 1,
+    "temp": 5,
+    "uptime": 30,
+    "mem": 5,
+    "disk": 60,
+    "aprs": 10,
+}
+
 # ==================================================
 # AB HIER KEINE ÄNDERUNGEN MEHR !!
 # ==================================================
 
+import sys
 import time
 import socket
 import fcntl
+import errno
+import json
+import os
+import select
 import struct
 import shutil
 import subprocess
 from datetime import datetime
-from typing import Optional, Iterable, Tuple
+from collections import namedtuple
+from typing import Any, Callable, Optional, Iterable, Tuple
 
 from luma.core.interface.serial import i2c
 from luma.oled.device import sh1106
 from luma.core.render import canvas
-from PIL import ImageFont
+from PIL import Image, ImageDraw, ImageFont
 
 
 def get_iface_ipv4(ifname: str) -> Optional[str]:
@@ -140,21 +163,359 @@ def get_uptime_short() -> str:
         return "?"
 
 
-def get_wlan_ssid() -> Optional[str]:
+WifiLink = namedtuple("WifiLink", "ssid signal_dbm tx_mbit freq_mhz")
+
+
+def parse_iw_link(text: str) -> Optional[WifiLink]:
+    # Ausgabe von "iw dev wlan0 link" (Rückfall ohne nl80211)
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.strip().partition(":")
+        values[key] = value.strip()
+    if "SSID" not in values:
+        return None
+
+    def number(key):
+        try:
+            return float(values.get(key, "").split()[0])
+        except (IndexError, ValueError):
+            return None
+
+    signal, tx, freq = number("signal"), number("tx bitrate"), number("freq")
+    return WifiLink(values["SSID"], None if signal is None else int(signal), tx,
+                    None if freq is None else int(freq))
+
+
+def get_wlan_link_iw(ifname: str = "wlan0") -> Optional[WifiLink]:
     try:
-        res = subprocess.run(
-            ["iw", "dev", "wlan0", "link"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True,
-            timeout=0.5,
-        )
-        for line in res.stdout.splitlines():
-            if "SSID:" in line:
-                return line.split("SSID:", 1)[1].strip()
+        res = subprocess.run(["iw", "dev", ifname, "link"], stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, text=True, timeout=0.5)
+        return parse_iw_link(res.stdout)
     except Exception:
-        pass
-    return None
+        return None
+
+
+class Nl80211:
+    # WLAN-Status direkt vom Kernel (Generic Netlink, wie "iw"), ohne Prozess zu starten
+    NETLINK_GENERIC = 16  # fehlt im socket-Modul
+    GENL_ID_CTRL, CTRL_CMD_GETFAMILY = 0x10, 3
+    CTRL_ATTR_FAMILY_ID, CTRL_ATTR_FAMILY_NAME = 1, 2
+    NL80211_CMD_GET_INTERFACE, NL80211_CMD_GET_STATION = 5, 17
+    NL80211_ATTR_IFINDEX, NL80211_ATTR_STA_INFO = 3, 21
+    NL80211_ATTR_WIPHY_FREQ, NL80211_ATTR_SSID = 38, 52
+    STA_INFO_SIGNAL, STA_INFO_TX_BITRATE, STA_INFO_SIGNAL_AVG = 7, 8, 13
+    RATE_INFO_BITRATE, RATE_INFO_BITRATE32 = 1, 5  # in 100 kbit/s
+
+    def __init__(self, family: str = "nl80211"):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, self.NETLINK_GENERIC)
+        self.sock.settimeout(0.2)
+        self._seq = 0
+        try:
+            reply = self.request(self.GENL_ID_CTRL, self.CTRL_CMD_GETFAMILY,
+                                 {self.CTRL_ATTR_FAMILY_NAME: family.encode() + b"\0"})
+            self.family = struct.unpack("=H", reply[0][self.CTRL_ATTR_FAMILY_ID][:2])[0]
+        except (OSError, IndexError, KeyError):
+            self.sock.close()
+            raise
+
+    def request(self, family: int, cmd: int, attrs: dict, dump: bool = False) -> list:
+        # Eine Anfrage, liefert die Attribute jeder Antwort; OSError bei Fehlermeldung des Kernels
+        payload = b""
+        for kind, value in attrs.items():
+            payload += struct.pack("=HH", 4 + len(value), kind) + value
+            payload += b"\0" * (-len(value) % 4)
+        self._seq += 1
+        flags = 0x301 if dump else 0x5  # REQUEST|DUMP bzw. REQUEST|ACK
+        body = struct.pack("=BBH", cmd, 1, 0) + payload
+        self.sock.send(struct.pack("=LHHLL", 16 + len(body), family, flags, self._seq, 0) + body)
+        replies = []
+        while True:
+            data = self.sock.recv(65536)
+            offset = 0
+            while offset + 16 <= len(data):
+                length, kind, _, seq, _ = struct.unpack_from("=LHHLL", data, offset)
+                if length < 16:
+                    break
+                if seq == self._seq:
+                    if kind == 2:  # NLMSG_ERROR: 0 = ACK
+                        error = struct.unpack_from("=i", data, offset + 16)[0]
+                        if error:
+                            raise OSError(-error, os.strerror(-error))
+                        return replies
+                    if kind == 3:  # NLMSG_DONE
+                        return replies
+                    replies.append(nl_attrs(data, offset + 20, offset + length))
+                    if not dump:
+                        return replies
+                offset += (length + 3) & ~3
+
+    @classmethod
+    def parse(cls, interface: dict, station: Optional[dict]) -> Optional[WifiLink]:
+        # Antworten von GET_INTERFACE und GET_STATION -> WifiLink, None wenn nicht verbunden
+        ssid = interface.get(cls.NL80211_ATTR_SSID)
+        if not ssid:
+            return None
+        freq = interface.get(cls.NL80211_ATTR_WIPHY_FREQ)
+        signal = tx = None
+        if station is not None and cls.NL80211_ATTR_STA_INFO in station:
+            raw = station[cls.NL80211_ATTR_STA_INFO]
+            info = nl_attrs(raw, 0, len(raw))
+            level = info.get(cls.STA_INFO_SIGNAL) or info.get(cls.STA_INFO_SIGNAL_AVG)
+            if level:
+                signal = struct.unpack("=b", level[:1])[0]
+            if cls.STA_INFO_TX_BITRATE in info:
+                raw = info[cls.STA_INFO_TX_BITRATE]
+                rate = nl_attrs(raw, 0, len(raw))
+                if cls.RATE_INFO_BITRATE32 in rate:
+                    tx = struct.unpack("=I", rate[cls.RATE_INFO_BITRATE32][:4])[0] / 10
+                elif cls.RATE_INFO_BITRATE in rate:
+                    tx = struct.unpack("=H", rate[cls.RATE_INFO_BITRATE][:2])[0] / 10
+        return WifiLink(ssid.decode("utf-8", errors="replace"), signal, tx,
+                        struct.unpack("=I", freq[:4])[0] if freq else None)
+
+    def link(self, ifname: str = "wlan0") -> Optional[WifiLink]:
+        index = {self.NL80211_ATTR_IFINDEX: struct.pack("=I", socket.if_nametoindex(ifname))}
+        interface = self.request(self.family, self.NL80211_CMD_GET_INTERFACE, index)
+        if not interface:
+            return None
+        # Als Client gibt es genau eine Station: den Access Point
+        stations = self.request(self.family, self.NL80211_CMD_GET_STATION, index, dump=True)
+        return self.parse(interface[0], stations[0] if stations else None)
+
+
+_nl80211 = None
+
+
+def get_wifi_link(ifname: str = "wlan0") -> Optional[WifiLink]:
+    # nl80211 wenn möglich, sonst (altes Kernel/kein Zugriff) wie bisher über "iw"
+    global _nl80211
+    if _nl80211 is None:
+        try:
+            _nl80211 = Nl80211()
+        except OSError:
+            _nl80211 = False
+    if _nl80211 is False:
+        return get_wlan_link_iw(ifname)
+    try:
+        return _nl80211.link(ifname)
+    except OSError:
+        return None
+
+
+def get_net_status() -> Tuple[str, str, str]:
+    iface = pick_iface(PREFERRED_IFACES)
+    ip = get_iface_ipv4(iface) or "no IP"
+    status = "UP" if iface_up(iface) else "DOWN"
+    return iface, ip, status
+
+
+def nl_attrs(data, offset: int, end: int) -> dict:
+    # Netlink-Attribute (rtattr/nlattr: Länge, Typ, Daten, auf 4 Byte ausgerichtet)
+    attrs = {}
+    while offset + 4 <= end:
+        length, kind = struct.unpack_from("=HH", data, offset)
+        if length < 4:
+            break
+        attrs[kind & 0x3FFF] = data[offset + 4:offset + length]  # ohne NESTED/BYTEORDER-Bit
+        offset += (length + 3) & ~3
+    return attrs
+
+
+class NetlinkIfaces:
+    # Interface-Tabelle aus rtnetlink-Ereignissen des Kernels (Link up/down, IPv4-Adressen).
+    # Ersetzt das Abfragen per ioctl/sysfs: nach dem ersten Abzug kommen nur noch Änderungen.
+    RTMGRP_LINK = 0x1
+    RTMGRP_IPV4_IFADDR = 0x10
+    NLMSG_ERROR, NLMSG_DONE = 2, 3
+    RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+    RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+    IFLA_IFNAME, IFLA_OPERSTATE = 3, 16
+    IFA_ADDRESS, IFA_LOCAL = 1, 2
+    # IF_OPER_UNKNOWN, IF_OPER_DORMANT, IF_OPER_UP (wie iface_up(): unknown/dormant/up)
+    OPER_UP = (0, 5, 6)
+
+    _NLMSG = struct.Struct("=LHHLL")
+    _IFINFO = struct.Struct("=BxHiII")
+    _IFADDR = struct.Struct("=BBBBI")
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 256 * 1024)
+            self.sock.bind((0, self.RTMGRP_LINK | self.RTMGRP_IPV4_IFADDR))
+            self.links = {}  # Index -> [Name, Operstate]
+            self.addrs = {}  # Index -> [IPv4, ...] in Reihenfolge des Kernels
+            self.events = 0
+            self._seq = 0
+            self.resync()
+        except OSError:
+            self.sock.close()
+            raise
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def resync(self) -> None:
+        # Vollständiger Abzug (Start oder nach verlorenen Ereignissen, ENOBUFS)
+        self.links.clear()
+        self.addrs.clear()
+        self.sock.setblocking(True)
+        self.sock.settimeout(2)
+        try:
+            for msg_type, family in ((self.RTM_GETLINK, socket.AF_UNSPEC),
+                                     (self.RTM_GETADDR, socket.AF_INET)):
+                self._seq += 1
+                self.sock.send(self._NLMSG.pack(self._NLMSG.size + 4, msg_type, 0x301, self._seq, 0)
+                               + struct.pack("=Bxxx", family))
+                while not self._handle(self.sock.recv(65536), self._seq):
+                    pass
+        finally:
+            self.sock.setblocking(False)
+
+    def _handle(self, data, dump_seq=None) -> bool:
+        # Verarbeitet einen Block Nachrichten, True = Ende des Abzugs dump_seq erreicht
+        offset = 0
+        done = False
+        while offset + 16 <= len(data):
+            length, kind, _, seq, _ = self._NLMSG.unpack_from(data, offset)
+            if length < 16:
+                break
+            body, end = offset + 16, offset + length
+            if kind == self.NLMSG_DONE or kind == self.NLMSG_ERROR:
+                done = done or seq == dump_seq
+            elif kind in (self.RTM_NEWLINK, self.RTM_DELLINK):
+                _, _, index, _, _ = self._IFINFO.unpack_from(data, body)
+                if kind == self.RTM_DELLINK:
+                    self.links.pop(index, None)
+                    self.addrs.pop(index, None)
+                else:
+                    attrs = nl_attrs(data, body + self._IFINFO.size, end)
+                    name = attrs.get(self.IFLA_IFNAME, b"").split(b"\0", 1)[0].decode()
+                    oper = attrs[self.IFLA_OPERSTATE][0] if self.IFLA_OPERSTATE in attrs else 0
+                    self.links[index] = [name, oper]
+            elif kind in (self.RTM_NEWADDR, self.RTM_DELADDR):
+                family, _, _, _, index = self._IFADDR.unpack_from(data, body)
+                attrs = nl_attrs(data, body + self._IFADDR.size, end)
+                raw = attrs.get(self.IFA_LOCAL, attrs.get(self.IFA_ADDRESS))
+                if family == socket.AF_INET and raw and len(raw) == 4:
+                    ip = socket.inet_ntoa(raw)
+                    addrs = self.addrs.setdefault(index, [])
+                    if kind == self.RTM_DELADDR:
+                        if ip in addrs:
+                            addrs.remove(ip)
+                    elif ip not in addrs:
+                        addrs.append(ip)
+            offset += (length + 3) & ~3
+            self.events += 1
+        return done
+
+    def poll(self) -> bool:
+        # Alle anstehenden Ereignisse lesen (nicht blockierend), True wenn etwas kam
+        changed = False
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return changed
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                self.resync()  # Puffer übergelaufen: Ereignisse verloren
+                return True
+            self._handle(data)
+            changed = True
+
+    def _index(self, ifname: str) -> Optional[int]:
+        for index, (name, _) in self.links.items():
+            if name == ifname:
+                return index
+        return None
+
+    def ipv4(self, ifname: str) -> Optional[str]:
+        addrs = self.addrs.get(self._index(ifname))
+        return addrs[0] if addrs else None
+
+    def is_up(self, ifname: str) -> bool:
+        index = self._index(ifname)
+        return index is not None and self.links[index][1] in self.OPER_UP
+
+    def pick(self, preferred: Iterable[str]) -> str:
+        # Gleiche Auswahl wie pick_iface()
+        for ifn in preferred:
+            if self.ipv4(ifn):
+                return ifn
+        for ifn in preferred:
+            if self.is_up(ifn):
+                return ifn
+        return preferred[0]
+
+    def get(self, now: float = 0.0) -> Tuple[str, str, str]:
+        # Wie Sampler.get(): (Interface, IP, Status) ohne Systemaufruf
+        iface = self.pick(PREFERRED_IFACES)
+        return iface, self.ipv4(iface) or "no IP", "UP" if self.is_up(iface) else "DOWN"
+
+
+def open_netlink() -> Optional[NetlinkIfaces]:
+    try:
+        return NetlinkIfaces()
+    except (OSError, AttributeError):  # kein Linux oder keine Rechte: abfragen wie bisher
+        return None
+
+
+class Sampler:
+    # Ein Messwert mit eigener Abtastzeit (TTL). Schlägt das Lesen fehl (Ergebnis == failed),
+    # bleibt der letzte gute Wert stehen, bis er älter als stale_after ist; dann failed.
+    def __init__(self, fn: Callable[[], Any], ttl: float, failed: Any = None,
+                 stale_after: Optional[float] = None):
+        self.fn = fn
+        self.ttl = ttl
+        self.failed = failed
+        self.stale_after = 3 * ttl if stale_after is None else stale_after
+        self.value = failed
+        self.sampled = None  # Zeitpunkt des letzten Lesens
+        self.good = None  # Zeitpunkt des letzten gültigen Werts
+
+    def get(self, now: float) -> Any:
+        if self.sampled is None or now - self.sampled >= self.ttl:
+            self.sampled = now
+            try:
+                value = self.fn()
+            except Exception:
+                value = self.failed
+            if value != self.failed:
+                self.value, self.good = value, now
+        if self.good is None or now - self.good > self.stale_after:
+            return self.failed
+        return self.value
+
+
+def make_samplers() -> dict:
+    ttl = SAMPLE_TTL
+    return {
+        "net": Sampler(get_net_status, ttl["net"]),
+        # Nicht verbunden (None) wird sofort angezeigt, kein Weiterzeigen eines alten Netzes
+        "wifi": Sampler(get_wifi_link, ttl["wifi"], stale_after=ttl["wifi"]),
+        "load": Sampler(get_load1, ttl["load"], failed="?"),
+        "temp": Sampler(get_cpu_temp_c, ttl["temp"]),
+        "uptime": Sampler(get_uptime_short, ttl["uptime"], failed="?"),
+        "mem": Sampler(get_mem_usage, ttl["mem"], failed=("?", "?", "?")),
+        "disk": Sampler(get_root_disk_usage, ttl["disk"], failed=("?", "?", "?")),
+        "aprs": Sampler(lambda: get_aprs_nearby(APRS_SOCKET, APRS_RADIUS_KM), ttl["aprs"],
+                        stale_after=ttl["aprs"]),
+    }
+
+
+def get_aprs_nearby(path: str, radius_km: float, limit: int = 3) -> Optional[list]:
+    # Fragt shari_aprs über den Unix-Socket ab, None wenn der Dienst nicht läuft
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(0.5)
+            s.connect(path)
+            s.sendall(f"nearby {radius_km} {limit}\n".encode())
+            reply = json.loads(s.makefile("r", encoding="utf-8").readline())
+        return reply.get("stations", [])
+    except (OSError, ValueError):
+        return None
 
 
 def load_font(size: int) -> ImageFont.ImageFont:
@@ -177,6 +538,159 @@ def draw_page(device, font, lines, line_h):
             y += line_h
 
 
+class GlyphAtlas:
+    # Jedes Zeichen wird nur einmal von FreeType gerastert (ASCII beim Start, Rest beim ersten
+    # Auftreten) und danach als 1-Bit-Maske ins Bild kopiert. Nur für Festbreiten-Schrift mit
+    # ganzzahligem Vorschub: dann liegt jedes Zeichen dort, wo draw.text es hinsetzen würde.
+    # Pillow setzt manche Zeichen im Text anders als allein (z.B. Blockzeichen, die die ganze
+    # Zeilenhöhe füllen, verschieben die übrigen Zeichen um ein Pixel). Jedes Zeichen wird daher
+    # beim Rastern neben PROBE-Zeichen mit draw.text verglichen; Zeilen mit Zeichen, bei denen
+    # das nicht stimmt, zeichnet weiter draw.text.
+    PROBE = " !Mgj_|"
+
+    def __init__(self, font):
+        self.font = font
+        self.advance = int(font.getlength("M"))
+        size = getattr(font, "size", 12)
+        self._pad = 2 * size  # Platz für Überhänge (negativer Abstand, Blockzeichen)
+        self._cell = (self.advance + 4 * size, 4 * size)
+        self.glyphs = {}
+        self.irregular = set()
+        for code in range(32, 127):
+            self.glyph(chr(code))
+
+    @classmethod
+    def for_font(cls, font) -> Optional["GlyphAtlas"]:
+        try:
+            widths = {font.getlength(chr(c)) for c in range(32, 127)}
+            advance = widths.pop()
+            if widths or advance != int(advance) or advance <= 0 \
+                    or font.getlength("Wi.M") != 4 * advance:
+                return None  # Proportionalschrift (z.B. Ersatzschrift): weiter draw.text
+        except Exception:
+            return None
+        return cls(font)
+
+    def _raster(self, ch):
+        # Zeichen wie bei draw.text zeichnen und auf die gesetzten Pixel zuschneiden;
+        # left ist der negative Abstand links, den Pillow nur beim ersten Zeichen einer Zeile
+        # anwendet und danach für alle folgenden Zeichen übernimmt
+        cell = Image.new("1", self._cell)
+        ImageDraw.Draw(cell).text((self._pad, self._pad), ch, font=self.font, fill=255)
+        box = cell.getbbox()
+        if box is None:
+            return None  # Leerzeichen oder Zeichen ohne Pixel
+        left = min(0, self.font.getmask2(ch, "1")[1][0])
+        return box[0] - self._pad, box[1] - self._pad, left, cell.crop(box)
+
+    def glyph(self, ch):
+        if ch in self.glyphs:
+            return self.glyphs[ch]
+        g = self.glyphs[ch] = self._raster(ch)
+        if g is not None:
+            size = (self._cell[0] + self.advance, self._cell[1])
+            for probe in self.PROBE:
+                for text in (probe + ch, ch + probe):
+                    expected, composed = Image.new("1", size), Image.new("1", size)
+                    ImageDraw.Draw(expected).text((self._pad, self._pad), text,
+                                                  font=self.font, fill=255)
+                    self._compose(composed, (self._pad, self._pad), text)
+                    if expected.tobytes() != composed.tobytes():
+                        self.irregular.add(ch)
+                        return g
+        return g
+
+    def _compose(self, image, xy, text):
+        x, y = xy
+        shift = None
+        for ch in text:
+            g = self.glyphs[ch] if ch in self.glyphs else self.glyph(ch)
+            if g is not None:
+                dx, dy, left, mask = g
+                if shift is None:
+                    shift = left
+                else:
+                    dx += shift - left
+                image.paste(255, (x + dx, y + dy, x + dx + mask.width, y + dy + mask.height), mask)
+            elif shift is None:
+                shift = 0
+            x += self.advance
+
+    def text(self, image, xy, text) -> bool:
+        # Wie draw.text(xy, text, fill=255) auf einem Bild im Modus "1": nur Pixel setzen.
+        # False (nichts gezeichnet), wenn die Zeile ein unregelmäßiges Zeichen enthält.
+        for ch in text:
+            if ch not in self.glyphs:
+                self.glyph(ch)
+            if ch in self.irregular:
+                return False
+        self._compose(image, xy, text)
+        return True
+
+
+class FrameDiff:
+    # Wie draw_page, aber nur Geändertes über I2C: gleiche Zeilen -> kein Zeichnen, kein Bus;
+    # sonst je SH1106-Page (8 Pixelzeilen) nur der Spaltenbereich, der sich geändert hat
+    def __init__(self, device, font, line_h):
+        self.device = device
+        self.font = font
+        self.line_h = line_h
+        self.image = Image.new(device.mode, device.size)
+        self.draw = ImageDraw.Draw(self.image)
+        self.atlas = GlyphAtlas.for_font(font)
+        self.offset = getattr(device, "_page_address_offset", 0x02)
+        self._lines = None
+        self._pages = [None] * (device.height // 8)
+        self.bytes_sent = 0
+        self.frames = self.skipped = 0
+
+    def pages(self, image) -> list:
+        # Bild -> Page-Bytes wie sh1106.display (Bit 0 = oberste Zeile der Page):
+        # gespiegelt und transponiert liefert tobytes() je Spalte alle Pages, unterste zuerst
+        image = self.device.preprocess(image)
+        data = image.transpose(Image.FLIP_TOP_BOTTOM).transpose(Image.TRANSPOSE).tobytes()
+        n = len(self._pages)
+        return [data[n - 1 - p::n] for p in range(n)]
+
+    def render(self, lines):
+        self.draw.rectangle((0, 0) + self.image.size, fill=0)
+        y = 0
+        for l in lines:
+            if self.atlas is None or not self.atlas.text(self.image, (0, y), l):
+                self.draw.text((0, y), l, font=self.font, fill=255)
+            y += self.line_h
+
+    def show(self, lines) -> int:
+        # Liefert die Anzahl gesendeter Bytes (Kommandos + Daten), 0 wenn nichts geändert
+        self.frames += 1
+        lines = tuple(lines)
+        if lines == self._lines:
+            self.skipped += 1
+            return 0
+        self._lines = lines
+        self.render(lines)
+        sent = 0
+        for p, new in enumerate(self.pages(self.image)):
+            old = self._pages[p]
+            if old == new:
+                continue
+            first, last = 0, len(new)
+            if old is not None:
+                while new[first] == old[first]:
+                    first += 1
+                while new[last - 1] == old[last - 1]:
+                    last -= 1
+            column = self.offset + first
+            self.device.command(0xB0 + p, column & 0x0F, 0x10 | column >> 4)
+            self.device.data(list(new[first:last]))
+            self._pages[p] = new
+            sent += 3 + last - first
+        if not sent:
+            self.skipped += 1
+        self.bytes_sent += sent
+        return sent
+
+
 def page1(title, iface, status, ip, ssid, now):
     return [
         f"{title[:16]} {now}",
@@ -205,6 +719,77 @@ def page3(title, ram_u, ram_t, disk_u, disk_t):
     ]
 
 
+def page4(title, stations):
+    points = "N NO O SO S SW W NW".split()
+    lines = [f"APRS {title}"[:21]]
+    for st in (stations or [])[:3]:
+        direction = points[int((st["bearing"] + 22.5) // 45) % 8]
+        lines.append(f"{st['name'][:9]:9} {st['dist_km']:4.1f}km {direction}"[:21])
+    if stations is None:
+        lines.append("shari_aprs ?")
+    elif not stations:
+        lines.append("keine Stationen")
+    return (lines + ["", "", ""])[:4]
+
+
+def wifi_channel(freq: int) -> Optional[int]:
+    if freq == 2484:
+        return 14
+    if 2412 <= freq < 2484:
+        return (freq - 2407) // 5
+    if 5000 <= freq < 5900:
+        return (freq - 5000) // 5
+    return None
+
+
+def page5(link):
+    if link is None:
+        return ["WLAN", "nicht verbunden", "", ""]
+    lines = [f"WLAN {link.ssid}"[:21]]
+    if link.signal_dbm is not None:
+        # -90 dBm (kaum nutzbar) bis -30 dBm (sehr gut) auf 12 Balkenstücke
+        bars = max(0, min(12, round((link.signal_dbm + 90) * 12 / 60)))
+        lines.append(f"{'█' * bars}{'░' * (12 - bars)} {link.signal_dbm}dBm"[:21])
+    else:
+        lines.append("Signal ?")
+    lines.append(f"TX {link.tx_mbit:.1f} MBit/s"[:21] if link.tx_mbit is not None else "TX ?")
+    if link.freq_mhz:
+        channel = wifi_channel(link.freq_mhz)
+        lines.append(f"{link.freq_mhz} MHz" + (f" Kanal {channel}" if channel else ""))
+    else:
+        lines.append("")
+    return lines
+
+
+def page_names() -> list:
+    names = ["net", "sys", "mem"]
+    if os.path.exists("/sys/class/net/wlan0"):
+        names.append("wifi")
+    if APRS_SOCKET and os.path.exists(APRS_SOCKET):
+        names.append("aprs")
+    return names
+
+
+def page_lines(page, title, samples, now):
+    # Nur die Werte der angezeigten Seite werden abgefragt, jeweils aus dem Cache
+    if page == "net":
+        iface, ip, status = samples["net"].get(now) or (PREFERRED_IFACES[0], "no IP", "DOWN")
+        link = samples["wifi"].get(now) if iface == "wlan0" else None
+        return page1(title, iface, status, ip, link.ssid if link else None,
+                     datetime.now().strftime("%H:%M"))
+    if page == "wifi":
+        return page5(samples["wifi"].get(now))
+    if page == "sys":
+        return page2(title, samples["load"].get(now), samples["temp"].get(now),
+                     samples["uptime"].get(now), samples["mem"].get(now)[2],
+                     samples["disk"].get(now)[2])
+    if page == "mem":
+        ram_u, ram_t, _ = samples["mem"].get(now)
+        disk_u, disk_t, _ = samples["disk"].get(now)
+        return page3(title, ram_u, ram_t, disk_u, disk_t)
+    return page4(title, samples["aprs"].get(now))
+
+
 def main():
     font_size = max(8, int(FONT_SIZE))
     line_h = max(font_size + 2, int(LINE_H))
@@ -212,39 +797,313 @@ def main():
     serial = i2c(port=I2C_PORT, address=I2C_ADDRESS)
     device = sh1106(serial, rotate=ROTATE)
     font = load_font(font_size)
+    frame = FrameDiff(device, font, line_h)
 
     title = DISPLAY_NAME if DISPLAY_NAME else get_hostname()
+    samples = make_samplers()
+    netlink = open_netlink()
+    if netlink is not None:
+        samples["net"] = netlink
 
     page = 0
     last = time.monotonic()
 
     while True:
+        pages = page_names()
+
         if time.monotonic() - last >= PAGE_SECONDS:
-            page = (page + 1) % 3
+            page = (page + 1) % len(pages)
             last = time.monotonic()
+        page %= len(pages)
+
+        lines = page_lines(pages[page], title, samples, time.monotonic())
+        frame.show(lines)
+
+        if netlink is None:
+            time.sleep(REFRESH_SECONDS)
+            continue
+        # Auf Kernel-Ereignisse warten: neues Interface bzw. neue IP sofort anzeigen
+        shown = netlink.get()
+        deadline = time.monotonic() + REFRESH_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([netlink], [], [], remaining)
+            if readable and netlink.poll() and netlink.get() != shown:
+                break
+
+
+def _cpu() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
 
+def bench(cycles: int = 3000) -> None:
+    # CPU pro Aktualisierung ohne Display: alle Werte jede Sekunde (bisher) gegen Cache.
+    # wlan0 wird immer gewählt, damit "iw" wie am Pi jede Sekunde gestartet wird.
+    global PREFERRED_IFACES
+    PREFERRED_IFACES = ("wlan0",)
+    title = "BENCH"
+    names = ("net", "sys", "mem", "wifi")
+
+    def uncached(page):
         iface = pick_iface(PREFERRED_IFACES)
         ip = get_iface_ipv4(iface) or "no IP"
         status = "UP" if iface_up(iface) else "DOWN"
-        ssid = get_wlan_ssid() if iface == "wlan0" else None
-
-        load1 = get_load1()
-        temp = get_cpu_temp_c()
-        uptime = get_uptime_short()
+        link = get_wlan_link_iw() if iface == "wlan0" else None
+        load1, temp, uptime = get_load1(), get_cpu_temp_c(), get_uptime_short()
         ram_u, ram_t, ram_p = get_mem_usage()
         disk_u, disk_t, disk_p = get_root_disk_usage()
         now = datetime.now().strftime("%H:%M")
+        if page == "net":
+            return page1(title, iface, status, ip, link.ssid if link else None, now)
+        if page == "sys":
+            return page2(title, load1, temp, uptime, ram_p, disk_p)
+        if page == "mem":
+            return page3(title, ram_u, ram_t, disk_u, disk_t)
+        return page5(link)
+
+    samples = make_samplers()
+    for name, render in (("bisher", uncached),
+                         ("Cache ", lambda page: page_lines(page, title, samples, clock))):
+        cpu0, wall0 = _cpu(), time.perf_counter()
+        for i in range(cycles):
+            clock = float(i)  # simulierte Sekunde, Seitenwechsel alle PAGE_SECONDS
+            render(names[(i // PAGE_SECONDS) % len(names)])
+        cpu = (_cpu() - cpu0) / cycles
+        wall = (time.perf_counter() - wall0) / cycles
+        print(f"{name}: CPU {cpu * 1e6:7.0f} µs, Laufzeit {wall * 1e6:7.0f} µs pro Aktualisierung "
+              f"({cycles} Sekunden simuliert)")
+
+    # Ausgabe: volles Bild je Aktualisierung (bisher) gegen FrameDiff, gleiche Zeilenfolge
+    font_size = max(8, int(FONT_SIZE))
+    line_h = max(font_size + 2, int(LINE_H))
+    font = load_font(font_size)
+    samples = make_samplers()
+    frames = [page_lines(names[(i // PAGE_SECONDS) % len(names)], title, samples, float(i))
+              for i in range(cycles)]
+    full_bus, diff_bus = _Sh1106Ram(), _Sh1106Ram()
+    full, diff = sh1106(full_bus), FrameDiff(sh1106(diff_bus), font, line_h)
+    for bus in (full_bus, diff_bus):
+        bus.bytes = bus.transfers = 0  # Initialisierung nicht mitzählen
+    for name, bus, show in (("bisher", full_bus, lambda lines: draw_page(full, font, lines, line_h)),
+                            ("Diff  ", diff_bus, diff.show)):
+        cpu0, wall0 = _cpu(), time.perf_counter()
+        for lines in frames:
+            show(lines)
+        cpu = (_cpu() - cpu0) / cycles
+        wall = (time.perf_counter() - wall0) / cycles
+        per_frame = bus.bytes / cycles
+        # I2C mit 100 kHz: 9 Takte pro Byte, dazu Adresse/Steuerbyte je Übertragung
+        bus_ms = (bus.bytes + 2 * bus.transfers) * 9 / 100e3 / cycles * 1e3
+        print(f"Frame {name}: CPU {cpu * 1e6:6.0f} µs, Laufzeit {wall * 1e6:6.0f} µs, "
+              f"{per_frame:6.1f} Bytes ({bus_ms:5.2f} ms I2C bei 100 kHz) pro Aktualisierung")
+    print(f"FrameDiff: {diff.skipped} von {diff.frames} Frames ohne Übertragung")
+
+    # Nur Text zeichnen (jeder Frame, ohne Diff): draw.text gegen Glyphen-Atlas
+    atlas = diff.atlas
+    for name, use in (("draw.text", None), ("Atlas    ", atlas)):
+        diff.atlas = use
+        t0 = time.perf_counter()
+        for lines in frames:
+            diff.render(lines)
+        wall = (time.perf_counter() - t0) / cycles
+        print(f"Text {name}: {wall * 1e6:6.0f} µs pro Frame")
+    diff.atlas = atlas
+    if atlas is not None:
+        t0 = time.perf_counter()
+        GlyphAtlas(font)
+        print(f"Atlas: {len(atlas.glyphs)} Zeichen, Aufbau {(time.perf_counter() - t0) * 1e3:.0f} ms, "
+              f"per draw.text: {''.join(sorted(atlas.irregular))}")
+
+    # WLAN-Abfrage allein: Dauer verschiebt den nächsten Frame (Jitter), CPU inkl. Kindprozess
+    try:
+        nl = Nl80211()
+    except OSError as e:
+        nl = None
+        print(f"nl80211 nicht verfügbar ({e}), nur 'iw' gemessen")
+    queries = [("iw     ", get_wlan_link_iw, 200)]
+    if nl is not None and os.path.exists("/sys/class/net/wlan0"):
+        queries.append(("nl80211", lambda: nl.link("wlan0"), 2000))
+    for name, query, rounds in queries:
+        times = []
+        cpu0 = _cpu()
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            query()
+            times.append(time.perf_counter() - t0)
+        cpu = (_cpu() - cpu0) / rounds
+        times.sort()
+        print(f"WLAN {name}: CPU {cpu * 1e6:7.0f} µs, Dauer p50 {times[rounds // 2] * 1e6:7.0f} µs"
+              f" p99 {times[rounds * 99 // 100] * 1e6:7.0f} µs max {times[-1] * 1e6:7.0f} µs")
+
+
+class _Sh1106Ram:
+    # Serielle Schnittstelle für Test/Benchmark: führt Page-/Spalten-Kommandos wie der
+    # SH1106-Controller aus (132 Spalten RAM) und zählt die Bytes
+    def __init__(self):
+        self.ram = [bytearray(132) for _ in range(8)]
+        self.page = self.column = 0
+        self.bytes = self.transfers = 0
+
+    def command(self, *cmd):
+        self.bytes += len(cmd)
+        self.transfers += 1
+        for c in cmd:
+            if 0xB0 <= c <= 0xB7:
+                self.page = c - 0xB0
+            elif c < 0x10:
+                self.column = (self.column & 0xF0) | c
+            elif c < 0x20:
+                self.column = (self.column & 0x0F) | (c & 0x0F) << 4
+
+    def data(self, data):
+        self.bytes += len(data)
+        self.transfers += 1
+        self.ram[self.page][self.column:self.column + len(data)] = bytes(data)
+        self.column += len(data)
+
+
+def selftest_frames() -> None:
+    # FrameDiff muss im Display-RAM dasselbe ergeben wie draw_page (volles Bild über luma)
+    import random
+    rnd = random.Random(1)
+    words = ["SVXLink AT", "12:34", "wlan0:UP", "IP 10.0.0.17", "SSID OE9XVI", "Temp 48C",
+             "L 0.12", "RAM 41%", "", "██████░░░░░░ -58dBm", "äöü ÄÖÜ ß"]
+    font = load_font(10)
+    for rotate in (0, 2):
+        full_bus, diff_bus = _Sh1106Ram(), _Sh1106Ram()
+        full = sh1106(full_bus, rotate=rotate)
+        frame = FrameDiff(sh1106(diff_bus, rotate=rotate), font, 12)
+        lines = ["", "", "", ""]
+        for _ in range(300):
+            if rnd.random() < 0.7:
+                lines[rnd.randrange(4)] = rnd.choice(words) + str(rnd.randrange(100))
+            draw_page(full, font, lines, 12)
+            frame.show(lines)
+            assert diff_bus.ram == full_bus.ram, (rotate, lines)
+        assert frame.skipped > 0 and diff_bus.bytes < full_bus.bytes
+    print("Frame-Diff OK (Display-RAM gleich wie volles Bild)")
 
-        if page == 0:
-            lines = page1(title, iface, status, ip, ssid, now)
-        elif page == 1:
-            lines = page2(title, load1, temp, uptime, ram_p, disk_p)
-        else:
-            lines = page3(title, ram_u, ram_t, disk_u, disk_t)
+    # Glyphen-Atlas muss pixelgleich zu draw.text sein, auch mit Umlauten und Blockzeichen
+    chars = [chr(c) for c in range(32, 127)] + list("äöüÄÖÜß°µ█░")
+    for size in (10, 11, 12):
+        font = load_font(size)
+        atlas = GlyphAtlas.for_font(font)
+        assert atlas is not None, size
+        for _ in range(1000):
+            text = "".join(rnd.choice(chars) for _ in range(rnd.randrange(1, 22)))
+            expected, composed = Image.new("1", (160, 40)), Image.new("1", (160, 40))
+            ImageDraw.Draw(expected).text((0, 4), text, font=font, fill=255)
+            if not atlas.text(composed, (0, 4), text):
+                ImageDraw.Draw(composed).text((0, 4), text, font=font, fill=255)
+            assert expected.tobytes() == composed.tobytes(), (size, text)
+    assert GlyphAtlas.for_font(ImageFont.truetype(
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)) is None
+    print("Glyphen-Atlas OK (pixelgleich zu draw.text)")
+
+
+def selftest_wifi() -> None:
+    # Generic Netlink mit der immer vorhandenen Familie "nlctrl" (ID 0x10) prüfen,
+    # nl80211-Antworten nachgebaut (ohne WLAN-Hardware testbar)
+    ctrl = Nl80211("nlctrl")
+    assert ctrl.family == Nl80211.GENL_ID_CTRL, ctrl.family
+    try:
+        Nl80211("gibtsnicht")
+        raise AssertionError("unbekannte Familie ohne Fehler")
+    except OSError:
+        pass
+
+    def attr(kind, value):
+        return struct.pack("=HH", 4 + len(value), kind) + value + b"\0" * (-len(value) % 4)
+
+    rate = attr(Nl80211.RATE_INFO_BITRATE32, struct.pack("=I", 1733))
+    sta = attr(Nl80211.STA_INFO_SIGNAL, struct.pack("=b", -58)) \
+        + attr(Nl80211.STA_INFO_TX_BITRATE | 0x8000, rate)
+    interface = {Nl80211.NL80211_ATTR_SSID: b"OE9XVI",
+                 Nl80211.NL80211_ATTR_WIPHY_FREQ: struct.pack("=I", 5180)}
+    station = nl_attrs(attr(Nl80211.NL80211_ATTR_STA_INFO | 0x8000, sta), 0, 4 + len(sta))
+    link = Nl80211.parse(interface, station)
+    assert link == WifiLink("OE9XVI", -58, 173.3, 5180), link
+    assert Nl80211.parse({}, None) is None
+    assert Nl80211.parse(interface, None) == WifiLink("OE9XVI", None, None, 5180)
+    assert page5(link) == ["WLAN OE9XVI", "██████░░░░░░ -58dBm", "TX 173.3 MBit/s",
+                           "5180 MHz Kanal 36"], page5(link)
+
+    iw = ("Connected to 11:22:33:44:55:66 (on wlan0)\n\tSSID: OE9XVI\n\tfreq: 2437.0\n"
+          "\tsignal: -71 dBm\n\ttx bitrate: 72.2 MBit/s MCS 7 short GI\n")
+    assert parse_iw_link(iw) == WifiLink("OE9XVI", -71, 72.2, 2437), parse_iw_link(iw)
+    assert parse_iw_link("Not connected.\n") is None
+    assert wifi_channel(2437) == 6 and wifi_channel(2484) == 14
+    print("WLAN (nl80211/iw) OK")
+
+
+def selftest() -> None:
+    # Netlink-Tabelle gegen ein veth-Paar prüfen. Braucht root, am besten in einem eigenen
+    # Netzwerk-Namespace:  sudo unshare -n python3 oled_sh1106.py --selftest
+    global PREFERRED_IFACES
+    selftest_frames()
+    selftest_wifi()
+    a, b = "oledtst0", "oledtst1"
+    PREFERRED_IFACES = (a, "lo")
+    nl = NetlinkIfaces()
+
+    def ip(*args):
+        subprocess.run(["ip"] + list(args), check=True)
+        return time.monotonic()
+
+    def wait(expected, what):
+        t0 = time.monotonic()
+        while nl.get() != expected:
+            if time.monotonic() - t0 > 2:
+                raise AssertionError(f"{what}: {nl.get()} statt {expected}")
+            if select.select([nl], [], [], 0.1)[0]:
+                nl.poll()
+        return (time.monotonic() - t0) * 1000
+
+    try:
+        ip("link", "add", a, "type", "veth", "peer", "name", b)
+        print(f"veth angelegt:             {wait((a, 'no IP', 'DOWN'), 'neu'):.1f} ms")
+        ip("link", "set", a, "up")
+        ip("link", "set", b, "up")
+        print(f"Link up:                   {wait((a, 'no IP', 'UP'), 'up'):.1f} ms")
+        ip("addr", "add", "10.99.0.1/24", "dev", a)
+        print(f"IPv4 hinzugefügt:          {wait((a, '10.99.0.1', 'UP'), 'addr'):.1f} ms")
+        # ioctl sieht dieselbe Adresse (sysfs zeigt im Namespace den Host, daher nicht geprüft)
+        assert get_iface_ipv4(a) == "10.99.0.1"
+        PREFERRED_IFACES = (b, a)  # b ist up, aber ohne IP: a mit IP wird gewählt
+        assert nl.get() == (a, "10.99.0.1", "UP")
+        PREFERRED_IFACES = (a, "lo")
+        ip("addr", "add", "10.99.1.1/24", "dev", a)
+        ip("addr", "del", "10.99.0.1/24", "dev", a)
+        print(f"IPv4 gewechselt:           {wait((a, '10.99.1.1', 'UP'), 'wechsel'):.1f} ms")
+        ip("link", "set", b, "down")
+        print(f"Gegenstelle down:          {wait((a, '10.99.1.1', 'DOWN'), 'down'):.1f} ms")
+        ip("link", "del", a)
+        print(f"veth gelöscht:             {wait((a, 'no IP', 'DOWN'), 'gelöscht'):.1f} ms")
+        assert nl._index(a) is None and nl._index(b) is None
+    finally:
+        subprocess.run(["ip", "link", "del", a], stderr=subprocess.DEVNULL)
 
-        draw_page(device, font, lines, line_h)
-        time.sleep(REFRESH_SECONDS)
+    rounds = 20000
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        get_net_status()
+    polled = (time.perf_counter() - t0) / rounds * 1e6
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        nl.poll()
+        nl.get()
+    cached = (time.perf_counter() - t0) / rounds * 1e6
+    print(f"Pro Aktualisierung: ioctl/sysfs {polled:.1f} µs, Netlink-Tabelle {cached:.1f} µs")
+    print(f"Selbsttest OK ({nl.events} Netlink-Nachrichten)")
 
 
 if __name__ == "__main__":
-    main()
+    if "--bench" in sys.argv:
+        bench()
+    elif "--selftest" in sys.argv:
+        selftest()
+    else:
+        main()
@@ -0,0 +1,399 @@
+# aprs_is.py
+# Autor: OE9SAU
+# Beschreibung: Dauerhafte APRS-IS Verbindung (einmal Login, logresp-Prüfung,
+#               Keepalive und Reconnect mit Backoff) als asyncio-Task.
+#               Mehrere Server: alle Adressen parallel anmelden, der schnellste gewinnt.
+# Version: 1.3
+
+import asyncio
+import socket
+import time
+
+SOFTWARE = "shari_aprs"
+SOFTWARE_VERSION = "2.1"
+DEFAULT_PORT = 14580
+# Rotate-Hosts liefern viele A-Records, pro Name nur die ersten paar gleichzeitig anmelden
+MAX_ADDRS_PER_HOST = 3
+
+
+def login_line(user, password, rx_filter=None):
+    line = f"user {user} pass {password} vers {SOFTWARE} {SOFTWARE_VERSION}"
+    # Ohne Filter schickt der Server (Port 14580) keine Pakete, z.B. "r/47.25/9.60/50"
+    return f"{line} filter {rx_filter}" if rx_filter else line
+
+
+def parse_logresp(line):
+    # z.B. "# logresp OE9SAU-10 verified, server T2AUSTRIA"
+    #      "# logresp OE9SAU-10 unverified, server T2AUSTRIA"
+    parts = line.split()
+    if len(parts) < 4 or parts[0] != "#" or parts[1] != "logresp":
+        return None
+    call = parts[2]
+    verified = parts[3].rstrip(",") == "verified"
+    server = parts[5] if len(parts) > 5 and parts[4] == "server" else None
+    return call, verified, server
+
+
+def parse_servers(text, default_port=DEFAULT_PORT):
+    # "austria.aprs2.net, euro.aprs2.net:14580, [2001:db8::1]:14580" -> [(host, port), ...]
+    servers = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if item.startswith("["):
+            host, _, rest = item[1:].partition("]")
+            port = rest[1:] if rest.startswith(":") else ""
+        elif item.count(":") == 1:
+            host, _, port = item.partition(":")
+        else:
+            host, port = item, ""
+        servers.append((host, int(port) if port else default_port))
+    return servers
+
+
+class DnsCache:
+    # getaddrinfo liefert keine TTL, daher feste Gültigkeit. Schlägt die Auflösung fehl,
+    # werden die alten Adressen weiterverwendet (mobile Verbindung mit wackeligem DNS).
+    def __init__(self, ttl=300, negative_ttl=30, timeout=10):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.hits = 0
+        self.lookups = 0
+        self.failures = 0
+        self._entries = {}  # (host, port) -> (gültig bis, [ip, ...] oder None)
+
+    async def resolve(self, host, port):
+        key = (host, port)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            if entry[1] is None:
+                raise OSError(f"{host} nicht auflösbar (zwischengespeichert)")
+            return entry[1]
+
+        self.lookups += 1
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            if entry is not None and entry[1]:
+                self._entries[key] = (now + self.negative_ttl, entry[1])
+                return entry[1]
+            self._entries[key] = (now + self.negative_ttl, None)
+            raise OSError(f"{host} nicht auflösbar: {str(e) or type(e).__name__}") from None
+
+        addrs = []
+        for info in infos:
+            ip = info[4][0]
+            if ip not in addrs:
+                addrs.append(ip)
+        self._entries[key] = (now + self.ttl, addrs)
+        return addrs
+
+
+class ServerStats:
+    __slots__ = ("host", "port", "rtt", "logins", "failures", "last_error", "cooldown_until")
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.rtt = None  # Zeit Verbindungsaufbau bis logresp, gleitender Mittelwert
+        self.logins = 0
+        self.failures = 0
+        self.last_error = None
+        self.cooldown_until = 0.0
+
+    def ok(self, rtt):
+        self.rtt = rtt if self.rtt is None else 0.7 * self.rtt + 0.3 * rtt
+        self.logins += 1
+        self.failures = 0
+
+    def failed(self, error, cooldown_max=600):
+        self.failures += 1
+        self.last_error = error
+        # Fehlerhafte Server eine Weile nicht mehr anfragen (30s, 60s, ... bis cooldown_max)
+        self.cooldown_until = time.monotonic() + min(30 * 2 ** (self.failures - 1), cooldown_max)
+
+    def available(self):
+        return time.monotonic() >= self.cooldown_until
+
+
+class AprsIsClient:
+    # Objekte innerhalb der laufenden Event-Loop anlegen (asyncio.Event)
+    def __init__(self, servers, user, password, timeout=10,
+                 keepalive=60, backoff_min=2, backoff_max=300, dns_ttl=300,
+                 reprobe_interval=3600):
+        self.servers = list(servers)
+        self.stats = {s: ServerStats(*s) for s in self.servers}
+        self.dns = DnsCache(dns_ttl, timeout=timeout)
+        # Aktuell (bzw. zuletzt) verbundener Server
+        self.server, self.port = self.servers[0]
+        self.address = None
+        self.login_rtt = None
+        self.reprobe_interval = reprobe_interval
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        # aprsc sendet alle ~20s einen Kommentar, danach gilt die Verbindung als tot
+        self.rx_timeout = max(120, 2 * keepalive)
+
+        self.verified = False
+        self.server_name = None
+        self.connected_since = None
+        self.reconnects = 0
+        self.last_send_latency = None
+        # Empfangsmodus: Serverfilter und Callbacks fn(raw) für empfangene Paketzeilen
+        self.rx_filter = None
+        self.listeners = []
+
+        self._reader = None
+        self._writer = None
+        self._last_tx = 0.0
+        self._connected = asyncio.Event()
+        self._relogin = False  # Verbindung wegen neuer Zugangsdaten getrennt
+
+    def reconfigure(self, servers, user, password, keepalive=60, dns_ttl=300,
+                    reprobe_interval=3600):
+        # Neue Werte aus der Konfiguration. Nur bei geänderten Servern oder Zugangsdaten wird
+        # neu angemeldet; liefert True in diesem Fall.
+        servers = list(servers)
+        relogin = (servers, user, password) != (self.servers, self.user, self.password)
+        for s in servers:
+            if s not in self.stats:
+                self.stats[s] = ServerStats(*s)
+        self.servers, self.user, self.password = servers, user, password
+        self.keepalive = keepalive
+        self.rx_timeout = max(120, 2 * keepalive)
+        self.dns.ttl = dns_ttl
+        self.reprobe_interval = reprobe_interval
+        if relogin and self.connected:
+            self._relogin = True
+            self.close()
+        return relogin
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    async def wait_connected(self, timeout=None):
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.connected
+
+    async def _login(self, host, port, ip):
+        # Verbinden und anmelden, liefert (reader, writer, logresp, Sekunden bis logresp)
+        start = time.monotonic()
+        deadline = start + self.timeout
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), self.timeout)
+        try:
+            sock = writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            writer.write((login_line(self.user, self.password, self.rx_filter) + "\r\n").encode())
+            await writer.drain()
+
+            while True:
+                raw = await asyncio.wait_for(reader.readline(), max(deadline - time.monotonic(), 0))
+                if not raw:
+                    raise ConnectionError("Verbindung vom Server geschlossen")
+                resp = parse_logresp(raw.decode("utf-8", errors="replace").strip())
+                if resp is not None:
+                    break
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer, resp, time.monotonic() - start
+
+    async def _candidates(self, exclude=None):
+        # Alle Server parallel auflösen; Server in der Sperrzeit nur, wenn sonst keiner bleibt
+        servers = [s for s in self.servers if self.stats[s].available()] or self.servers
+        results = await asyncio.gather(*(self.dns.resolve(h, p) for h, p in servers),
+                                       return_exceptions=True)
+        candidates = []
+        for (host, port), addrs in zip(servers, results):
+            if isinstance(addrs, BaseException):
+                self.stats[(host, port)].failed(str(addrs))
+                print(f"APRS-IS {addrs}")
+                continue
+            candidates.extend((host, port, ip) for ip in addrs[:MAX_ADDRS_PER_HOST]
+                              if (ip, port) != exclude)
+        return candidates
+
+    async def _race(self, candidates):
+        # Alle Kandidaten gleichzeitig anmelden, die erste gültige logresp gewinnt
+        tasks = {asyncio.ensure_future(self._login(*c)): c for c in candidates}
+        pending = set(tasks)
+        winner = None
+        errors = []
+        # Ein Server gilt erst als ausgefallen, wenn alle seine Adressen scheitern
+        remaining = {}
+        for host, port, _ in candidates:
+            remaining[(host, port)] = remaining.get((host, port), 0) + 1
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    host, port, ip = tasks[task]
+                    e = task.exception()
+                    if e is not None:
+                        msg = f"{host} ({ip}): {str(e) or type(e).__name__}"
+                        errors.append(msg)
+                        remaining[(host, port)] -= 1
+                        if not remaining[(host, port)]:
+                            self.stats[(host, port)].failed(msg)
+                    elif winner is None:
+                        winner = task.result(), tasks[task]
+                    else:
+                        task.result()[1].close()
+        finally:
+            for task in pending:
+                task.cancel()
+            for result in await asyncio.gather(*pending, return_exceptions=True):
+                if isinstance(result, tuple):
+                    result[1].close()
+        if winner is None:
+            raise OSError("; ".join(errors) or "kein Server erreichbar")
+        (reader, writer, resp, rtt), (host, port, ip) = winner
+        self.stats[(host, port)].ok(rtt)
+        return reader, writer, resp, rtt, host, port, ip
+
+    async def connect(self):
+        self.close()
+        self._relogin = False
+        candidates = await self._candidates()
+        if not candidates:
+            raise OSError("keine Serveradresse auflösbar")
+        reader, writer, resp, rtt, host, port, ip = await self._race(candidates)
+
+        self.server, self.port, self.address, self.login_rtt = host, port, ip, rtt
+        _, self.verified, self.server_name = resp
+        if not self.verified:
+            print(f"Warnung: APRS-IS Login für {self.user} nicht verifiziert "
+                  f"(PASSCODE prüfen), Pakete werden verworfen.")
+
+        self._reader, self._writer = reader, writer
+        self._last_tx = time.monotonic()
+        if self.connected_since is not None:
+            self.reconnects += 1
+        self.connected_since = time.monotonic()
+        self._connected.set()
+        print(f"APRS-IS verbunden: {self.server}:{self.port} [{ip}] in {rtt * 1000:.0f} ms "
+              f"(Server {self.server_name}, {'verified' if self.verified else 'unverified'}, "
+              f"{len(candidates)} Kandidaten)")
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._connected.clear()
+
+    async def run(self):
+        # Verbindungs-Task: verbinden, Server-Zeilen lesen, Keepalive, Reconnect mit Backoff
+        backoff = self.backoff_min
+        while True:
+            try:
+                await self.connect()
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"APRS-IS Verbindung fehlgeschlagen: "
+                      f"{str(e) or type(e).__name__} (neuer Versuch in {backoff}s)")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+                continue
+            backoff = self.backoff_min
+            try:
+                await self._session()
+            except (OSError, asyncio.TimeoutError) as e:
+                if self._relogin:
+                    print("APRS-IS: Server oder Zugangsdaten geändert, melde neu an")
+                    continue
+                # Sofort neu anmelden, der ausgefallene Server ist vorerst gesperrt
+                reason = str(e) or type(e).__name__
+                print(f"APRS-IS Verbindung zu {self.server}:{self.port} unterbrochen: {reason}")
+                self.stats[(self.server, self.port)].failed(reason)
+            finally:
+                self.close()
+
+    async def _faster_server(self):
+        # Andere Server zur Probe anmelden; True, wenn einer deutlich schneller antwortet
+        candidates = await self._candidates(exclude=(self.address, self.port))
+        if not candidates:
+            return False
+        try:
+            reader, writer, resp, rtt, host, port, ip = await self._race(candidates)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        if rtt < 0.5 * self.login_rtt:
+            print(f"APRS-IS: {host} [{ip}] antwortet in {rtt * 1000:.0f} ms statt "
+                  f"{self.login_rtt * 1000:.0f} ms, wechsle Server")
+            return True
+        return False
+
+    async def _session(self):
+        reader = self._reader
+        last_rx = time.monotonic()
+        next_probe = time.monotonic() + self.reprobe_interval
+        while True:
+            try:
+                raw = await asyncio.wait_for(reader.readline(), self.keepalive)
+            except asyncio.TimeoutError:
+                raw = None
+            now = time.monotonic()
+            if raw == b"":
+                raise ConnectionError("Verbindung vom Server geschlossen")
+            if raw:
+                last_rx = now
+                self.handle_line(raw)
+            elif now - last_rx > self.rx_timeout:
+                raise asyncio.TimeoutError("keine Daten vom Server")
+            if now - self._last_tx >= self.keepalive:
+                await self._write(f"# keepalive {SOFTWARE}")
+            if self.reprobe_interval and now >= next_probe:
+                next_probe = now + self.reprobe_interval
+                if await self._faster_server():
+                    return
+
+    def handle_line(self, raw):
+        # Server-Kommentare werden verworfen
+        if raw.startswith(b"#"):
+            return
+        for listener in self.listeners:
+            listener(raw)
+
+    async def set_filter(self, rx_filter):
+        # Gilt für den nächsten Login und wird einer bestehenden Verbindung sofort mitgeteilt
+        self.rx_filter = rx_filter
+        if self.connected:
+            await self._write(f"#filter {rx_filter}")
+
+    async def _write(self, line):
+        writer = self._writer
+        if writer is None:
+            raise ConnectionError("nicht verbunden")
+        writer.write(line.encode("utf-8", errors="replace") + b"\r\n")
+        self._last_tx = time.monotonic()
+        await writer.drain()
+
+    async def send(self, packet, wait=0.0):
+        # Liefert die Sendelatenz in Sekunden oder None, wenn keine Verbindung besteht
+        start = time.monotonic()
+        if not self.connected and not (wait and await self.wait_connected(wait)):
+            return None
+        try:
+            await self._write(packet)
+        except OSError as e:
+            print(f"APRS-IS Verbindung unterbrochen: {e}")
+            self.close()
+            return None
+        self.last_send_latency = time.monotonic() - start
+        return self.last_send_latency
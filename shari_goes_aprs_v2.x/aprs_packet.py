@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# aprs_packet.py
+# Autor: OE9SAU
+# Beschreibung: Positionspakete für APRS: unkomprimiert, komprimiert (base91) und Mic-E,
+#               dazu Decoder für die Rundreise-Prüfung
+# Version: 1.0
+#
+# Selbsttest (Kodieren -> Dekodieren):  python3 aprs_packet.py --selftest
+# Benchmark Paketaufbau:                python3 aprs_packet.py --bench
+
+import math
+import re
+import time
+
+TOCALL = "APN100"
+PATH = "TCPIP*"
+FORMATS = ("uncompressed", "compressed", "mice")
+
+_CALL = re.compile(r"^[A-Z0-9]{1,6}(-[0-9A-Z]{1,2})?$")
+
+KMH_PER_KNOT = 1.852
+FEET_PER_METER = 3.28084
+
+# Mic-E Standardnachrichten -> Bits A/B/C
+MICE_MESSAGES = {
+    "off_duty": (1, 1, 1),
+    "en_route": (1, 1, 0),
+    "in_service": (1, 0, 1),
+    "returning": (1, 0, 0),
+    "committed": (0, 1, 1),
+    "special": (0, 1, 0),
+    "priority": (0, 0, 1),
+    "emergency": (0, 0, 0),
+}
+
+
+def aprs_timestamp(utc=None):
+    # z.B. 142530h (Stunde/Minute/Sekunde UTC), aus GPS-Zeit wenn vorhanden. HMS ist nur für
+    # 24h eindeutig, ältere (nachgesendete) Meldungen bekommen Tag/Stunde/Minute, z.B. 181425z
+    if utc is not None and time.time() - utc > 23 * 3600:
+        return time.strftime("%d%H%Mz", time.gmtime(utc))
+    return time.strftime("%H%M%Sh", time.gmtime(utc))
+
+
+def check_timestamp(stamp):
+    # DDHHMMz / DDHHMM/ (Tag, Stunde, Minute) bzw. HHMMSSh; ValueError bei unmöglichen Werten
+    if len(stamp) != 7 or not stamp[:6].isdigit() or stamp[6] not in "zh/":
+        raise ValueError(f"ungültiger Zeitstempel: {stamp!r}")
+    a, b, c = int(stamp[0:2]), int(stamp[2:4]), int(stamp[4:6])
+    if stamp[6] == "h":
+        ok = a < 24 and b < 60 and c < 60
+    else:
+        ok = 1 <= a <= 31 and b < 24 and c < 60
+    if not ok:
+        raise ValueError(f"ungültiger Zeitstempel: {stamp!r}")
+
+
+def base91(value, width):
+    out = []
+    for _ in range(width):
+        value, r = divmod(value, 91)
+        out.append(chr(r + 33))
+    return "".join(reversed(out))
+
+
+def unbase91(text):
+    value = 0
+    for c in text:
+        value = value * 91 + ord(c) - 33
+    return value
+
+
+def _overlay(table):
+    # Overlay-Ziffern werden in komprimierten Paketen als a-j übertragen
+    if table.isdigit():
+        return chr(ord("a") + int(table))
+    return table
+
+
+def _ddmm(value, width):
+    # In Hundertstel-Minuten runden, sonst wird aus 59.996' ein ungültiges "60.00"
+    deg, rest = divmod(round(abs(value) * 6000), 6000)
+    return f"{deg:0{width}d}{rest // 100:02d}.{rest % 100:02d}"
+
+
+def position_uncompressed(call, lat, lon, table, symbol, comment, alt, speed_kmh, utc=None):
+    lat_ddmm = f"{_ddmm(lat, 2)}{'N' if lat >= 0 else 'S'}"
+    lon_ddmm = f"{_ddmm(lon, 3)}{'E' if lon >= 0 else 'W'}"
+    return (f"{call}>{TOCALL},{PATH}:@{aprs_timestamp(utc)}{lat_ddmm}{table}{lon_ddmm}{symbol}"
+            f"{comment} Alt:{alt:.0f}m Speed:{speed_kmh:.0f}km/h")
+
+
+def compressed_body(lat, lon, table, symbol, course=None, speed_kmh=None, alt=None):
+    y = base91(int(round(380926 * (90 - lat))), 4)
+    x = base91(int(round(190463 * (180 + lon))), 4)
+
+    if course is not None and speed_kmh is not None:
+        # Kurs in 4-Grad-Schritten, Geschwindigkeit logarithmisch (1.08^s - 1 Knoten)
+        c = chr(33 + int(round(course / 4)) % 90)
+        s = chr(33 + min(89, int(round(math.log(speed_kmh / KMH_PER_KNOT + 1, 1.08)))))
+        t = chr(33 + (0x20 | 0x18 | 0x02))  # aktueller Fix, Quelle RMC, Software
+        ext = c + s + t
+    elif alt is not None:
+        # Höhe in Fuß = 1.002^cs
+        cs = int(round(math.log(max(alt * FEET_PER_METER, 1.0), 1.002)))
+        ext = base91(min(max(cs, 0), 91 * 91 - 1), 2) + chr(33 + (0x20 | 0x10 | 0x02))  # Quelle GGA
+    else:
+        ext = "   "
+    return f"{_overlay(table)}{y}{x}{symbol}{ext}"
+
+
+def position_compressed(call, lat, lon, table, symbol, comment, course=None, speed_kmh=None,
+                        alt=None, utc=None):
+    body = compressed_body(lat, lon, table, symbol, course, speed_kmh, alt)
+    return f"{call}>{TOCALL},{PATH}:@{aprs_timestamp(utc)}{body}{comment}"
+
+
+def mice_destination(lat, lon, message="en_route"):
+    a, b, c = MICE_MESSAGES[message]
+    minutes = round(abs(lat) * 60 * 100)  # Hundertstel-Minuten
+    deg, rest = divmod(minutes, 6000)
+    digits = f"{deg:02d}{rest:04d}"
+    lon_deg = round(abs(lon) * 6000) // 6000  # gleiche Rundung wie in mice_info()
+
+    flags = (a, b, c, lat >= 0, lon_deg < 10 or lon_deg >= 100, lon < 0)
+    return "".join(chr(ord("P") + int(d)) if f else d for d, f in zip(digits, flags))
+
+
+def mice_info(lat, lon, table, symbol, course, speed_kmh, alt=None):
+    minutes = round(abs(lon) * 60 * 100)
+    deg, rest = divmod(minutes, 6000)
+    m, h = divmod(rest, 100)
+
+    if deg < 10:
+        d = deg + 118
+    elif deg < 100:
+        d = deg + 28
+    elif deg < 110:
+        d = deg + 8
+    else:
+        d = deg - 72
+    m = m + 88 if m < 10 else m + 28
+
+    speed = min(int(round((speed_kmh or 0) / KMH_PER_KNOT)), 799)
+    course = int(round(course or 0)) % 360
+    sp = speed // 10 + (80 if speed < 200 else 0) + 28
+    dc = (speed % 10) * 10 + course // 100 + 4 + 28
+    se = course % 100 + 28
+
+    info = "`" + chr(d) + chr(m) + chr(h + 28) + chr(sp) + chr(dc) + chr(se) + symbol + table
+    if alt is not None:
+        info += base91(max(int(round(alt)) + 10000, 0), 3) + "}"
+    return info
+
+
+def position_mice(call, lat, lon, table, symbol, comment, course=None, speed_kmh=None,
+                  alt=None, message="en_route"):
+    dest = mice_destination(lat, lon, message)
+    info = mice_info(lat, lon, table, symbol, course, speed_kmh, alt)
+    return f"{call}>{dest},{PATH}:{info}{comment}"
+
+
+def build_position(fmt, call, lat, lon, alt, speed_kmh, table, symbol, comment,
+                   course=None, utc=None, compressed_ext="course", mice_message="en_route"):
+    if fmt == "compressed":
+        if compressed_ext == "altitude":
+            return position_compressed(call, lat, lon, table, symbol, comment, alt=alt, utc=utc)
+        return position_compressed(call, lat, lon, table, symbol, comment,
+                                   course=course if course is not None else 0.0,
+                                   speed_kmh=speed_kmh, utc=utc)
+    if fmt == "mice":
+        return position_mice(call, lat, lon, table, symbol, comment, course, speed_kmh, alt,
+                             mice_message)
+    return position_uncompressed(call, lat, lon, table, symbol, comment, alt, speed_kmh, utc)
+
+
+class PacketTemplate:
+    # Kopf, Symbol und Kommentar einmal je Konfiguration vorbereiten, pro Paket werden nur
+    # Zeit, Position, Kurs/Geschwindigkeit/Höhe eingesetzt. Ergebnis wie build_position().
+    def __init__(self, fmt, call, table, symbol, comment, compressed_ext="course",
+                 mice_message="en_route"):
+        self.fmt = fmt
+        self.call = call
+        self.table = table
+        self.symbol = symbol
+        self.comment = comment
+        self.compressed_ext = compressed_ext
+        self.mice_message = mice_message
+
+        self._header = f"{call}>{TOCALL},{PATH}:@"
+        self._mice_call = f"{call}>"
+        self._mice_path = f",{PATH}:"
+
+    def build(self, lat, lon, alt, speed_kmh, course=None, utc=None, fmt=None):
+        fmt = fmt or self.fmt
+        if fmt == "compressed":
+            if self.compressed_ext == "altitude":
+                body = compressed_body(lat, lon, self.table, self.symbol, alt=alt)
+            else:
+                body = compressed_body(lat, lon, self.table, self.symbol,
+                                       course if course is not None else 0.0, speed_kmh)
+            return f"{self._header}{aprs_timestamp(utc)}{body}{self.comment}"
+        if fmt == "mice":
+            return (f"{self._mice_call}{mice_destination(lat, lon, self.mice_message)}"
+                    f"{self._mice_path}"
+                    f"{mice_info(lat, lon, self.table, self.symbol, course, speed_kmh, alt)}"
+                    f"{self.comment}")
+        return (f"{self._header}{aprs_timestamp(utc)}"
+                f"{_ddmm(lat, 2)}{'N' if lat >= 0 else 'S'}{self.table}"
+                f"{_ddmm(lon, 3)}{'E' if lon >= 0 else 'W'}{self.symbol}"
+                f"{self.comment} Alt:{alt:.0f}m Speed:{speed_kmh:.0f}km/h")
+
+
+def decode_compressed(body):
+    # body ab Symboltabelle: "/YYYYXXXX$csT..." -> dict
+    lat = 90 - unbase91(body[1:5]) / 380926.0
+    lon = -180 + unbase91(body[5:9]) / 190463.0
+    result = {"lat": lat, "lon": lon, "table": body[0], "symbol": body[9]}
+    c, s, t = body[10], body[11], body[12]
+    if c != " ":
+        source = ((ord(t) - 33) >> 3) & 0x03
+        if source == 0x02:
+            result["alt"] = (1.002 ** unbase91(c + s)) / FEET_PER_METER
+        else:
+            result["course"] = (ord(c) - 33) * 4
+            result["speed_kmh"] = (1.08 ** (ord(s) - 33) - 1) * KMH_PER_KNOT
+    return result
+
+
+def decode_mice(dest, info):
+    digits = ""
+    bits = []
+    for ch in dest[:6]:
+        if "P" <= ch <= "Y":
+            digits += chr(ord(ch) - ord("P") + ord("0"))
+            bits.append(1)
+        else:
+            digits += ch
+            bits.append(0)
+    lat = int(digits[0:2]) + int(digits[2:6]) / 6000.0
+    if not bits[3]:
+        lat = -lat
+
+    d = ord(info[1]) - 28
+    if bits[4]:
+        d += 100
+    if 180 <= d <= 189:
+        d -= 80
+    elif 190 <= d <= 199:
+        d -= 190
+    m = ord(info[2]) - 28
+    if m >= 60:
+        m -= 60
+    h = ord(info[3]) - 28
+    lon = d + (m + h / 100.0) / 60.0
+    if bits[5]:
+        lon = -lon
+
+    sp = ord(info[4]) - 28
+    dc = ord(info[5]) - 28
+    se = ord(info[6]) - 28
+    speed = sp * 10 + dc // 10
+    if speed >= 800:
+        speed -= 800
+    course = (dc % 10) * 100 + se
+    if course >= 400:
+        course -= 400
+
+    result = {"lat": lat, "lon": lon, "speed_kmh": speed * KMH_PER_KNOT, "course": course,
+              "symbol": info[7], "table": info[8],
+              "message": next(k for k, v in MICE_MESSAGES.items() if v == tuple(bits[:3]))}
+    if len(info) >= 13 and info[12] == "}":
+        result["alt"] = unbase91(info[9:12]) - 10000
+    return result
+
+
+def decode_uncompressed(body):
+    # body ab Breite: "4715.21N/00936.25E(..." -> dict
+    if len(body) < 19 or body[4] != "." or body[14] != "." or body[7] not in "NS" or body[17] not in "EW":
+        raise ValueError(f"ungültige Position: {body[:19]!r}")
+    lat_min, lon_min = float(body[2:7]), float(body[12:17])
+    if lat_min >= 60 or lon_min >= 60:
+        raise ValueError(f"Minuten >= 60: {body[:19]!r}")
+    lat = int(body[0:2]) + lat_min / 60.0
+    lon = int(body[9:12]) + lon_min / 60.0
+    return {"lat": lat if body[7] == "N" else -lat, "lon": lon if body[17] == "E" else -lon,
+            "table": body[8], "symbol": body[18]}
+
+
+def decode_position(packet):
+    # Komplettes TNC2-Paket "CALL>DEST,PATH:info" prüfen, liefert dict oder wirft ValueError.
+    # Pakete ohne Position (Telemetrie, Status, ...) liefern nur Kopf und Typ.
+    header, sep, info = packet.partition(":")
+    if not sep or not info:
+        raise ValueError("kein Info-Feld")
+    call, sep, rest = header.partition(">")
+    dest, *path = rest.split(",")
+    if not sep or not _CALL.match(call) or not dest:
+        raise ValueError(f"ungültiger Kopf: {header!r}")
+    result = {"call": call, "dest": dest, "path": path, "type": info[0]}
+
+    kind = info[0]
+    if kind in "@/!=":
+        body = info[1:]
+        if kind in "@/":
+            check_timestamp(body[:7])
+            result["timestamp"] = body[:7]
+            body = body[7:]
+        try:
+            if body[:1].isdigit():
+                result.update(decode_uncompressed(body))
+            elif len(body) >= 13:
+                result.update(decode_compressed(body))
+            else:
+                raise ValueError
+        except (ValueError, IndexError):
+            raise ValueError(f"ungültige Position: {body[:19]!r}") from None
+    elif kind in "`'":
+        if len(dest) < 6 or len(info) < 9:
+            raise ValueError("Mic-E zu kurz")
+        try:
+            result.update(decode_mice(dest, info))
+        except (ValueError, IndexError, StopIteration):
+            raise ValueError(f"ungültiges Mic-E: {dest} {info[:9]!r}") from None
+    return result
+
+
+def _selftest(count=20000):
+    import random
+
+    rnd = random.Random(1)
+    for _ in range(count):
+        lat = rnd.uniform(-89.9, 89.9)
+        lon = rnd.uniform(-179.9, 179.9)
+        course = rnd.randrange(0, 360)
+        speed = rnd.uniform(0, 300)
+        alt = rnd.uniform(0, 4000)
+
+        body = compressed_body(lat, lon, "/", ">", course, speed)
+        dec = decode_compressed(body)
+        assert abs(dec["lat"] - lat) < 1e-5 and abs(dec["lon"] - lon) < 1e-5, (lat, lon, dec)
+        assert abs(((dec["course"] - course + 180) % 360) - 180) <= 2, (course, dec)
+        assert abs(dec["speed_kmh"] - speed) <= max(0.05 * speed, 1.1), (speed, dec)
+
+        dec = decode_compressed(compressed_body(lat, lon, "/", ">", alt=alt))
+        assert abs(dec["alt"] - alt) <= max(0.002 * alt, 0.4), (alt, dec)
+
+        dest = mice_destination(lat, lon)
+        info = mice_info(lat, lon, "/", ">", course, speed, alt)
+        assert all(28 <= ord(ch) <= 127 for ch in info)  # Mic-E Zeichenvorrat
+        dec = decode_mice(dest, info)
+        assert abs(dec["lat"] - lat) < 1e-4 and abs(dec["lon"] - lon) < 1e-4, (lat, lon, dec)
+        assert dec["course"] == course, (course, dec)
+        assert abs(dec["speed_kmh"] - speed) <= KMH_PER_KNOT / 2 + 1e-9, (speed, dec)
+        assert abs(dec["alt"] - alt) <= 0.5, (alt, dec)
+        assert dec["message"] == "en_route"
+
+        for fmt in FORMATS:
+            if fmt == "uncompressed":
+                lat = round(lat, 1) - 1e-6  # Rundung auf volle Minuten prüfen
+            packet = build_position(fmt, "OE9SAU-9", lat, lon, alt, speed, "/", ">", "Test",
+                                    course=course, utc=1700000000)
+            dec = decode_position(packet)
+            assert abs(dec["lat"] - lat) < 1e-4 and abs(dec["lon"] - lon) < 1e-4, (packet, dec)
+            for ext in ("course", "altitude"):
+                template = PacketTemplate(fmt, "OE9SAU-9", "/", ">", "Test", compressed_ext=ext)
+                assert template.build(lat, lon, alt, speed, course, 1700000000) == build_position(
+                    fmt, "OE9SAU-9", lat, lon, alt, speed, "/", ">", "Test", course=course,
+                    utc=1700000000, compressed_ext=ext), (fmt, ext)
+
+    # Zeitstempel: unter 23 h HHMMSSh, älter (nachgesendet) DDHHMMz
+    now = time.time()
+    for age, expected in ((0, time.strftime("%H%M%Sh", time.gmtime(now))),
+                          (3600, time.strftime("%H%M%Sh", time.gmtime(now - 3600))),
+                          (30 * 3600, time.strftime("%d%H%Mz", time.gmtime(now - 30 * 3600)))):
+        packet = build_position("uncompressed", "OE9SAU-9", 47.25, 9.6, 0, 0, "/", ">", "",
+                                utc=now - age)
+        assert decode_position(packet)["timestamp"] == expected, (age, packet)
+    for bad in ("142530z", "002530z", "245959h", "126000h", "12345x"):
+        try:
+            check_timestamp(bad)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+    print(f"Selbsttest OK: {count} Positionen (komprimiert, Höhe, Mic-E), Zeitstempel")
+
+
+def _bench(count=50000):
+    args = ("OE9SAU-9", 47.251234, 9.598765, 450.0, 54.0, "/", "(", "SHARI Mobile TEST")
+    for fmt in FORMATS:
+        t0 = time.perf_counter()
+        for _ in range(count):
+            packet = build_position(fmt, *args, course=123.0, utc=1700000000)
+        dt = time.perf_counter() - t0
+        info = packet.split(":", 1)[1]
+        template = PacketTemplate(fmt, *(args[0:1] + args[5:]))
+        t0 = time.perf_counter()
+        for _ in range(count):
+            template.build(*args[1:5], course=123.0, utc=1700000000)
+        dt_template = time.perf_counter() - t0
+        print(f"{fmt:13s} {dt / count * 1e6:6.2f} µs/Paket, Vorlage {dt_template / count * 1e6:6.2f} µs, "
+              f"Info-Feld {len(info):3d} Zeichen: {packet}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="APRS-Positionspakete")
+    ap.add_argument("--selftest", action="store_true", help="Kodieren/Dekodieren prüfen")
+    ap.add_argument("--bench", action="store_true", help="Paketaufbau messen")
+    args = ap.parse_args()
+    if args.selftest:
+        _selftest()
+    if args.bench:
+        _bench()
+    if not (args.selftest or args.bench):
+        ap.print_help()
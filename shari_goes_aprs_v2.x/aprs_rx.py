@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# aprs_rx.py
+# Autor: OE9SAU
+# Beschreibung: Empfang von APRS-IS Paketen in der Umgebung (Filter r/lat/lon/km):
+#               Positionen, Wetter, Objekte und Items in einem begrenzten Raster-Index,
+#               Abfrage "Stationen im Umkreis" über einen lokalen Unix-Socket
+# Version: 1.0
+#
+# Abfrage:    echo "nearby 25 5" | nc -U /tmp/shari_aprs.sock
+# Benchmark:  python3 aprs_rx.py --bench
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+from aprs_packet import decode_compressed, decode_mice, decode_uncompressed
+from smartbeacon import distance_m
+
+KM_PER_DEG = 111.32
+MAX_COMMENT = 43
+
+# Wetterfelder nach der Position: Kennbuchstabe -> Anzahl Stellen
+WX_FIELDS = {"c": 3, "s": 3, "g": 3, "t": 3, "r": 3, "p": 3, "P": 3, "h": 2, "b": 5, "L": 3, "l": 3}
+
+
+class Station:
+    __slots__ = ("name", "source", "kind", "lat", "lon", "symbol", "comment", "wx",
+                 "heard", "count")
+
+    def __init__(self, name, source, kind, lat, lon, symbol, comment, wx=None):
+        self.name = name
+        self.source = source
+        self.kind = kind  # station, object, item, weather
+        self.lat = lat
+        self.lon = lon
+        self.symbol = symbol
+        self.comment = comment
+        self.wx = wx
+        self.heard = time.monotonic()
+        self.count = 1
+
+
+def parse_wx(text):
+    # "220/004g005t077r000p000P000h50b09900..." -> dict in metrischen Einheiten
+    values = {}
+    if len(text) >= 7 and text[3] == "/":
+        values["c"], values["s"] = text[0:3], text[4:7]
+        text = text[7:]
+    i = 0
+    while i < len(text) and text[i] in WX_FIELDS:
+        width = WX_FIELDS[text[i]]
+        values[text[i]] = text[i + 1:i + 1 + width]
+        i += 1 + width
+
+    def num(key):
+        try:
+            return int(values.get(key, ""))
+        except ValueError:
+            return None
+
+    wx = {}
+    if num("t") is not None:
+        wx["temp_c"] = round((num("t") - 32) * 5 / 9, 1)
+    if num("h") is not None:
+        wx["humidity"] = 100 if num("h") == 0 else num("h")
+    if num("b") is not None:
+        wx["pressure_hpa"] = num("b") / 10.0
+    if num("s") is not None:
+        wx["wind_kmh"] = round(num("s") * 1.609, 1)
+    if num("c") is not None:
+        wx["wind_dir"] = num("c")
+    if num("g") is not None:
+        wx["gust_kmh"] = round(num("g") * 1.609, 1)
+    if num("r") is not None:
+        wx["rain_1h_mm"] = round(num("r") * 0.254, 1)
+    return wx
+
+
+def _position(body):
+    # Unkomprimierte oder komprimierte Position, liefert (dict, Rest)
+    if body[:1].isdigit():
+        return decode_uncompressed(body), body[19:]
+    if len(body) < 13:
+        raise ValueError("Position zu kurz")
+    return decode_compressed(body), body[13:]
+
+
+def parse_packet(line):
+    # TNC2-Zeile von APRS-IS -> Station, ("kill", Name) für gelöschte Objekte, oder None
+    header, sep, info = line.partition(":")
+    src, gt, rest = header.partition(">")
+    if not sep or not gt or not info:
+        return None
+    dest = rest.split(",", 1)[0]
+    kind = info[0]
+    name, what = src, "station"
+    try:
+        if kind in "!=/@":
+            body = info[8:] if kind in "/@" else info[1:]
+            pos, comment = _position(body)
+        elif kind in "`'":
+            pos, comment = decode_mice(dest, info), info[9:]
+            if comment[3:4] == "}":
+                comment = comment[4:]  # Höhe
+        elif kind == ";":
+            if len(info) < 18:
+                return None
+            name, what = info[1:10].rstrip(), "object"
+            if info[10] == "_":
+                return ("kill", name)
+            pos, comment = _position(info[18:])
+        elif kind == ")":
+            end = min((i for i in (info.find("!", 1, 11), info.find("_", 1, 11)) if i > 0),
+                      default=-1)
+            if end < 0:
+                return None
+            name, what = info[1:end], "item"
+            if info[end] == "_":
+                return ("kill", name)
+            pos, comment = _position(info[end + 1:])
+        elif kind == "}":
+            return parse_packet(info[1:])  # Third-Party (z.B. über IGate)
+        else:
+            return None
+    except (ValueError, IndexError, KeyError, StopIteration):
+        return None
+
+    lat, lon = pos["lat"], pos["lon"]
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    symbol = pos.get("table", "/") + pos.get("symbol", "?")
+    wx = None
+    if symbol[1] == "_":
+        wx = parse_wx(comment)
+        if "course" in pos and "wind_dir" not in wx:
+            # Komprimiert: Wind in Kurs/Geschwindigkeit
+            wx["wind_dir"] = pos["course"]
+            wx["wind_kmh"] = round(pos.get("speed_kmh", 0) * 1.609 / 1.852, 1)
+        what = "weather" if what == "station" else what
+        comment = ""
+    return Station(name, src, what, lat, lon, symbol, comment.strip()[:MAX_COMMENT], wx)
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dl = math.radians(lon2 - lon1)
+    y = math.sin(dl) * math.cos(p2)
+    x = math.cos(p1) * math.sin(p2) - math.sin(p1) * math.cos(p2) * math.cos(dl)
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+
+class SpatialIndex:
+    # Raster aus cell_deg x cell_deg Zellen; Einträge in Empfangsreihenfolge (OrderedDict),
+    # damit abgelaufene und überzählige Stationen in O(1) vorne entfernt werden
+    def __init__(self, cell_deg=0.1, max_entries=2000, ttl=3600):
+        self.cell_deg = cell_deg
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.inserted = 0
+        self.evicted = 0
+
+        self._cols = int(round(360 / cell_deg))
+        self._stations = OrderedDict()
+        self._cells = {}  # (Zeile, Spalte) -> {Name: Station}
+
+    def __len__(self):
+        return len(self._stations)
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_deg)),
+                int(math.floor((lon + 180) / self.cell_deg)) % self._cols)
+
+    def _unlink(self, station):
+        cell = self._cell(station.lat, station.lon)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(station.name, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def update(self, station):
+        old = self._stations.pop(station.name, None)
+        if old is not None:
+            self._unlink(old)
+            station.count = old.count + 1
+        self._stations[station.name] = station
+        self._cells.setdefault(self._cell(station.lat, station.lon), {})[station.name] = station
+        self.inserted += 1
+        self.expire(station.heard)
+
+    def remove(self, name):
+        station = self._stations.pop(name, None)
+        if station is not None:
+            self._unlink(station)
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        stations = self._stations
+        while stations:
+            name, oldest = next(iter(stations.items()))
+            if len(stations) <= self.max_entries and now - oldest.heard < self.ttl:
+                break
+            del stations[name]
+            self._unlink(oldest)
+            self.evicted += 1
+
+    def nearby(self, lat, lon, radius_km, limit=None):
+        # Nur die Zellen im Umkreis-Rechteck durchsuchen, nach Entfernung sortiert
+        self.expire()
+        dlat = radius_km / KM_PER_DEG
+        dlon = min(180.0, radius_km / (KM_PER_DEG * max(math.cos(math.radians(lat)), 0.01)))
+        row0, col0 = self._cell(lat - dlat, lon - dlon)
+        row1, col1 = self._cell(lat + dlat, lon + dlon)
+        ncols = (col1 - col0) % self._cols + 1
+        if (row1 - row0 + 1) * ncols > len(self._cells):
+            # Mehr Zellen im Rechteck als belegte Zellen: belegte direkt prüfen
+            buckets = self._cells.values()
+        else:
+            buckets = [self._cells[(r, (col0 + c) % self._cols)]
+                       for r in range(row0, row1 + 1) for c in range(ncols)
+                       if (r, (col0 + c) % self._cols) in self._cells]
+
+        found = []
+        for bucket in buckets:
+            for st in bucket.values():
+                if abs(st.lat - lat) > dlat:
+                    continue
+                d = distance_m(lat, lon, st.lat, st.lon) / 1000.0
+                if d <= radius_km:
+                    found.append((d, st))
+        found.sort(key=lambda item: item[0])
+        return found[:limit] if limit else found
+
+    def stats(self):
+        return {"stations": len(self._stations), "cells": len(self._cells),
+                "inserted": self.inserted, "evicted": self.evicted}
+
+
+class Receiver:
+    # Verbindet AprsIsClient (Zeilen) mit dem Index und hält den Serverfilter aktuell
+    def __init__(self, index, range_km=50):
+        self.index = index
+        self.range_km = range_km
+        self.position = None  # eigene Position, Mittelpunkt der Abfragen
+        self.filter_center = None
+        self.packets = 0
+        self.ignored = 0
+
+    def update_position(self, lat, lon):
+        # Liefert einen neuen Serverfilter, wenn sich die Position um mehr als ein Viertel
+        # des Radius verschoben hat (sonst ständige Filterwechsel), sonst None
+        self.position = (lat, lon)
+        if (self.filter_center is not None
+                and distance_m(lat, lon, *self.filter_center) / 1000.0 <= self.range_km / 4):
+            return None
+        self.filter_center = (lat, lon)
+        return f"r/{lat:.2f}/{lon:.2f}/{self.range_km:g}"
+
+    def handle_line(self, raw):
+        if raw.startswith(b"#"):
+            return
+        self.packets += 1
+        result = parse_packet(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+        if result is None:
+            self.ignored += 1
+        elif isinstance(result, tuple):
+            self.index.remove(result[1])
+        else:
+            self.index.update(result)
+
+    def query(self, command):
+        parts = command.split()
+        if not parts or parts[0] == "stats":
+            return dict(self.index.stats(), packets=self.packets, ignored=self.ignored,
+                        position=self.position, range_km=self.range_km)
+        if parts[0] != "nearby":
+            return {"error": f"unbekannter Befehl: {parts[0]}"}
+        try:
+            radius = float(parts[1]) if len(parts) > 1 else self.range_km
+            limit = int(parts[2]) if len(parts) > 2 else 10
+        except ValueError:
+            return {"error": "Format: nearby [km] [anzahl]"}
+        if self.position is None:
+            return {"center": None, "stations": []}
+        lat, lon = self.position
+        now = time.monotonic()
+        return {
+            "center": [lat, lon],
+            "radius_km": radius,
+            "stations": [{
+                "name": st.name, "kind": st.kind, "lat": round(st.lat, 5), "lon": round(st.lon, 5),
+                "dist_km": round(d, 2), "bearing": round(bearing(lat, lon, st.lat, st.lon)),
+                "symbol": st.symbol, "age_s": round(now - st.heard), "comment": st.comment,
+                "wx": st.wx,
+            } for d, st in self.index.nearby(lat, lon, radius, limit)],
+        }
+
+    async def serve(self, path):
+        # Einzeiliges Protokoll: Befehl rein, eine JSON-Zeile raus
+        async def handle(reader, writer):
+            try:
+                line = await asyncio.wait_for(reader.readline(), 2)
+                reply = self.query(line.decode("utf-8", errors="replace").strip())
+                writer.write(json.dumps(reply, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+            except (OSError, asyncio.TimeoutError):
+                pass
+            finally:
+                writer.close()
+
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        server = await asyncio.start_unix_server(handle, path)
+        os.chmod(path, 0o666)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            server.close()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def _bench(count=50000, queries=2000):
+    import random
+
+    from aprs_packet import build_position
+
+    rnd = random.Random(1)
+    lines = []
+    for i in range(count):
+        lat, lon = 47.3 + rnd.uniform(-1.5, 1.5), 11.0 + rnd.uniform(-3, 3)
+        fmt = ("uncompressed", "compressed", "mice")[i % 3]
+        lines.append(build_position(fmt, f"OE{i % 10}X{i % 5000:04d}", lat, lon, 500.0, 30.0,
+                                    "/", ">", "Test", course=90.0, utc=time.time()).encode())
+
+    index = SpatialIndex(max_entries=2000)
+    rx = Receiver(index, 50)
+    t0 = time.perf_counter()
+    for raw in lines:
+        rx.handle_line(raw)
+    dt = time.perf_counter() - t0
+    print(f"Parsen + Einfügen: {count} Pakete in {dt:.2f}s = {count / dt:.0f}/s "
+          f"({len(index)} Stationen im Index, {index.evicted} verdrängt, {rx.ignored} ignoriert)")
+
+    centers = [(47.3 + rnd.uniform(-1, 1), 11.0 + rnd.uniform(-2, 2)) for _ in range(queries)]
+    t0 = time.perf_counter()
+    for lat, lon in centers:
+        index.nearby(lat, lon, 25, 10)
+    dt_index = time.perf_counter() - t0
+
+    stations = list(index._stations.values())
+    t0 = time.perf_counter()
+    for lat, lon in centers:
+        found = sorted((distance_m(lat, lon, s.lat, s.lon) / 1000.0, s.name) for s in stations)
+        [f for f in found if f[0] <= 25][:10]
+    dt_linear = time.perf_counter() - t0
+    print(f"Umkreis 25 km: Raster {dt_index / queries * 1e6:.0f} µs/Abfrage, "
+          f"linear {dt_linear / queries * 1e6:.0f} µs/Abfrage")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="APRS-IS Empfang und Umkreis-Index")
+    ap.add_argument("--bench", action="store_true", help="Parsen und Umkreissuche messen")
+    args = ap.parse_args()
+    if args.bench:
+        _bench()
+    else:
+        ap.print_help()
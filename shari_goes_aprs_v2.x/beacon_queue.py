@@ -0,0 +1,119 @@
+# beacon_queue.py
+# Autor: OE9SAU
+# Beschreibung: Zwischenspeicher (SQLite, WAL) für Positionen, die während eines
+#               APRS-IS Ausfalls nicht gesendet werden konnten
+# Version: 1.2
+
+import sqlite3
+import time
+from collections import deque
+
+
+class QueuedFix:
+    __slots__ = ("id", "utc", "latitude", "longitude", "altitude", "speed_kmh", "course", "call")
+
+    def __init__(self, id, utc, latitude, longitude, altitude, speed_kmh, course, call=None):
+        self.id = id
+        self.utc = utc
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.speed_kmh = speed_kmh
+        self.course = course
+        self.call = call
+
+
+class BeaconQueue:
+    def __init__(self, path, max_entries=10000, max_age_days=7, drain_interval=2.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.drain_interval = drain_interval
+
+        self.queued_total = 0
+        self.drained_total = 0
+        self.evicted_total = 0
+        self.discarded_total = 0  # nicht gesendet: Duplikat, Station nicht mehr konfiguriert
+        self._drain_times = deque(maxlen=256)
+
+        self.db = sqlite3.connect(path, isolation_level=None)
+        # WAL + synchronous=NORMAL: absturzsicher, aber nur ein fsync pro Checkpoint
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " utc REAL NOT NULL,"
+            " lat REAL NOT NULL, lon REAL NOT NULL,"
+            " alt REAL, speed REAL, course REAL, call TEXT)")
+        # Warteschlangen aus Version 1.0 haben noch keine Spalte für das Rufzeichen
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(queue)")]
+        if "call" not in columns:
+            self.db.execute("ALTER TABLE queue ADD COLUMN call TEXT")
+        self.depth = self.db.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+        if self.depth:
+            print(f"Warteschlange: {self.depth} ungesendete Positionen aus {path} geladen.")
+
+    def close(self):
+        self.db.close()
+
+    def push(self, fix, call=None):
+        utc = fix.utc if fix.utc is not None else time.time()
+        self.db.execute(
+            "INSERT INTO queue (utc, lat, lon, alt, speed, course, call) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (utc, fix.latitude, fix.longitude, fix.altitude, fix.speed_kmh, fix.course, call))
+        self.depth += 1
+        self.queued_total += 1
+        self._evict()
+
+    def _evict(self):
+        # Zu alte Einträge und alles über MAX_ENTRIES (älteste zuerst) verwerfen
+        cur = self.db.execute("DELETE FROM queue WHERE utc < ?", (time.time() - self.max_age,))
+        evicted = cur.rowcount
+        if self.depth - evicted > self.max_entries:
+            cur = self.db.execute(
+                "DELETE FROM queue WHERE id IN (SELECT id FROM queue ORDER BY id LIMIT ?)",
+                (self.depth - evicted - self.max_entries,))
+            evicted += cur.rowcount
+        if evicted > 0:
+            self.depth -= evicted
+            self.evicted_total += evicted
+
+    def peek(self):
+        row = self.db.execute(
+            "SELECT id, utc, lat, lon, alt, speed, course, call FROM queue ORDER BY id LIMIT 1").fetchone()
+        return QueuedFix(*row) if row else None
+
+    def _delete(self, entry):
+        # Während des Sendens kann push() den Eintrag schon verdrängt haben (_evict):
+        # dann nicht noch einmal zählen
+        deleted = self.db.execute("DELETE FROM queue WHERE id = ?", (entry.id,)).rowcount
+        self.depth -= deleted
+        return deleted
+
+    def remove(self, entry):
+        # Eintrag wurde nachgesendet
+        if self._delete(entry):
+            self.drained_total += 1
+            self._drain_times.append(time.monotonic())
+
+    def discard(self, entry):
+        # Eintrag wird ohne Senden verworfen, zählt nicht zur Nachsende-Rate
+        if self._delete(entry):
+            self.discarded_total += 1
+
+    def drain_rate(self, window=60.0):
+        # Nachgesendete Pakete pro Minute im letzten Zeitfenster
+        now = time.monotonic()
+        recent = sum(1 for t in self._drain_times if now - t <= window)
+        return recent * 60.0 / window
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "queued_total": self.queued_total,
+            "drained_total": self.drained_total,
+            "evicted_total": self.evicted_total,
+            "discarded_total": self.discarded_total,
+            "drain_rate_per_min": self.drain_rate(),
+        }
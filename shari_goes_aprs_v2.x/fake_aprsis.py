@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# fake_aprsis.py
+# Autor: OE9SAU
+# Beschreibung: Lokaler APRS-IS Ersatzserver zum Testen von shari_aprs
+#               (Login/Passcode-Prüfung, logresp, Paketprüfung, Mitschnitt aller Pakete,
+#               auf Wunsch zufälliger Empfangsverkehr für Clients mit Filter)
+# Version: 1.2
+#
+# Start:  python3 fake_aprsis.py --port 14580
+# In shari_aprs.conf dann SERVER=127.0.0.1 eintragen.
+
+import argparse
+import math
+import random
+import socket
+import socketserver
+import threading
+import time
+
+from aprs_packet import build_position, decode_position
+
+
+def aprs_passcode(call):
+    call = call.split("-")[0].upper()
+    code = 0x73E2
+    for i in range(0, len(call), 2):
+        code ^= ord(call[i]) << 8
+        if i + 1 < len(call):
+            code ^= ord(call[i + 1])
+    return code & 0x7FFF
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        srv = self.server
+        self.wfile.write(f"# {srv.name} 1.0\r\n".encode())
+
+        login = self.rfile.readline().decode("utf-8", errors="replace").strip()
+        parts = login.split()
+        if len(parts) < 4 or parts[0] != "user" or parts[2] != "pass":
+            self.wfile.write(b"# invalid login\r\n")
+            return
+        call, passcode = parts[1], parts[3]
+        if srv.delay:
+            time.sleep(srv.delay)  # langsamen/entfernten Server nachbilden
+        verified = passcode.lstrip("-").isdigit() and int(passcode) == aprs_passcode(call)
+        state = "verified" if verified else "unverified"
+        self.wfile.write(f"# logresp {call} {state}, server {srv.name}\r\n".encode())
+        srv.record_login(call, verified)
+        self.rx_filter = " ".join(parts[parts.index("filter") + 1:]) if "filter" in parts else None
+        if self.rx_filter:
+            srv.filters.append((time.time(), call, self.rx_filter))
+
+        with srv._lock:
+            srv.connections.append(self.connection)
+        stopping = threading.Event()
+        if srv.traffic:
+            threading.Thread(target=self._traffic, args=(stopping,), daemon=True).start()
+        try:
+            for raw in self.rfile:
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if not line:
+                    continue
+                if line.startswith("#filter "):
+                    self.rx_filter = line[len("#filter "):].strip()
+                    srv.filters.append((time.time(), call, self.rx_filter))
+                    continue
+                srv.record(call, verified, line)
+        except OSError:
+            pass
+        finally:
+            stopping.set()
+            with srv._lock:
+                if self.connection in srv.connections:
+                    srv.connections.remove(self.connection)
+
+
+    def _traffic(self, stopping):
+        # Zufällige Stationen im Filterbereich (nur r/lat/lon/km), srv.traffic Pakete pro Minute
+        rnd = random.Random()
+        interval = 60.0 / self.server.traffic
+        while not stopping.wait(interval):
+            if not self.rx_filter or not self.rx_filter.startswith("r/"):
+                continue
+            try:
+                lat, lon, km = (float(v) for v in self.rx_filter.split()[0][2:].split("/"))
+            except ValueError:
+                continue
+            dlat = km / 111.32
+            dlon = km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+            n = rnd.randrange(500)
+            line = build_position(("uncompressed", "compressed", "mice")[n % 3], f"OE9T{n:02d}"[:6],
+                                  lat + rnd.uniform(-dlat, dlat), lon + rnd.uniform(-dlon, dlon),
+                                  500.0, rnd.uniform(0, 100), "/", ">", "Fake", course=rnd.uniform(0, 359))
+            try:
+                self.wfile.write(f"{line.replace(',TCPIP*', ',TCPIP*,qAC,' + self.server.name)}\r\n".encode())
+            except OSError:
+                return
+
+
+class FakeAprsIsServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, name="FAKEAPRSIS", verbose=False, delay=0.0,
+                 traffic=0):
+        super().__init__((host, port), _Handler)
+        self.name = name
+        self.verbose = verbose
+        self.delay = delay  # Sekunden bis zur logresp
+        self.traffic = traffic  # Pakete pro Minute an Clients mit Filter
+        self.filters = []  # (Zeit, Rufzeichen, Filter)
+        self.connections = []
+        self.logins = []
+        self.packets = []  # (Ankunftszeit, Rufzeichen, verified, Zeile)
+        self.errors = []  # (Ankunftszeit, Zeile, Fehler)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record_login(self, call, verified):
+        with self._lock:
+            self.logins.append((time.time(), call, verified))
+        if self.verbose:
+            print(f"Login: {call} ({'verified' if verified else 'unverified'})")
+
+    def record(self, call, verified, line):
+        if line.startswith("#"):
+            return
+        now = time.time()
+        try:
+            decode_position(line)
+            error = None
+        except ValueError as e:
+            error = str(e)
+        with self._lock:
+            self.packets.append((now, call, verified, line))
+            if error is not None:
+                self.errors.append((now, line, error))
+        if self.verbose:
+            print(line if error is None else f"{line}  <- UNGÜLTIG: {error}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def disconnect_all(self):
+        with self._lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        # Wie ein Serverausfall: keine neuen Logins, bestehende Verbindungen werden getrennt
+        self.shutdown()
+        self.server_close()
+        self.disconnect_all()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lokaler APRS-IS Ersatzserver")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=14580)
+    ap.add_argument("--delay", type=float, default=0.0, help="Millisekunden bis zur logresp")
+    ap.add_argument("--traffic", type=float, default=0.0,
+                    help="Zufällige Stationen pro Minute an Clients mit Filter r/lat/lon/km")
+    args = ap.parse_args()
+
+    srv = FakeAprsIsServer(args.host, args.port, verbose=True, delay=args.delay / 1000.0,
+                           traffic=args.traffic)
+    print(f"Fake APRS-IS lauscht auf {args.host}:{srv.port}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# fake_gpsd.py
+# Autor: OE9SAU
+# Beschreibung: Lokaler gpsd-Ersatz zum Testen (spielt aufgezeichnete JSON-Berichte
+#               an alle Clients ab, die ?WATCH gesendet haben)
+# Version: 1.0
+#
+# Start:  python3 fake_gpsd.py [--file gpsd_aufzeichnung.json] [--port 2947]
+# Aufzeichnen am echten gpsd z.B. mit:  gpspipe -w > gpsd_aufzeichnung.json
+
+import argparse
+import json
+import math
+import socketserver
+import threading
+import time
+
+
+def synthetic_reports(t, lat0=47.25, lon0=9.6, radius_m=500.0, period_s=120.0):
+    angle = 2 * math.pi * (t % period_s) / period_s
+    lat = lat0 + (radius_m * math.cos(angle)) / 111320.0
+    lon = lon0 + (radius_m * math.sin(angle)) / (111320.0 * math.cos(math.radians(lat0)))
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(t))
+    return [
+        json.dumps({"class": "TPV", "device": "/dev/fake", "mode": 3, "time": stamp,
+                    "lat": lat, "lon": lon, "altMSL": 450.0,
+                    "speed": 2 * math.pi * radius_m / period_s,
+                    "track": (math.degrees(angle) + 90) % 360}),
+        json.dumps({"class": "SKY", "device": "/dev/fake", "hdop": 0.9, "pdop": 1.6,
+                    "nSat": 11, "uSat": 8}),
+    ]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        srv = self.server
+        self.wfile.write(b'{"class":"VERSION","release":"fake","rev":"fake",'
+                         b'"proto_major":3,"proto_minor":14}\n')
+        for raw in self.rfile:
+            if raw.startswith(b"?WATCH"):
+                self.wfile.write(b'{"class":"DEVICES","devices":[{"class":"DEVICE",'
+                                 b'"path":"/dev/fake","activated":"fake"}]}\n')
+                self.wfile.write(b'{"class":"WATCH","enable":true,"json":true}\n')
+                break
+        with srv.lock:
+            srv.clients.append(self.wfile)
+        try:
+            # Verbindung offen halten, bis der Client trennt
+            for _ in self.rfile:
+                pass
+        finally:
+            with srv.lock:
+                if self.wfile in srv.clients:
+                    srv.clients.remove(self.wfile)
+
+
+class FakeGpsd(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, path=None, speed=1.0):
+        super().__init__((host, port), _Handler)
+        self.path = path
+        self.speed = speed
+        self.clients = []
+        self.lock = threading.Lock()
+        self.sent = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def _epochs(self):
+        if self.path:
+            epochs, current = [], []
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line.startswith("{"):
+                        continue
+                    if '"class":"TPV"' in line.replace(" ", "") and current:
+                        epochs.append(current)
+                        current = []
+                    current.append(line)
+            if current:
+                epochs.append(current)
+            while True:
+                yield from epochs
+        t = int(time.time())
+        while True:
+            yield synthetic_reports(t)
+            t += 1
+
+    def replay(self):
+        interval = 1.0 / self.speed if self.speed > 0 else 0.0
+        for epoch in self._epochs():
+            data = "".join(line + "\n" for line in epoch).encode()
+            with self.lock:
+                clients = list(self.clients)
+            for wfile in clients:
+                try:
+                    wfile.write(data)
+                except OSError:
+                    pass
+            self.sent += 1
+            time.sleep(interval)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        threading.Thread(target=self.replay, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lokaler gpsd-Ersatz")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2947)
+    ap.add_argument("--file", help="Aufzeichnung von gpspipe -w (ohne: synthetische Kreisfahrt)")
+    ap.add_argument("--speed", type=float, default=1.0, help="Zeitraffer-Faktor")
+    args = ap.parse_args()
+
+    srv = FakeGpsd(args.host, args.port, args.file, args.speed).start()
+    print(f"Fake gpsd lauscht auf {args.host}:{srv.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# fake_kiss.py
+# Autor: OE9SAU
+# Beschreibung: Lokaler KISS-TNC Ersatz (wie Direwolf Port 8001 oder serieller TNC über pty)
+#               zum Testen von kiss.py: dekodiert jeden AX.25 UI-Rahmen, prüft das
+#               APRS-Paket und schneidet mit; auf Wunsch "gehörte" Rahmen an die Clients
+# Version: 1.0
+#
+# Start:  python3 fake_kiss.py --port 8001     bzw.  python3 fake_kiss.py --serial
+# In shari_aprs.conf dann [KISS] HOST=127.0.0.1 bzw. DEVICE=/dev/pts/N eintragen.
+
+import argparse
+import os
+import socket
+import socketserver
+import threading
+import time
+import tty
+
+from aprs_packet import decode_position
+from kiss import KissDecoder, decode_ui, kiss_encode, ui_frame
+
+HEARD = "OE9DIG>APDW16,WIDE2-1:!4716.00N/00937.00E#Digipeater"
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        srv = self.server
+        with srv.lock:
+            srv.connections.append(self.request)
+        stopping = threading.Event()
+        if srv.beacon_interval:
+            threading.Thread(target=srv.heard_loop, args=(self.request.sendall, stopping),
+                             daemon=True).start()
+        decoder = KissDecoder()
+        try:
+            while True:
+                data = self.request.recv(4096)
+                if not data:
+                    break
+                srv.feed(decoder, data)
+        except OSError:
+            pass
+        finally:
+            stopping.set()
+            with srv.lock:
+                if self.request in srv.connections:
+                    srv.connections.remove(self.request)
+
+
+class FakeKissTnc(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, serial=False, beacon_interval=0.0,
+                 verbose=False):
+        super().__init__((host, port), _Handler)
+        self.serial = serial
+        self.beacon_interval = beacon_interval  # Sekunden zwischen "gehörten" Rahmen
+        self.verbose = verbose
+        self.connections = []
+        self.packets = []  # (Ankunftszeit, Paket im TNC2-Format)
+        self.errors = []  # (Ankunftszeit, Rohdaten, Fehler)
+        self.lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.device = None
+        if serial:
+            # Serieller TNC: Client öffnet self.device, wir lesen am Master
+            self._master, self._slave = os.openpty()
+            tty.setraw(self._slave)
+            self.device = os.ttyname(self._slave)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def feed(self, decoder, data):
+        for port, frame in decoder.feed(data):
+            now = time.time()
+            try:
+                line = decode_ui(frame)
+                decode_position(line)
+                error = None
+            except (ValueError, IndexError) as e:
+                line, error = frame.hex(), str(e)
+            with self.lock:
+                if error is None:
+                    self.packets.append((now, line))
+                else:
+                    self.errors.append((now, line, error))
+            if self.verbose:
+                print(f"[{port}] {line}" if error is None else f"{line}  <- UNGÜLTIG: {error}")
+
+    def heard_loop(self, send, stopping):
+        frame = kiss_encode(ui_frame(HEARD, ()))
+        while not stopping.wait(self.beacon_interval) and not self._stopping.is_set():
+            try:
+                send(frame)
+            except OSError:
+                return
+
+    def _serial_loop(self):
+        decoder = KissDecoder()
+        stopping = threading.Event()
+        if self.beacon_interval:
+            threading.Thread(target=self.heard_loop,
+                             args=(lambda data: os.write(self._master, data), stopping),
+                             daemon=True).start()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    data = os.read(self._master, 4096)
+                except OSError:
+                    return
+                self.feed(decoder, data)
+        finally:
+            stopping.set()
+
+    def start(self):
+        target = self._serial_loop if self.serial else self.serve_forever
+        threading.Thread(target=target, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self.serial:
+            for fd in (self._slave, self._master):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        else:
+            self.shutdown()
+        self.server_close()
+        with self.lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lokaler KISS-TNC Ersatz")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--serial", action="store_true", help="pty statt TCP")
+    ap.add_argument("--heard", type=float, default=0.0,
+                    help="alle N Sekunden einen gehörten Rahmen an die Clients schicken")
+    args = ap.parse_args()
+
+    tnc = FakeKissTnc(args.host, 0 if args.serial else args.port, serial=args.serial,
+                      beacon_interval=args.heard, verbose=True)
+    print(f"Fake KISS-TNC: {tnc.device if args.serial else f'{args.host}:{tnc.port}'}")
+    try:
+        if args.serial:
+            tnc._serial_loop()
+        else:
+            tnc.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tnc.stop()
+
+
+if __name__ == "__main__":
+    main()
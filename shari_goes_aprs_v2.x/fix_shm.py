@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# fix_shm.py
+# Autor: OE9SAU
+# Beschreibung: Letzten GPS-Fix für andere lokale Prozesse (OLED-Anzeige, SVXLink, Dashboard)
+#               in einer gemeinsamen Speicherseite bereitstellen (mmap auf /dev/shm).
+#               Ein Schreiber, beliebig viele Leser ohne Sperren: Seqlock-Zähler (ungerade =
+#               wird geschrieben) plus CRC32 über den Datensatz, Leser versuchen es einfach neu.
+# Version: 1.0
+#
+# Lesen in eigenen Programmen:
+#     from fix_shm import FixReader
+#     fix = FixReader().read()   # None ohne Fix, sonst fix.latitude, fix.age() ...
+#
+# Aktuellen Fix anzeigen:  python3 fix_shm.py [--watch]
+# Selbsttest/Benchmark:    python3 fix_shm.py --selftest / --bench
+
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+DEFAULT_PATH = "/dev/shm/shari_aprs_fix"
+MAGIC = b"SHFX"
+VERSION = 1
+
+# Kopf: Magic, Version, frei, Seqlock-Zähler
+_HEADER = struct.Struct("<4sHHI")
+_LOCK = struct.Struct("<I")
+LOCK_OFFSET = 8
+# Datensatz: Fix-Nummer, lat, lon, alt, km/h, Kurs, HDOP, PDOP, GPS-Zeit, CLOCK_MONOTONIC
+# beim Empfang, Satelliten, Qualität; danach CRC32 des Datensatzes. NaN bzw. -1 = unbekannt
+_RECORD = struct.Struct("<Q9d2i")
+_CRC = struct.Struct("<I")
+RECORD_OFFSET = _HEADER.size
+CRC_OFFSET = RECORD_OFFSET + _RECORD.size
+SIZE = CRC_OFFSET + _CRC.size
+
+_NAN = float("nan")
+
+
+class SharedFix(namedtuple("SharedFix", "seq latitude longitude altitude speed_kmh course hdop "
+                                        "pdop utc timestamp sats quality")):
+    __slots__ = ()
+
+    def age(self):
+        # CLOCK_MONOTONIC gilt systemweit, daher auch für andere Prozesse vergleichbar
+        return time.monotonic() - self.timestamp
+
+
+def _opt(value):
+    return _NAN if value is None else float(value)
+
+
+def _none(value):
+    return None if math.isnan(value) else value
+
+
+class FixPublisher:
+    # Schreibt jeden neuen Fix (FixSource.listeners); genau ein Schreiber pro Datei
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.published = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Bestehende Datei weiterverwenden: Leser behalten ihre Abbildung über einen Neustart
+            if os.fstat(fd).st_size != SIZE:
+                os.ftruncate(fd, SIZE)
+            self._mm = mmap.mmap(fd, SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        magic, version, _, lock = _HEADER.unpack_from(self._mm, 0)
+        # Ein beim Schreiben abgebrochener Vorgänger hinterlässt einen ungeraden Zähler
+        self._lock = lock + (lock & 1)
+        _LOCK.pack_into(self._mm, LOCK_OFFSET, self._lock)
+        if magic != MAGIC or version != VERSION:
+            self.clear()
+            _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0, self._lock)
+
+    def _write(self, record):
+        mm = self._mm
+        self._lock += 1
+        _LOCK.pack_into(mm, LOCK_OFFSET, self._lock)  # ungerade: wird geschrieben
+        mm[RECORD_OFFSET:CRC_OFFSET] = record
+        _CRC.pack_into(mm, CRC_OFFSET, zlib.crc32(record))
+        self._lock += 1
+        _LOCK.pack_into(mm, LOCK_OFFSET, self._lock)
+
+    def publish(self, fix):
+        self._write(_RECORD.pack(
+            fix.seq, fix.latitude, fix.longitude, _opt(fix.altitude), _opt(fix.speed_kmh),
+            _opt(fix.course), _opt(fix.hdop), _opt(fix.pdop), _opt(fix.utc), fix.timestamp,
+            -1 if fix.sats is None else fix.sats, fix.quality))
+        self.published += 1
+
+    def clear(self):
+        # Kein Fix mehr (Dienst beendet): Fix-Nummer 0
+        self._write(_RECORD.pack(0, *([_NAN] * 8), 0.0, -1, 0))
+
+    def close(self):
+        self.clear()
+        self._mm.close()
+
+
+class FixReader:
+    # Sperrfreies Lesen, auch aus Prozessen ohne Schreibrechte
+    def __init__(self, path=DEFAULT_PATH, timeout=0.5):
+        self.path = path
+        self.timeout = timeout  # Schreiber beim Schreiben abgestürzt: nicht ewig warten
+        self.torn = 0  # Lesevorgänge, die wegen gleichzeitigem Schreiben wiederholt wurden
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(fd, SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        if self._mm[:4] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} ist keine shari_aprs Fix-Datei")
+
+    def seq(self):
+        # Nur die Fix-Nummer: billig genug, um auf einen neuen Fix zu warten
+        return struct.unpack_from("<Q", self._mm, RECORD_OFFSET)[0]
+
+    def read(self):
+        # Liefert SharedFix oder None (noch kein Fix bzw. Dienst beendet)
+        mm = self._mm
+        spins = 0
+        deadline = None
+        while True:
+            before = _LOCK.unpack_from(mm, LOCK_OFFSET)[0]
+            if not before & 1:
+                record = mm[RECORD_OFFSET:CRC_OFFSET]
+                crc = _CRC.unpack_from(mm, CRC_OFFSET)[0]
+                if _LOCK.unpack_from(mm, LOCK_OFFSET)[0] == before and zlib.crc32(record) == crc:
+                    break
+            self.torn += 1
+            spins += 1
+            if spins % 32 == 0:
+                # Schreiber wurde mitten im Schreiben unterbrochen (z.B. Pi Zero mit einem Kern):
+                # CPU abgeben statt die ganze Zeitscheibe zu drehen
+                os.sched_yield()
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                elif now > deadline:
+                    raise TimeoutError(f"{self.path}: kein konsistenter Stand (Schreiber hängt?)")
+        values = _RECORD.unpack(record)
+        if not values[0]:
+            return None
+        return SharedFix(values[0], values[1], values[2], _none(values[3]), _none(values[4]),
+                         _none(values[5]), _none(values[6]), _none(values[7]), _none(values[8]),
+                         values[9], None if values[10] < 0 else values[10], values[11])
+
+    def close(self):
+        self._mm.close()
+
+
+def _writer_process(path, count):
+    # Für Selbsttest/Benchmark: schreibt so schnell wie möglich Fixe mit prüfbarem Inhalt
+    from gps_reader import GpsFix
+
+    publisher = FixPublisher(path)
+    for i in range(1, count + 1):
+        publisher.publish(GpsFix(i * 1e-6, -i * 1e-6, float(i), float(i), time.monotonic(), i,
+                                 course=float(i % 360), sats=i % 20, hdop=i / 1000.0))
+    publisher._mm.close()
+
+
+def _consistent(fix):
+    i = fix.seq
+    return (fix.latitude == i * 1e-6 and fix.longitude == -i * 1e-6
+            and fix.altitude == float(i) and fix.sats == i % 20)
+
+
+def _selftest():
+    import multiprocessing
+    import tempfile
+
+    from gps_reader import GpsFix
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fix")
+        publisher = FixPublisher(path)
+        reader = FixReader(path)
+        assert reader.read() is None
+        publisher.publish(GpsFix(47.25, 9.6, 450.0, 30.0, time.monotonic(), 7, course=None,
+                                 sats=8, hdop=0.9, utc=1.7e9))
+        fix = reader.read()
+        assert (fix.seq, fix.latitude, fix.longitude, fix.course, fix.sats) == (7, 47.25, 9.6, None, 8)
+        assert 0 <= fix.age() < 1 and reader.seq() == 7
+        # Neustart des Schreibers: Leser behält die Abbildung
+        publisher._mm.close()
+        publisher = FixPublisher(path)
+        publisher.publish(GpsFix(47.0, 9.0, 400.0, 0.0, time.monotonic(), 8))
+        assert reader.read().seq == 8
+        publisher.close()
+        assert reader.read() is None
+        # Schreiber mitten im Schreiben abgestürzt: Leser wartet nicht ewig
+        publisher = FixPublisher(path)
+        _LOCK.pack_into(publisher._mm, LOCK_OFFSET, publisher._lock + 1)
+        reader.timeout = 0.1
+        try:
+            reader.read()
+            raise AssertionError("ungerader Zähler nicht erkannt")
+        except TimeoutError:
+            pass
+        publisher._mm.close()
+        FixPublisher(path)._mm.close()  # Neustart macht den Zähler wieder gerade
+        assert reader.read() is None
+
+        # Gleichzeitiges Schreiben in einem anderen Prozess: nie ein gemischter Datensatz
+        proc = multiprocessing.Process(target=_writer_process, args=(path, 300000))
+        proc.start()
+        reads = 0
+        while proc.is_alive():
+            fix = reader.read()
+            if fix is not None:
+                assert _consistent(fix), fix
+                reads += 1
+        proc.join()
+        assert _consistent(reader.read())
+        print(f"Selbsttest OK: {reads} Lesevorgänge während des Schreibens, "
+              f"{reader.torn} erkannte Überschneidungen wiederholt, keine inkonsistent")
+
+
+def _bench(rounds=200000):
+    import multiprocessing
+    import tempfile
+
+    from gps_reader import GpsFix
+
+    def measure(reader, n):
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter_ns()
+            reader.read()
+            samples.append(time.perf_counter_ns() - t0)
+        samples.sort()
+        return samples[n // 2] / 1000, samples[int(n * 0.99)] / 1000, samples[-1] / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fix")
+        publisher = FixPublisher(path)
+        fix = GpsFix(47.25, 9.6, 450.0, 30.0, time.monotonic(), 1, course=90.0, sats=8, hdop=0.9)
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            publisher.publish(fix)
+        print(f"Schreiben:                   {(time.perf_counter() - t0) / rounds * 1e6:.2f} µs pro Fix")
+
+        reader = FixReader(path)
+        p50, p99, worst = measure(reader, rounds)
+        print(f"Lesen ohne Schreiber:        p50 {p50:.2f} µs, p99 {p99:.2f} µs, max {worst:.1f} µs")
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            reader.seq()
+        print(f"Nur Fix-Nummer (seq):        {(time.perf_counter() - t0) / rounds * 1e6:.2f} µs")
+
+        proc = multiprocessing.Process(target=_writer_process, args=(path, 10 ** 7))
+        proc.start()
+        time.sleep(0.2)
+        p50, p99, worst = measure(reader, rounds)
+        proc.terminate()
+        proc.join()
+        print(f"Lesen, Schreiber im Dauerlauf: p50 {p50:.2f} µs, p99 {p99:.2f} µs, "
+              f"max {worst:.1f} µs, {reader.torn} Wiederholungen")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Letzten GPS-Fix aus shari_aprs lesen")
+    ap.add_argument("--path", default=DEFAULT_PATH)
+    ap.add_argument("--watch", action="store_true", help="bei jedem neuen Fix ausgeben")
+    ap.add_argument("--selftest", action="store_true")
+    ap.add_argument("--bench", action="store_true")
+    args = ap.parse_args()
+    if args.selftest:
+        _selftest()
+    if args.bench:
+        _bench()
+    if not (args.selftest or args.bench):
+        reader = FixReader(args.path)
+        last = None
+        while True:
+            fix = reader.read()
+            if fix is None:
+                print("Kein Fix.")
+            elif fix.seq != last:
+                last = fix.seq
+                print(f"#{fix.seq} {fix.latitude:.6f} {fix.longitude:.6f} "
+                      f"{fix.altitude if fix.altitude is not None else '-'} m "
+                      f"{fix.speed_kmh if fix.speed_kmh is not None else '-'} km/h "
+                      f"Sats {fix.sats if fix.sats is not None else '-'} "
+                      f"HDOP {fix.hdop if fix.hdop is not None else '-'} (Alter {fix.age():.1f} s)")
+            if not args.watch:
+                break
+            time.sleep(0.1)
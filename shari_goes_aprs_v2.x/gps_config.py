@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# gps_config.py
+# Autor: OE9SAU
+# Beschreibung: GPS-Empfänger beim Öffnen der Schnittstelle einstellen: u-blox (UBX) oder
+#               MediaTek (PMTK) erkennen, unnötige Sätze abschalten, Ausgaberate,
+#               Baudrate und Fahrzeugmodus setzen, jeweils mit ACK-Prüfung.
+#               Nichts wird im Empfänger gespeichert: nach einem Stromausfall gilt wieder die
+#               Werkseinstellung, die Baudrate wird beim nächsten Öffnen neu gesucht.
+# Version: 1.0
+#
+# Selbsttest mit pty-Emulator:  python3 gps_config.py --selftest
+# CPU-Messung vorher/nachher:   python3 gps_config.py --bench
+
+import asyncio
+import os
+import struct
+import time
+
+from nmea import checksum_ok, xor_checksum
+
+# Übliche Baudraten, in dieser Reihenfolge durchprobiert
+COMMON_BAUDS = (9600, 38400, 115200, 57600, 19200, 4800)
+NMEA_SENTENCES = ("GGA", "GLL", "GSA", "GSV", "RMC", "VTG", "ZDA")
+UBX_NMEA_IDS = {"GGA": 0x00, "GLL": 0x01, "GSA": 0x02, "GSV": 0x03, "RMC": 0x04, "VTG": 0x05,
+                "ZDA": 0x08}
+PMTK314_FIELDS = ("GLL", "RMC", "VTG", "GGA", "GSA", "GSV")
+# UBX CFG-NAV5 dynModel bzw. PMTK886 Navigationsmodus
+UBX_DYN_MODELS = {"portable": 0, "stationary": 2, "pedestrian": 3, "automotive": 4, "sea": 5,
+                  "airborne1g": 6}
+MTK_NAV_MODES = {"portable": 0, "automotive": 0, "pedestrian": 1, "airborne1g": 2}
+
+
+def ubx_frame(cls, msg_id, payload=b""):
+    body = struct.pack("<BBH", cls, msg_id, len(payload)) + payload
+    a = b = 0
+    for c in body:
+        a = (a + c) & 0xFF
+        b = (b + a) & 0xFF
+    return b"\xb5\x62" + body + bytes((a, b))
+
+
+def find_ubx(buf, cls, msg_id):
+    # Erstes gültiges UBX-Paket cls/msg_id im Puffer, liefert die Nutzdaten oder None
+    start = 0
+    while True:
+        i = buf.find(b"\xb5\x62", start)
+        if i < 0 or len(buf) < i + 8:
+            return None
+        length = struct.unpack_from("<H", buf, i + 4)[0]
+        frame = buf[i:i + 8 + length]
+        if (len(frame) == 8 + length and buf[i + 2] == cls and buf[i + 3] == msg_id
+                and ubx_frame(cls, msg_id, frame[6:-2]) == frame):
+            return frame[6:-2]
+        start = i + 2
+
+
+def pmtk(body):
+    return f"${body}*{xor_checksum(body.encode('ascii')):02X}\r\n".encode("ascii")
+
+
+def find_pmtk(buf, prefix):
+    # Erster PMTK-Satz mit gültiger Prüfsumme, der mit prefix beginnt (z.B. "PMTK001,314,")
+    for line in buf.split(b"\n"):
+        line = line.strip()
+        start = line.find(b"$" + prefix.encode("ascii"))
+        if start >= 0 and checksum_ok(line[start:]):
+            return line[start + 1:-3].decode("ascii", errors="replace")
+    return None
+
+
+def count_nmea(buf):
+    # Vollständige Sätze mit gültiger Prüfsumme (Erkennung der richtigen Baudrate)
+    return sum(1 for line in buf.split(b"\n") if line.strip()[:1] == b"$"
+               and checksum_ok(line.strip()))
+
+
+class ReceiverConfig:
+    def __init__(self, baudrate=38400, rate_hz=1.0, sentences=("GGA", "RMC"),
+                 dyn_model="automotive", timeout=1.5):
+        self.baudrate = baudrate
+        self.rate_hz = rate_hz
+        self.sentences = tuple(s.upper() for s in sentences)
+        self.dyn_model = dyn_model
+        self.timeout = timeout
+
+        # Ergebnis der letzten Konfiguration
+        self.kind = None  # "ublox", "mtk" oder "generic"
+        self.version = None
+        self.acked = []
+        self.failed = []
+
+    @classmethod
+    def from_config(cls, section):
+        # AUTOCONFIG=false bzw. nicht gesetzt: None
+        if not section.getboolean('AUTOCONFIG', False):
+            return None
+        dyn_model = section.get('AUTOCONFIG_MODEL', 'automotive').lower()
+        if dyn_model not in UBX_DYN_MODELS:
+            print(f"Fehler: Unbekanntes AUTOCONFIG_MODEL '{dyn_model}', verwende automotive.")
+            dyn_model = 'automotive'
+        return cls(
+            baudrate=section.getint('AUTOCONFIG_BAUDRATE', 38400),
+            rate_hz=section.getfloat('AUTOCONFIG_RATE', 1),
+            sentences=[s.strip() for s in section.get('AUTOCONFIG_SENTENCES', 'GGA,RMC').split(',')
+                       if s.strip()],
+            dyn_model=dyn_model,
+        )
+
+    async def _read(self, ser, duration, until=None):
+        # Nicht blockierend lesen (Serial mit timeout=0), bis duration abgelaufen ist
+        # oder until(puffer) etwas liefert
+        buf = b""
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            data = ser.read(ser.in_waiting or 1)
+            if data:
+                buf += data
+                if until is not None:
+                    result = until(buf)
+                    if result is not None:
+                        return buf, result
+            else:
+                await asyncio.sleep(0.02)
+        return buf, None
+
+    async def _nmea_at(self, ser, baud):
+        ser.baudrate = baud
+        ser.reset_input_buffer()
+        _, ok = await self._read(ser, self.timeout,
+                                 lambda buf: True if count_nmea(buf) >= 2 else None)
+        return ok is not None
+
+    async def _find_baud(self, ser, first):
+        for baud in dict.fromkeys((first, self.baudrate) + COMMON_BAUDS):
+            if await self._nmea_at(ser, baud):
+                return baud
+        return None
+
+    async def _ubx(self, ser, cls, msg_id, payload, name):
+        ser.write(ubx_frame(cls, msg_id, payload))
+        _, result = await self._read(ser, self.timeout, lambda buf: (
+            "ack" if find_ubx(buf, 0x05, 0x01) == bytes((cls, msg_id)) else
+            "nak" if find_ubx(buf, 0x05, 0x00) == bytes((cls, msg_id)) else None))
+        (self.acked if result == "ack" else self.failed).append(name)
+        return result == "ack"
+
+    async def _pmtk(self, ser, body, name):
+        ser.write(pmtk(body))
+        cmd = body[4:].split(",")[0]
+        _, reply = await self._read(ser, self.timeout,
+                                    lambda buf: find_pmtk(buf, f"PMTK001,{cmd},"))
+        ok = reply is not None and reply.endswith(",3")
+        (self.acked if ok else self.failed).append(name)
+        return ok
+
+    async def _detect(self, ser):
+        # Versionsabfrage beider Protokolle, wer antwortet, ist es
+        ser.reset_input_buffer()
+        ser.write(ubx_frame(0x0A, 0x04) + pmtk("PMTK605"))
+
+        def answer(buf):
+            ver = find_ubx(buf, 0x0A, 0x04)
+            if ver is not None:
+                return "ublox", ver[:30].rstrip(b"\0").decode("ascii", errors="replace")
+            mtk = find_pmtk(buf, "PMTK705,")
+            if mtk is not None:
+                return "mtk", mtk.split(",", 1)[1]
+            return None
+
+        _, result = await self._read(ser, self.timeout, answer)
+        return result or ("generic", None)
+
+    async def _switch_baud(self, ser, old, command):
+        # Befehl senden, umschalten und prüfen, ob auf der neuen Baudrate gültige Sätze kommen.
+        # Sonst zurück auf die alte Baudrate (Empfänger hat den Befehl nicht angenommen).
+        ser.write(command)
+        ser.flush()
+        await asyncio.sleep(0.1)
+        if await self._nmea_at(ser, self.baudrate):
+            self.acked.append(f"baud {self.baudrate}")
+            return self.baudrate
+        self.failed.append(f"baud {self.baudrate}")
+        if await self._nmea_at(ser, old):
+            return old
+        return await self._find_baud(ser, old)
+
+    async def _configure_ublox(self, ser, baud):
+        for name in NMEA_SENTENCES:
+            rate = 1 if name in self.sentences else 0
+            await self._ubx(ser, 0x06, 0x01, bytes((0xF0, UBX_NMEA_IDS[name], rate)),
+                            f"{name} {'an' if rate else 'aus'}")
+        meas_ms = int(round(1000 / self.rate_hz))
+        await self._ubx(ser, 0x06, 0x08, struct.pack("<HHH", meas_ms, 1, 1), f"rate {meas_ms} ms")
+        nav5 = struct.pack("<HB", 0x0001, UBX_DYN_MODELS[self.dyn_model]).ljust(36, b"\0")
+        await self._ubx(ser, 0x06, 0x24, nav5, f"model {self.dyn_model}")
+        if self.baudrate != baud:
+            # CFG-PRT UART1: 8N1, Eingang UBX+NMEA+RTCM, Ausgang UBX+NMEA
+            prt = struct.pack("<BBHIIHHHH", 1, 0, 0, 0x08D0, self.baudrate, 0x07, 0x03, 0, 0)
+            baud = await self._switch_baud(ser, baud, ubx_frame(0x06, 0x00, prt))
+        return baud
+
+    async def _configure_mtk(self, ser, baud):
+        fields = ["1" if name in self.sentences else "0" for name in PMTK314_FIELDS]
+        await self._pmtk(ser, "PMTK314," + ",".join(fields + ["0"] * 13),
+                         "sentences " + "+".join(n for n in PMTK314_FIELDS if n in self.sentences))
+        meas_ms = int(round(1000 / self.rate_hz))
+        await self._pmtk(ser, f"PMTK220,{meas_ms}", f"rate {meas_ms} ms")
+        await self._pmtk(ser, f"PMTK886,{MTK_NAV_MODES.get(self.dyn_model, 0)}",
+                         f"model {self.dyn_model}")
+        if self.baudrate != baud:
+            baud = await self._switch_baud(ser, baud, pmtk(f"PMTK251,{self.baudrate}"))
+        return baud
+
+    async def apply(self, ser):
+        # ser: offene pyserial-Schnittstelle mit timeout=0. Liefert die Baudrate, auf der der
+        # Empfänger danach sendet (ser ist darauf eingestellt), oder None ohne gültige Daten.
+        self.kind = self.version = None
+        self.acked, self.failed = [], []
+        start = time.monotonic()
+        original = ser.baudrate
+        baud = await self._find_baud(ser, original)
+        if baud is None:
+            # Suche hat die Baudrate verstellt: wieder auf die konfigurierte zurück
+            ser.baudrate = original
+            print(f"GPS-Konfiguration: keine gültigen NMEA-Sätze auf {ser.port}, übersprungen.")
+            return None
+        self.kind, self.version = await self._detect(ser)
+        if self.kind == "ublox":
+            baud = await self._configure_ublox(ser, baud)
+        elif self.kind == "mtk":
+            baud = await self._configure_mtk(ser, baud)
+        ser.baudrate = baud if baud is not None else original
+        print(f"GPS-Konfiguration: {self.kind}{f' ({self.version})' if self.version else ''}, "
+              f"{baud} Baud, bestätigt: {', '.join(self.acked) or '-'}"
+              f"{f', abgelehnt: ' + ', '.join(self.failed) if self.failed else ''} "
+              f"({time.monotonic() - start:.1f} s)")
+        return baud
+
+
+def _open(device, baud):
+    import serial
+
+    return serial.Serial(device, baudrate=baud, timeout=0)
+
+
+def _selftest():
+    from nmea_sim import NmeaEmulator
+
+    async def run(receiver, start_baud):
+        sim = NmeaEmulator(speed=5, receiver=receiver, baudrate=start_baud).start()
+        ser = _open(sim.device, 9600)
+        try:
+            cfg = ReceiverConfig(baudrate=38400, rate_hz=2, timeout=1.0)
+            baud = await cfg.apply(ser)
+            assert cfg.kind == receiver, (receiver, cfg.kind)
+            if receiver == "generic":
+                assert baud == start_baud and not cfg.acked
+                assert sim.sentences == {"GGA", "GSA", "GSV", "RMC", "VTG"}
+            else:
+                assert baud == 38400 == sim.baudrate, (baud, sim.baudrate)
+                assert sim.sentences == {"GGA", "RMC"}, sim.sentences
+                assert sim.rate_ms == 500
+                assert sim.dyn_model == (4 if receiver == "ublox" else 0)
+                assert not cfg.failed, cfg.failed
+            # Nach der Konfiguration kommen auf ser gültige Sätze an
+            assert await cfg._nmea_at(ser, baud)
+        finally:
+            ser.close()
+            sim.close()
+
+    for receiver, start_baud in (("ublox", 9600), ("mtk", 9600), ("generic", 9600),
+                                 ("ublox", 38400)):  # Neustart: Empfänger noch auf 38400
+        asyncio.run(run(receiver, start_baud))
+
+    # Stummer Empfänger: nichts konfigurieren, Schnittstelle wieder auf der Start-Baudrate
+    master, slave = os.openpty()
+    ser = _open(os.ttyname(slave), 9600)
+    try:
+        assert asyncio.run(ReceiverConfig(timeout=0.2).apply(ser)) is None
+        assert ser.baudrate == 9600, ser.baudrate
+    finally:
+        ser.close()
+        os.close(master)
+        os.close(slave)
+    print("Selbsttest OK: u-blox, MediaTek, generisch, Baudratensuche, stumm")
+
+
+def _bench(seconds=10.0, speed=20.0):
+    # CPU-Zeit des Lese-Threads pro Sekunde GPS-Daten: Werkseinstellung gegen konfiguriert.
+    # speed: Zeitraffer des Emulators, damit die Messung nicht im Rauschen untergeht.
+    from gps_reader import GpsReader
+    from nmea_sim import NmeaEmulator
+
+    async def measure(configure):
+        sim = NmeaEmulator(speed=speed, receiver="ublox").start()
+        reader = GpsReader(sim.device, baudrate=9600,
+                           autoconfig=ReceiverConfig(baudrate=115200) if configure else None)
+        task = asyncio.ensure_future(reader.run())
+        while reader.latest() is None or (configure and reader.autoconfig.kind is None):
+            await asyncio.sleep(0.05)
+        epochs0, bytes0, sentences0 = sim.sent_epochs, sim.sent_bytes, sim.sent_sentences
+        cpu0 = time.thread_time()
+        await asyncio.sleep(seconds)
+        cpu = time.thread_time() - cpu0
+        epochs = sim.sent_epochs - epochs0
+        per_epoch_bytes = (sim.sent_bytes - bytes0) / max(epochs, 1)
+        per_epoch_sentences = (sim.sent_sentences - sentences0) / max(epochs, 1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        sim.close()
+        label = "konfiguriert " if configure else "Werkseinstell."
+        print(f"{label}: {per_epoch_sentences:.0f} Sätze / {per_epoch_bytes:.0f} Byte pro Sekunde, "
+              f"{sim.baudrate} Baud ({per_epoch_bytes * 10 / sim.baudrate * 100:.1f} % Auslastung), "
+              f"CPU {cpu / max(epochs, 1) * 1e6:.0f} µs pro GPS-Sekunde ({epochs} Epochen)")
+
+    asyncio.run(measure(False))
+    asyncio.run(measure(True))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="GPS-Empfänger einstellen (UBX/PMTK)")
+    ap.add_argument("--selftest", action="store_true", help="gegen den pty-Emulator prüfen")
+    ap.add_argument("--bench", action="store_true", help="CPU pro GPS-Sekunde vorher/nachher")
+    ap.add_argument("--device", help="echten Empfänger an DEVICE einstellen")
+    ap.add_argument("--baudrate", type=int, default=9600)
+    ap.add_argument("--target", type=int, default=38400, help="gewünschte Baudrate")
+    args = ap.parse_args()
+    if args.selftest:
+        _selftest()
+    if args.bench:
+        _bench()
+    if args.device:
+        port = _open(args.device, args.baudrate)
+        asyncio.run(ReceiverConfig(baudrate=args.target).apply(port))
+        port.close()
+    if not (args.selftest or args.bench or args.device):
+        ap.print_help()
@@ -0,0 +1,190 @@
+# gps_reader.py
+# Autor: OE9SAU
+# Beschreibung: asyncio-Task, der die GPS-Schnittstelle dauerhaft offen hält
+#               und laufend den aktuellsten Fix bereitstellt, auf Wunsch den Empfänger
+#               nach jedem Öffnen einstellen (gps_config.py)
+# Version: 1.2
+
+import asyncio
+import time
+
+import serial
+
+from metrics import ACQUIRE_BUCKETS, Histogram
+from nmea import NmeaParser, Gga, Rmc, Gsa, Vtg, utc_timestamp
+
+
+class GpsFix:
+    __slots__ = ("latitude", "longitude", "altitude", "speed_kmh", "course", "quality",
+                 "sats", "hdop", "pdop", "utc", "timestamp", "seq")
+
+    def __init__(self, latitude, longitude, altitude, speed_kmh, timestamp, seq,
+                 course=None, quality=1, sats=None, hdop=None, pdop=None, utc=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.speed_kmh = speed_kmh
+        self.course = course      # Grad über Grund, None wenn unbekannt
+        self.quality = quality    # GGA Fix-Qualität (1=GPS, 2=DGPS, ...)
+        self.sats = sats          # Satelliten in Verwendung
+        self.hdop = hdop
+        self.pdop = pdop
+        self.utc = utc            # GPS-Zeit als Unix-Zeitstempel (ab erstem RMC mit Datum)
+        self.timestamp = timestamp  # time.monotonic() beim Empfang
+        self.seq = seq
+
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+
+class FixSource:
+    # Gemeinsame Basis aller GPS-Quellen: letzter Fix, Warten auf neue Fixe, Abonnenten.
+    # Objekte innerhalb der laufenden Event-Loop anlegen (asyncio.Event)
+    def __init__(self):
+        self.listeners = []  # Callbacks fn(fix), werden bei jedem neuen Fix aufgerufen
+        self._fix = None
+        self._seq = 0
+        self._changed = asyncio.Event()
+        # Zeit bis zum (ersten bzw. nach Verlust wieder) gültigen Fix
+        self.acquisition = Histogram(ACQUIRE_BUCKETS)
+        self._acquire_start = time.monotonic()
+
+    def latest(self):
+        # Nicht blockierend: liefert den letzten Fix oder None
+        return self._fix
+
+    async def wait_for_fix(self, after_seq=0, timeout=None):
+        # Wartet auf einen Fix, der neuer ist als after_seq
+        fix = self._fix
+        if fix is not None and fix.seq > after_seq:
+            return fix
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._fix
+
+    def next_seq(self):
+        return self._seq + 1
+
+    def fix_lost(self):
+        # Quelle geöffnet oder Empfänger meldet keinen Fix: ab jetzt zählt die Suche
+        if self._acquire_start is None:
+            self._acquire_start = time.monotonic()
+
+    def _publish(self, fix):
+        if self._acquire_start is not None:
+            self.acquisition.observe(fix.timestamp - self._acquire_start)
+            self._acquire_start = None
+        self._seq = fix.seq
+        self._fix = fix
+        # Alle aktuellen Wartenden wecken, für die nächste Runde ein neues Event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        for listener in self.listeners:
+            listener(fix)
+
+
+class GpsReader(FixSource):
+    def __init__(self, device, baudrate=9600, reopen_delay=5, autoconfig=None):
+        super().__init__()
+        self.device = device
+        self.baudrate = baudrate
+        self.reopen_delay = reopen_delay
+        self.autoconfig = autoconfig  # gps_config.ReceiverConfig oder None
+
+        self.parser = NmeaParser()
+        # Teilwerte aus GGA/RMC/GSA/VTG, bis Position, Höhe und Geschwindigkeit bekannt sind
+        self._lat = self._lon = self._alt = self._speed = self._course = None
+        self._quality = 0
+        self._sats = self._hdop = self._pdop = self._utc = None
+        self._date = None
+
+    async def run(self):
+        # Schnittstelle offen halten; gelesen wird nur, wenn der fd lesbar ist
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                ser = serial.Serial(self.device, baudrate=self.baudrate, timeout=0)
+            except (serial.SerialException, OSError) as e:
+                print(f"Fehler an der GPS-Schnittstelle {self.device}: {e}")
+                await asyncio.sleep(self.reopen_delay)
+                continue
+
+            print(f"GPS-Schnittstelle {self.device} geöffnet.")
+            self.fix_lost()
+            if self.autoconfig is not None:
+                # Nach jedem Öffnen: Empfänger könnte stromlos gewesen sein (nichts gespeichert)
+                try:
+                    await self.autoconfig.apply(ser)
+                except (serial.SerialException, OSError) as e:
+                    print(f"Fehler bei der GPS-Konfiguration {self.device}: {e}")
+                    ser.close()
+                    await asyncio.sleep(self.reopen_delay)
+                    continue
+            failed = loop.create_future()
+
+            def on_readable():
+                try:
+                    # Bulk-Read: alles was anliegt
+                    data = ser.read(ser.in_waiting or 1)
+                    if not data:
+                        raise serial.SerialException("Gerät meldet Daten, liefert aber keine")
+                except (serial.SerialException, OSError) as e:
+                    if not failed.done():
+                        failed.set_result(e)
+                    return
+                self.feed(data)
+
+            fd = ser.fileno()
+            loop.add_reader(fd, on_readable)
+            try:
+                e = await failed
+                print(f"Fehler an der GPS-Schnittstelle {self.device}: {e}")
+            finally:
+                loop.remove_reader(fd)
+                ser.close()
+            await asyncio.sleep(self.reopen_delay)
+
+    def feed(self, data):
+        updated = False
+        for msg in self.parser.feed(data):
+            kind = type(msg)
+            if kind is Gga:
+                self._quality = msg.quality
+                if not msg.quality:
+                    self.fix_lost()
+                if msg.quality and msg.lat is not None and msg.lon is not None:
+                    self._lat, self._lon = msg.lat, msg.lon
+                    if msg.alt is not None:
+                        self._alt = msg.alt
+                    self._sats, self._hdop = msg.sats, msg.hdop
+                    self._utc = utc_timestamp(self._date, msg.utc)
+                    updated = True
+            elif kind is Rmc:
+                # Status V = Empfänger meldet ungültige Position
+                if msg.valid and msg.lat is not None and msg.lon is not None:
+                    self._lat, self._lon = msg.lat, msg.lon
+                    if msg.speed_kn is not None:
+                        self._speed = msg.speed_kn * 1.852
+                    self._course = msg.course
+                    self._date = msg.date
+                    self._utc = utc_timestamp(msg.date, msg.utc)
+                    updated = True
+                elif not msg.valid:
+                    self.fix_lost()
+            elif kind is Vtg:
+                if msg.speed_kmh is not None:
+                    self._speed = msg.speed_kmh
+                if msg.course is not None:
+                    self._course = msg.course
+            elif kind is Gsa:
+                self._pdop = msg.pdop
+                if msg.hdop is not None:
+                    self._hdop = msg.hdop
+
+        if updated and self._alt is not None and self._speed is not None:
+            self._publish(GpsFix(self._lat, self._lon, self._alt, self._speed,
+                                 time.monotonic(), self.next_seq(),
+                                 course=self._course, quality=self._quality, sats=self._sats,
+                                 hdop=self._hdop, pdop=self._pdop, utc=self._utc))
@@ -0,0 +1,118 @@
+# gpsd_client.py
+# Autor: OE9SAU
+# Beschreibung: GPS-Quelle über gpsd (JSON, ?WATCH, TPV/SKY), damit SVXLink, chrony
+#               und Dashboard den Empfänger gemeinsam nutzen können
+# Version: 1.0
+
+import asyncio
+import calendar
+import json
+import time
+
+from gps_reader import FixSource, GpsFix
+
+WATCH = b'?WATCH={"enable":true,"json":true};\n'
+
+
+def parse_gpsd_time(text):
+    # "2024-05-01T12:34:56.000Z" -> Unix-Zeit
+    if not text:
+        return None
+    try:
+        text = text.rstrip("Z")
+        main, _, frac = text.partition(".")
+        ts = calendar.timegm(time.strptime(main, "%Y-%m-%dT%H:%M:%S"))
+        return ts + (float("0." + frac) if frac else 0.0)
+    except ValueError:
+        return None
+
+
+class GpsdClient(FixSource):
+    def __init__(self, host="127.0.0.1", port=2947, timeout=10, idle_timeout=60,
+                 backoff_min=2, backoff_max=60):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        # Ohne Empfänger schweigt gpsd, dann neu verbinden
+        self.idle_timeout = idle_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.reconnects = 0
+        self.reports = 0
+
+        self._sats = self._hdop = self._pdop = None
+
+    async def run(self):
+        backoff = self.backoff_min
+        connected_once = False
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"gpsd {self.host}:{self.port} nicht erreichbar: "
+                      f"{str(e) or type(e).__name__} (neuer Versuch in {backoff}s)")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+                continue
+
+            if connected_once:
+                self.reconnects += 1
+            connected_once = True
+            backoff = self.backoff_min
+            print(f"gpsd verbunden: {self.host}:{self.port}")
+            self.fix_lost()
+            try:
+                writer.write(WATCH)
+                await writer.drain()
+                while True:
+                    # gpsd sendet bei Fix mindestens einmal pro Sekunde einen TPV
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                    if not line:
+                        raise ConnectionError("Verbindung von gpsd geschlossen")
+                    self.handle_line(line)
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"gpsd Verbindung unterbrochen: {str(e) or type(e).__name__}")
+            finally:
+                writer.close()
+            await asyncio.sleep(self.backoff_min)
+
+    def handle_line(self, line):
+        try:
+            report = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(report, dict):
+            return  # gültiges JSON, aber kein gpsd-Bericht (Liste, Zahl, ...)
+        cls = report.get("class")
+        if cls == "TPV":
+            self.reports += 1
+            self._tpv(report)
+        elif cls == "SKY":
+            self.reports += 1
+            self._sky(report)
+
+    def _sky(self, report):
+        self._hdop = report.get("hdop", self._hdop)
+        self._pdop = report.get("pdop", self._pdop)
+        if "uSat" in report:
+            self._sats = report["uSat"]
+        elif "satellites" in report:
+            self._sats = sum(1 for s in report["satellites"] if s.get("used"))
+
+    def _tpv(self, report):
+        # mode: 0/1 = kein Fix, 2 = 2D, 3 = 3D
+        mode = report.get("mode", 0)
+        lat, lon = report.get("lat"), report.get("lon")
+        if mode < 2 or lat is None or lon is None:
+            self.fix_lost()
+            return
+        alt = report.get("altMSL", report.get("alt", 0.0))
+        speed = report.get("speed")  # m/s
+        self._publish(GpsFix(
+            lat, lon, alt if alt is not None else 0.0,
+            speed * 3.6 if speed is not None else 0.0,
+            time.monotonic(), self.next_seq(),
+            course=report.get("track"), quality=1 if mode >= 2 else 0, sats=self._sats,
+            hdop=self._hdop, pdop=self._pdop, utc=parse_gpsd_time(report.get("time"))))
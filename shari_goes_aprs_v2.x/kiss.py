@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# kiss.py
+# Autor: OE9SAU
+# Beschreibung: Senden über einen KISS-TNC (Direwolf TCP-Port 8001 oder serieller TNC)
+#               als Alternative/Ergänzung zu APRS-IS: AX.25 UI-Rahmen aus dem
+#               APRS-IS Paket (Quelle, Ziel, Inhalt), Funkpfad aus der Konfiguration
+# Version: 1.0
+#
+# Selbsttest (Rahmen kodieren/dekodieren, Stand-in-TNC):  python3 kiss.py --selftest
+# Durchsatz/Latenz je Transport:                           python3 kiss.py --bench
+
+import asyncio
+import time
+
+import serial
+
+FEND, FESC, TFEND, TFESC = 0xC0, 0xDB, 0xDC, 0xDD
+CONTROL_UI = 0x03
+PID_NO_L3 = 0xF0
+
+
+def ax25_address(call, last=False, command=False):
+    # 6 Zeichen um ein Bit verschoben, dann SSID-Byte (C/H-Bit, 2 reservierte Bits, SSID, Ende-Bit)
+    base, _, ssid = call.upper().partition("-")
+    repeated = base.endswith("*")
+    base = base.rstrip("*")
+    ssid = ssid.rstrip("*")
+    if not base or len(base) > 6 or not base.isalnum() or not base.isascii():
+        raise ValueError(f"Rufzeichen für AX.25 ungültig: {call}")
+    ssid = int(ssid) if ssid else 0
+    if not 0 <= ssid <= 15:
+        raise ValueError(f"SSID für AX.25 ungültig: {call}")
+    flag = 0x80 if command or repeated else 0x00
+    return (bytes(ord(c) << 1 for c in base.ljust(6))
+            + bytes((flag | 0x60 | ssid << 1 | (1 if last else 0),)))
+
+
+def _decode_address(data):
+    call = "".join(chr(b >> 1) for b in data[:6]).rstrip()
+    ssid = (data[6] >> 1) & 0x0F
+    return f"{call}-{ssid}" if ssid else call
+
+
+def ui_frame(packet, path=("WIDE1-1", "WIDE2-1")):
+    # "SRC>DEST,TCPIP*:Inhalt" -> AX.25 UI-Rahmen mit Funkpfad statt des APRS-IS Pfads
+    head, sep, info = packet.partition(":")
+    src, _, dest = head.partition(">")
+    dest = dest.split(",")[0]
+    if not sep or not src or not dest:
+        raise ValueError(f"Kein APRS-Paket: {packet!r}")
+    path = list(path)[:8]
+    frame = ax25_address(dest, command=True) + ax25_address(src, last=not path)
+    for i, digi in enumerate(path):
+        frame += ax25_address(digi, last=i == len(path) - 1)
+    return frame + bytes((CONTROL_UI, PID_NO_L3)) + info.encode("utf-8", errors="replace")
+
+
+def decode_ui(frame):
+    # AX.25 UI-Rahmen -> "SRC>DEST,PFAD:Inhalt" (für Stand-in-TNC und Selbsttest)
+    addresses = []
+    i = 0
+    while True:
+        if len(frame) < i + 7:
+            raise ValueError("AX.25 Adressfeld unvollständig")
+        addresses.append(frame[i:i + 7])
+        i += 7
+        if frame[i - 1] & 0x01:
+            break
+    if len(addresses) < 2 or frame[i:i + 2] != bytes((CONTROL_UI, PID_NO_L3)):
+        raise ValueError("kein AX.25 UI-Rahmen")
+    dest, src = _decode_address(addresses[0]), _decode_address(addresses[1])
+    path = [_decode_address(a) + ("*" if a[6] & 0x80 else "") for a in addresses[2:]]
+    return (f"{src}>{','.join([dest] + path)}:"
+            f"{frame[i + 2:].decode('utf-8', errors='replace')}")
+
+
+def kiss_encode(frame, port=0):
+    data = frame.replace(bytes((FESC,)), bytes((FESC, TFESC))).replace(bytes((FEND,)),
+                                                                        bytes((FESC, TFEND)))
+    return bytes((FEND, (port & 0x0F) << 4)) + data + bytes((FEND,))
+
+
+class KissDecoder:
+    # Nimmt beliebige Blöcke entgegen, liefert (Port, Rahmen) für jeden vollständigen Datenrahmen
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data):
+        self._buf += data
+        out = []
+        while True:
+            start = self._buf.find(FEND)
+            if start < 0:
+                self._buf.clear()
+                return out
+            end = self._buf.find(FEND, start + 1)
+            if end < 0:
+                del self._buf[:start]
+                return out
+            raw = bytes(self._buf[start + 1:end])
+            del self._buf[:end]  # schließendes FEND kann den nächsten Rahmen öffnen
+            if len(raw) >= 2 and raw[0] & 0x0F == 0:  # Befehl 0 = Daten
+                data = raw[1:].replace(bytes((FESC, TFEND)), bytes((FEND,))).replace(
+                    bytes((FESC, TFESC)), bytes((FESC,)))
+                out.append((raw[0] >> 4, data))
+
+
+class KissTnc:
+    # Objekte innerhalb der laufenden Event-Loop anlegen (asyncio.Event)
+    def __init__(self, host=None, port=8001, device=None, baudrate=9600,
+                 path=("WIDE1-1", "WIDE2-1"), kiss_port=0, timeout=10, reconnect_delay=5):
+        self.host = host
+        self.port = port
+        self.device = device
+        self.baudrate = baudrate
+        self.path = tuple(path)
+        self.kiss_port = kiss_port
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.name = device if device else f"{host}:{port}"
+
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_received = 0  # vom TNC gehörte Rahmen (werden nur gezählt)
+        self.reconnects = 0
+        self.connected_since = None
+
+        self._writer = None  # asyncio StreamWriter (TCP)
+        self._serial = None
+        self._decoder = KissDecoder()
+        self._connected = asyncio.Event()
+
+    @classmethod
+    def from_config(cls, section):
+        path = [p.strip() for p in section.get('PATH', 'WIDE1-1,WIDE2-1').split(',') if p.strip()]
+        for digi in path:
+            ax25_address(digi)  # ValueError bei ungültigem Pfad
+        device = section.get('DEVICE', '') or None
+        return cls(
+            host=None if device else section.get('HOST', '127.0.0.1'),
+            port=section.getint('PORT', 8001),
+            device=device,
+            baudrate=section.getint('BAUDRATE', 9600),
+            path=path,
+            kiss_port=section.getint('KISS_PORT', 0),
+        )
+
+    @property
+    def connected(self):
+        return self._writer is not None or self._serial is not None
+
+    async def wait_connected(self, timeout=None):
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.connected
+
+    def _received(self, data):
+        self.frames_received += len(self._decoder.feed(data))
+
+    async def _session_tcp(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        self._writer = writer
+        self._up()
+        try:
+            # Direwolf schickt alles Gehörte an jeden KISS-Client: lesen, sonst läuft der Puffer voll
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    raise ConnectionError("Verbindung vom TNC geschlossen")
+                self._received(data)
+        finally:
+            self._writer = None
+            writer.close()
+
+    async def _session_serial(self):
+        loop = asyncio.get_running_loop()
+        ser = serial.Serial(self.device, baudrate=self.baudrate, timeout=0, write_timeout=self.timeout)
+        failed = loop.create_future()
+
+        def on_readable():
+            try:
+                data = ser.read(ser.in_waiting or 1)
+                if not data:
+                    raise serial.SerialException("Gerät meldet Daten, liefert aber keine")
+            except (serial.SerialException, OSError) as e:
+                if not failed.done():
+                    failed.set_exception(ConnectionError(str(e)))
+                return
+            self._received(data)
+
+        self._serial = ser
+        self._up()
+        loop.add_reader(ser.fileno(), on_readable)
+        try:
+            await failed
+        finally:
+            loop.remove_reader(ser.fileno())
+            self._serial = None
+            ser.close()
+
+    def _up(self):
+        if self.connected_since is not None:
+            self.reconnects += 1
+        self.connected_since = time.monotonic()
+        print(f"KISS-TNC verbunden: {self.name} (Pfad {','.join(self.path) or 'direkt'})")
+        self._connected.set()
+
+    async def run(self):
+        while True:
+            try:
+                if self.device:
+                    await self._session_serial()
+                else:
+                    await self._session_tcp()
+            except (OSError, serial.SerialException, asyncio.TimeoutError) as e:
+                print(f"KISS-TNC {self.name}: {str(e) or type(e).__name__} "
+                      f"(neuer Versuch in {self.reconnect_delay}s)")
+            self._connected = asyncio.Event()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def send(self, packet, wait=0.0):
+        # Wie AprsIsClient.send: Sendelatenz in Sekunden oder None (keine Verbindung, ungültig)
+        start = time.monotonic()
+        try:
+            data = kiss_encode(ui_frame(packet, self.path), self.kiss_port)
+        except ValueError as e:
+            print(f"KISS-TNC: Paket nicht sendbar: {e}")
+            return None
+        if not self.connected and not (wait and await self.wait_connected(wait)):
+            return None
+        try:
+            if self._serial is not None:
+                # Bei 1200 Baud am Funk puffert der TNC, die serielle Schnittstelle ist schneller
+                await asyncio.get_running_loop().run_in_executor(None, self._serial.write, data)
+            else:
+                self._writer.write(data)
+                await self._writer.drain()
+        except (OSError, serial.SerialException, AttributeError) as e:
+            print(f"KISS-TNC {self.name}: Senden fehlgeschlagen: {e}")
+            return None
+        self.frames_sent += 1
+        self.bytes_sent += len(data)
+        return time.monotonic() - start
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._serial is not None:
+            self._serial.close()
+
+
+SAMPLE_PACKETS = (
+    "OE9SAU-9>APN100,TCPIP*:@134930h4715.00N/00936.00E(SHARI",
+    "OE9SAU>APN100,TCPIP*:!/5L!!<*e7>7P[ \u06c0 FESC im Kommentar",
+    "OE9SAU-10>T4SQ5U,TCPIP*:`(_fn\"Oj/]SHARI=",
+)
+
+
+def _selftest():
+    from fake_kiss import FakeKissTnc
+
+    for packet in SAMPLE_PACKETS:
+        frame = ui_frame(packet, ("WIDE1-1", "WIDE2-1"))
+        expected = packet.replace("TCPIP*", "WIDE1-1,WIDE2-1")
+        assert decode_ui(frame) == expected, (decode_ui(frame), expected)
+        encoded = kiss_encode(frame)
+        assert encoded.count(FEND) == 2
+        # in beliebigen Stücken zurück
+        decoder = KissDecoder()
+        got = [f for i in range(0, len(encoded), 3) for f in decoder.feed(encoded[i:i + 3])]
+        assert got == [(0, frame)], got
+    assert decode_ui(ui_frame(SAMPLE_PACKETS[0], ())) == "OE9SAU-9>APN100:@134930h4715.00N/00936.00E(SHARI"
+    for bad in ("TOOLONGCALL>APN100:x", "OE9SAU-16>APN100:x", "OE9SAU>APN100"):
+        try:
+            ui_frame(bad)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+
+    async def run(tnc, fake):
+        task = asyncio.ensure_future(tnc.run())
+        assert await tnc.wait_connected(5)
+        for packet in SAMPLE_PACKETS:
+            assert await tnc.send(packet) is not None
+        deadline = time.monotonic() + 5
+        while ((len(fake.packets) < len(SAMPLE_PACKETS) or not tnc.frames_received)
+               and time.monotonic() < deadline):
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        tnc.close()
+        fake.stop()
+        got = [line for _, line in fake.packets]
+        assert got == [p.replace("TCPIP*", "WIDE2-2") for p in SAMPLE_PACKETS], got
+        assert not fake.errors and tnc.frames_received >= 1
+
+    fake = FakeKissTnc(beacon_interval=0.2).start()
+    asyncio.run(run(KissTnc("127.0.0.1", fake.port, path=("WIDE2-2",)), fake))
+    fake = FakeKissTnc(serial=True, beacon_interval=0.2).start()
+    asyncio.run(run(KissTnc(device=fake.device, path=("WIDE2-2",)), fake))
+    print("Selbsttest OK: AX.25/KISS, TCP und seriell gegen Stand-in-TNC")
+
+
+def _bench(count=500):
+    from aprs_is import AprsIsClient
+    from aprs_packet import build_position
+    from fake_aprsis import FakeAprsIsServer, aprs_passcode
+    from fake_kiss import FakeKissTnc
+
+    packets = [build_position(("uncompressed", "compressed", "mice")[i % 3], "OE9SAU-9",
+                              47.25 + i * 1e-4, 9.6, 500.0, 50.0, "/", ">", "SHARI",
+                              course=90.0, utc=time.time()) for i in range(count)]
+
+    async def measure(name, client, received):
+        task = asyncio.ensure_future(client.run())
+        await client.wait_connected(5)
+        latencies = []
+        t0 = time.monotonic()
+        for packet in packets:
+            latency = await client.send(packet)
+            assert latency is not None
+            latencies.append(latency)
+        sent = time.monotonic() - t0
+        while received() < count and time.monotonic() - t0 < 30:
+            await asyncio.sleep(0.001)
+        total = time.monotonic() - t0
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        client.close()
+        latencies.sort()
+        print(f"{name:<14} send() p50 {latencies[count // 2] * 1e6:6.0f} µs, "
+              f"p99 {latencies[int(count * 0.99)] * 1e6:6.0f} µs, "
+              f"{count / sent:7.0f} Pakete/s übergeben, {received()}/{count} angekommen in "
+              f"{total * 1000:.0f} ms ({count / total:.0f}/s)")
+
+    srv = FakeAprsIsServer().start()
+    asyncio.run(measure("APRS-IS", AprsIsClient([("127.0.0.1", srv.port)], "OE9SAU",
+                                                str(aprs_passcode("OE9SAU")), reprobe_interval=0),
+                        lambda: len(srv.packets)))
+    srv.stop()
+    fake = FakeKissTnc().start()
+    asyncio.run(measure("KISS TCP", KissTnc("127.0.0.1", fake.port), lambda: len(fake.packets)))
+    fake.stop()
+    fake = FakeKissTnc(serial=True).start()
+    asyncio.run(measure("KISS seriell", KissTnc(device=fake.device), lambda: len(fake.packets)))
+    fake.stop()
+    airtime = sum(len(kiss_encode(ui_frame(p))) for p in packets) / count * 8 / 1200
+    print(f"Zum Vergleich: ein Rahmen braucht bei 1200 Baud am Funk ca. {airtime * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="KISS-TNC Transport (AX.25 UI-Rahmen)")
+    ap.add_argument("--selftest", action="store_true")
+    ap.add_argument("--bench", action="store_true")
+    args = ap.parse_args()
+    if args.selftest:
+        _selftest()
+    if args.bench:
+        _bench()
+    if not (args.selftest or args.bench):
+        ap.print_help()
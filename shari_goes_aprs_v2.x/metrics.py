@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# metrics.py
+# Autor: OE9SAU
+# Beschreibung: Zähler und Histogramme im Prometheus-Textformat, abrufbar über HTTP
+#               (GET /metrics) oder Unix-Socket. Zählen kostet nur eine Addition auf
+#               vorab angelegten Objekten; Text wird erst beim Abruf erzeugt, Werte anderer
+#               Module (Parser, Warteschlange, APRS-IS) werden erst dann abgefragt.
+# Version: 1.0
+#
+# Kosten pro Zählung:  python3 metrics.py --bench
+# Formatprüfung:       python3 metrics.py --selftest
+
+import asyncio
+import os
+from bisect import bisect_left
+
+# Grenzen in Sekunden
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ACQUIRE_BUCKETS = (1, 2, 5, 10, 20, 30, 45, 60, 120, 300, 600)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # letzter Eintrag: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Registry:
+    def __init__(self, prefix="shari_"):
+        self.prefix = prefix
+        self._families = {}  # Name -> [Typ, Hilfe, [(Labels, Counter/Histogram/Funktion)]]
+        self.address = None  # (Host, Port) des HTTP-Servers, sobald er lauscht
+
+    def _add(self, name, kind, help_text, labels, value):
+        family = self._families.setdefault(self.prefix + name, [kind, help_text, []])
+        family[2].append((labels, value))
+        return value
+
+    def counter(self, name, help_text, labels=None):
+        return self._add(name, "counter", help_text, labels, Counter())
+
+    def histogram(self, name, help_text, bounds=LATENCY_BUCKETS, labels=None):
+        return self._add(name, "histogram", help_text, labels, Histogram(bounds))
+
+    def collect(self, name, kind, help_text, fn):
+        # fn() wird erst beim Abruf aufgerufen: Zahl, Counter/Histogram, None (weglassen)
+        # oder Liste von (Labels, Wert) für mehrere Zeitreihen
+        self._add(name, kind, help_text, None, fn)
+
+    def _samples(self, name, labels, value, out):
+        if isinstance(value, Counter):
+            value = value.value
+        if isinstance(value, Histogram):
+            cumulative = 0
+            for bound, n in zip(value.bounds + (float("inf"),), value.counts):
+                cumulative += n
+                le = dict(labels or {}, le=_number(float(bound)))
+                out.append(f"{name}_bucket{_labels(le)} {cumulative}")
+            out.append(f"{name}_sum{_labels(labels)} {_number(value.sum)}")
+            out.append(f"{name}_count{_labels(labels)} {value.count}")
+        elif value is not None:
+            out.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, entries) in self._families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in entries:
+                if callable(value):
+                    try:
+                        value = value()
+                    except Exception as e:  # Abruf darf den Dienst nicht stören
+                        out.append(f"# Fehler beim Abfragen von {name}: {e!r}")
+                        continue
+                    if isinstance(value, list):
+                        for sample_labels, sample in value:
+                            self._samples(name, sample_labels, sample, out)
+                        continue
+                self._samples(name, labels, value, out)
+        out.append("")
+        return "\n".join(out)
+
+    async def serve_http(self, host, port):
+        async def handle(reader, writer):
+            try:
+                request = await asyncio.wait_for(reader.readline(), 5)
+                while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                    pass  # Header überspringen
+                parts = request.decode("latin-1").split()
+                if len(parts) >= 2 and parts[0] in ("GET", "HEAD") \
+                        and parts[1].split("?")[0] in ("/", "/metrics"):
+                    status, body = "200 OK", self.render().encode()
+                else:
+                    status, body = "404 Not Found", b"nur GET /metrics\n"
+                writer.write(f"HTTP/1.0 {status}\r\n"
+                             f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                             f"Content-Length: {len(body)}\r\n\r\n".encode())
+                if parts[:1] != ["HEAD"]:
+                    writer.write(body)
+                await writer.drain()
+            except (OSError, asyncio.TimeoutError, UnicodeError):
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        self.address = server.sockets[0].getsockname()[:2]
+        print(f"Metriken: http://{host}:{self.address[1]}/metrics")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            server.close()
+
+    async def serve_unix(self, path):
+        # Verbinden genügt: Text raus, Verbindung zu (z.B. nc -U PATH oder node_exporter textfile)
+        async def handle(reader, writer):
+            try:
+                writer.write(self.render().encode())
+                await writer.drain()
+            except OSError:
+                pass
+            finally:
+                writer.close()
+
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        server = await asyncio.start_unix_server(handle, path)
+        os.chmod(path, 0o666)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            server.close()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def _selftest():
+    reg = Registry()
+    sent = reg.counter("packets_sent_total", "Gesendete Pakete")
+    latency = reg.histogram("send_latency_seconds", "Sendedauer", bounds=(0.01, 0.1))
+    reg.counter("dropped_total", "Verworfen", labels={"reason": "duplicate"}).inc(2)
+    reg.counter("dropped_total", "Verworfen", labels={"reason": 'a"b'})
+    reg.collect("queue_depth", "gauge", "Warteschlange", lambda: 3)
+    reg.collect("missing", "gauge", "nicht vorhanden", lambda: None)
+    reg.collect("per_source", "counter", "je Quelle", lambda: [({"source": "x"}, 5)])
+    reg.collect("broken", "gauge", "wirft", lambda: 1 / 0)
+    sent.inc()
+    for v in (0.01, 0.05, 0.5):
+        latency.observe(v)
+    text = reg.render()
+    expected = [
+        "# TYPE shari_packets_sent_total counter",
+        "shari_packets_sent_total 1",
+        'shari_send_latency_seconds_bucket{le="0.01"} 1',  # Grenze inklusive
+        'shari_send_latency_seconds_bucket{le="0.1"} 2',
+        'shari_send_latency_seconds_bucket{le="+Inf"} 3',
+        "shari_send_latency_seconds_count 3",
+        'shari_dropped_total{reason="duplicate"} 2',
+        'shari_dropped_total{reason="a\\"b"} 0',
+        "shari_queue_depth 3",
+        'shari_per_source{source="x"} 5',
+    ]
+    for line in expected:
+        assert line in text.splitlines(), (line, text)
+    assert not any(line.startswith("shari_missing") for line in text.splitlines())
+    assert "# Fehler beim Abfragen von shari_broken" in text
+
+    async def scrape():
+        task = asyncio.ensure_future(reg.serve_http("127.0.0.1", 0))
+        while reg.address is None:
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_connection(*reg.address)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n")
+        reply = await reader.read()
+        writer.close()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert reply.startswith(b"HTTP/1.0 200 OK") and b"shari_queue_depth 3" in reply, reply
+
+    asyncio.run(scrape())
+    print("Selbsttest OK")
+
+
+def _bench(rounds=1000000):
+    import time
+
+    reg = Registry()
+    counter = reg.counter("c_total", "Zähler")
+    hist = reg.histogram("h_seconds", "Histogramm")
+
+    def nothing(value):
+        pass
+
+    def run(fn, value):
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            fn(value)
+        return (time.perf_counter() - t0) / rounds * 1e9
+
+    base = run(nothing, 0.02)
+    inc = run(counter.inc, 1)
+    observe = run(hist.observe, 0.02)
+    for i in range(40):
+        reg.counter("family_total", "viele Zeitreihen", labels={"i": i})
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        text = reg.render()
+    render = (time.perf_counter() - t0) / 1000 * 1e6
+    print(f"Leerer Funktionsaufruf: {base:.0f} ns")
+    print(f"Counter.inc:            {inc:.0f} ns (+{inc - base:.0f} ns)")
+    print(f"Histogram.observe:      {observe:.0f} ns (+{observe - base:.0f} ns)")
+    print(f"Abruf ({len(text.splitlines())} Zeilen): {render:.0f} µs")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Metriken im Prometheus-Textformat")
+    ap.add_argument("--selftest", action="store_true")
+    ap.add_argument("--bench", action="store_true")
+    args = ap.parse_args()
+    if args.selftest:
+        _selftest()
+    if args.bench:
+        _bench()
+    if not (args.selftest or args.bench):
+        ap.print_help()
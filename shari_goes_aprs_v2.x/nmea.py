@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# nmea.py
+# Autor: OE9SAU
+# Beschreibung: NMEA-0183 Parser auf bytes (GGA, RMC, GSA, VTG, GSV) mit
+#               Prüfsummenkontrolle vor der Feldzerlegung, GP/GN/GL/GA/BD/GB/GQ/GI
+# Version: 1.0
+#
+# Benchmark gegen den alten split()-Parser:  python3 nmea.py --bench [aufzeichnung.nmea]
+
+import calendar
+from collections import namedtuple
+from functools import reduce
+from operator import xor
+
+TALKERS = frozenset((b"GP", b"GN", b"GL", b"GA", b"BD", b"GB", b"GQ", b"GI"))
+
+Gga = namedtuple("Gga", "talker utc lat lon quality sats hdop alt")
+Rmc = namedtuple("Rmc", "talker utc valid lat lon speed_kn course date")
+Gsa = namedtuple("Gsa", "talker fix_type prns pdop hdop vdop")
+Vtg = namedtuple("Vtg", "talker course speed_kn speed_kmh")
+Gsv = namedtuple("Gsv", "talker total msg_num in_view")
+
+class NmeaStats:
+    __slots__ = ("sentences", "checksum_errors", "malformed", "ignored")
+
+    def __init__(self):
+        self.sentences = 0
+        self.checksum_errors = 0
+        self.malformed = 0
+        self.ignored = 0
+
+
+def xor_checksum(body):
+    # XOR aller Bytes ohne Python-Schleife: als eine Zahl lesen und immer wieder halbieren,
+    # Byte 0 enthält dann das XOR der ersten 128 Bytes (NMEA-Sätze haben höchstens 82)
+    n = len(body)
+    if n > 128:
+        return reduce(xor, body, 0)
+    v = int.from_bytes(body, "little")
+    if n > 64:
+        v ^= v >> 512
+    v ^= v >> 256
+    v ^= v >> 128
+    v ^= v >> 64
+    v ^= v >> 32
+    v ^= v >> 16
+    v ^= v >> 8
+    return v & 0xFF
+
+
+def checksum_ok(line):
+    # line: b"$....*hh" ohne Zeilenende
+    if len(line) < 9 or line[-3] != 0x2A:  # '*'
+        return False
+    try:
+        expected = int(line[-2:], 16)
+    except ValueError:
+        return False
+    return xor_checksum(line[1:-3]) == expected
+
+
+def _coord(value, hemi):
+    # ddmm.mmmm / dddmm.mmmm -> Dezimalgrad
+    if not value or not hemi:
+        return None
+    v = float(value)
+    deg = v // 100
+    dec = deg + (v - deg * 100) / 60.0
+    return -dec if hemi == b"S" or hemi == b"W" else dec
+
+
+def _float(value):
+    return float(value) if value else None
+
+
+def _int(value):
+    return int(value) if value else None
+
+
+def _utc(value):
+    # hhmmss(.ss) -> Sekunden seit Mitternacht
+    if len(value) < 6:
+        return None
+    return int(value[0:2]) * 3600 + int(value[2:4]) * 60 + float(value[4:])
+
+
+def utc_timestamp(date, seconds):
+    # RMC-Datum ddmmyy + Sekunden seit Mitternacht -> Unix-Zeit (UTC)
+    if date is None or seconds is None or len(date) != 6:
+        return None
+    day, month, year = int(date[0:2]), int(date[2:4]), 2000 + int(date[4:6])
+    return calendar.timegm((year, month, day, 0, 0, 0)) + seconds
+
+
+def _gga(talker, f):
+    return Gga(talker, _utc(f[1]), _coord(f[2], f[3]), _coord(f[4], f[5]),
+               _int(f[6]) or 0, _int(f[7]), _float(f[8]), _float(f[9]))
+
+
+def _rmc(talker, f):
+    return Rmc(talker, _utc(f[1]), f[2] == b"A", _coord(f[3], f[4]), _coord(f[5], f[6]),
+               _float(f[7]), _float(f[8]), f[9] or None)
+
+
+def _gsa(talker, f):
+    prns = tuple(int(p) for p in f[3:15] if p)
+    return Gsa(talker, _int(f[2]) or 1, prns, _float(f[15]), _float(f[16]), _float(f[17]))
+
+
+def _vtg(talker, f):
+    return Vtg(talker, _float(f[1]), _float(f[5]), _float(f[7]))
+
+
+def _gsv(talker, f):
+    return Gsv(talker, _int(f[1]), _int(f[2]), _int(f[3]))
+
+
+# Satztyp -> (Parser, Mindestanzahl Felder)
+_PARSERS = {
+    b"GGA": (_gga, 10),
+    b"RMC": (_rmc, 10),
+    b"GSA": (_gsa, 18),
+    b"VTG": (_vtg, 8),
+    b"GSV": (_gsv, 4),
+}
+
+
+def parse_sentence(line, stats=None):
+    # line: bytes/memoryview eines Satzes ohne Zeilenende, liefert namedtuple oder None
+    if not isinstance(line, bytes):
+        line = bytes(line)
+    if len(line) < 10 or line[0] != 0x24:  # '$'
+        if stats is not None:
+            stats.malformed += 1
+        return None
+    entry = _PARSERS.get(line[3:6])
+    talker = line[1:3]
+    if entry is None or talker not in TALKERS:
+        if stats is not None:
+            stats.ignored += 1
+        return None
+    # Prüfsumme vor jeder Feldzerlegung: kaputte Zeilen kosten nur die XOR-Schleife
+    if not checksum_ok(line):
+        if stats is not None:
+            stats.checksum_errors += 1
+        return None
+
+    func, min_fields = entry
+    fields = line[:-3].split(b",")
+    if len(fields) < min_fields:
+        if stats is not None:
+            stats.malformed += 1
+        return None
+    try:
+        result = func(talker, fields)
+    except ValueError:
+        if stats is not None:
+            stats.malformed += 1
+        return None
+    if stats is not None:
+        stats.sentences += 1
+    return result
+
+
+class NmeaParser:
+    # Nimmt beliebige Blöcke aus Bulk-Reads entgegen und liefert vollständige Sätze
+    def __init__(self, max_line=128):
+        self.stats = NmeaStats()
+        self.max_line = max_line
+        self._rest = b""
+
+    def feed(self, data):
+        lines = (self._rest + data).split(b"\n") if self._rest else bytes(data).split(b"\n")
+        rest = lines.pop()
+        if len(rest) > self.max_line:
+            # Müll ohne Zeilenende verwerfen
+            self.stats.malformed += 1
+            rest = b""
+        self._rest = rest
+        out = []
+        stats = self.stats
+        for line in lines:
+            if line[-1:] == b"\r":
+                line = line[:-1]
+            if line:
+                sentence = parse_sentence(line, stats)
+                if sentence is not None:
+                    out.append(sentence)
+        return out
+
+
+def _legacy_parse(line, state):
+    # Bisheriger Parser aus shari_aprs_v2.1.py (nur für den Benchmark)
+    def convert_to_decimal(degree_min, direction):
+        degrees = int(degree_min) // 100
+        minutes = degree_min - degrees * 100
+        decimal = degrees + minutes / 60
+        if direction in ['S', 'W']:
+            decimal *= -1
+        return decimal
+
+    line = line.decode('ascii', errors='replace').strip()
+    if line.startswith('$GPGGA') or line.startswith('$GNGGA'):
+        parts = line.split(',')
+        try:
+            if parts[2] and parts[4]:
+                state[0] = convert_to_decimal(float(parts[2]), parts[3])
+                state[1] = convert_to_decimal(float(parts[4]), parts[5])
+            if parts[9]:
+                state[2] = float(parts[9])
+        except (ValueError, IndexError):
+            pass
+    elif line.startswith('$GPRMC') or line.startswith('$GNRMC'):
+        parts = line.split(',')
+        try:
+            if parts[3] and parts[5]:
+                state[0] = convert_to_decimal(float(parts[3]), parts[4])
+                state[1] = convert_to_decimal(float(parts[5]), parts[6])
+            if parts[7]:
+                state[3] = float(parts[7]) * 1.852
+        except (ValueError, IndexError):
+            pass
+
+
+def _bench(path=None, rounds=20000):
+    import time
+
+    if path:
+        with open(path, "rb") as f:
+            lines = [l.rstrip(b"\r\n") for l in f if l.startswith(b"$")]
+    else:
+        from nmea_sim import synthetic_epoch, nmea_sentence
+        lines = []
+        for t in range(200):
+            lines += [s.encode().rstrip(b"\r\n") for s in synthetic_epoch(1700000000 + t)]
+            lines.append(nmea_sentence("GPGSA,A,3,04,05,09,12,24,25,29,,,,,,1.8,0.9,1.5").encode().rstrip(b"\r\n"))
+            lines.append(nmea_sentence("GPGSV,3,1,11,04,45,120,42,05,30,200,38,09,60,310,45,12,10,050,30").encode().rstrip(b"\r\n"))
+            lines.append(nmea_sentence("GPVTG,54.7,T,,M,5.5,N,10.2,K,A").encode().rstrip(b"\r\n"))
+            lines.append(b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*00")
+    total = max(1, rounds // len(lines)) * lines
+    blob = b"\r\n".join(total) + b"\r\n"
+    posonly = [l for l in total if l[3:6] in (b"GGA", b"RMC")]
+
+    def rate(func, data):
+        t0 = time.perf_counter()
+        func(data)
+        return len(data) / (time.perf_counter() - t0)
+
+    def legacy(data):
+        state = [None, None, None, None]
+        for line in data:
+            _legacy_parse(line, state)
+
+    def legacy_checked(data):
+        # Gleiche Arbeit wie neu: der alte Parser übernimmt sonst auch Sätze mit falscher
+        # Prüfsumme (hier jeder 6. Satz) als Position
+        state = [None, None, None, None]
+        for line in data:
+            if checksum_ok(line):
+                _legacy_parse(line, state)
+
+    def new(data):
+        for line in data:
+            parse_sentence(line)
+
+    parser = NmeaParser()
+
+    def new_feed(blob):
+        for i in range(0, len(blob), 256):
+            parser.feed(blob[i:i + 256])
+
+    t0 = time.perf_counter()
+    new_feed(blob)
+    feed_rate = len(total) / (time.perf_counter() - t0)
+
+    print(f"Sätze: {len(total)} (davon GGA/RMC: {len(posonly)})")
+    print(f"alt, alle Sätze (nur GGA/RMC ausgewertet): {rate(legacy, total):9.0f} Sätze/s")
+    print(f"neu, alle Sätze (GGA/RMC/GSA/VTG/GSV):     {rate(new, total):9.0f} Sätze/s")
+    print(f"alt, nur GGA/RMC:                          {rate(legacy, posonly):9.0f} Sätze/s")
+    print(f"alt, nur GGA/RMC mit Prüfsumme:            {rate(legacy_checked, posonly):9.0f} Sätze/s")
+    print(f"neu, nur GGA/RMC (inkl. Prüfsumme):        {rate(new, posonly):9.0f} Sätze/s")
+    print(f"neu, NmeaParser.feed() in 256-Byte-Blöcken: {feed_rate:8.0f} Sätze/s")
+    s = parser.stats
+    print(f"gültig {s.sentences}, Prüfsummenfehler {s.checksum_errors}, "
+          f"fehlerhaft {s.malformed}, ignoriert {s.ignored}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="NMEA-Parser")
+    ap.add_argument("--bench", nargs="?", const="", metavar="DATEI",
+                    help="Durchsatz-Benchmark (optional mit NMEA-Aufzeichnung)")
+    args = ap.parse_args()
+    if args.bench is not None:
+        _bench(args.bench or None)
+    else:
+        ap.print_help()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# nmea_sim.py
+# Autor: OE9SAU
+# Beschreibung: GPS-Empfänger-Emulator über ein Pseudo-Terminal (pty).
+#               Spielt eine NMEA-Aufzeichnung ab oder erzeugt eine Testfahrt.
+#               Mit --receiver verhält er sich wie ein u-blox (UBX) oder MediaTek (PMTK)
+#               Empfänger: Werkseinstellung mit allen Sätzen, Konfiguration mit ACK,
+#               Baudratenwechsel (falsche Baudrate auf dem Host liefert nur Datenmüll).
+# Version: 1.1
+#
+# Start:  python3 nmea_sim.py [--file aufzeichnung.nmea] [--speed 10] [--receiver ublox]
+# Der ausgegebene Gerätepfad (z.B. /dev/pts/5) wird als DEVICE in shari_aprs.conf eingetragen.
+
+import argparse
+import math
+import os
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+
+RECEIVERS = ("ublox", "mtk", "generic")
+# Sätze in der Werkseinstellung (NEO-6/7/8 bzw. PA6H)
+DEFAULT_SENTENCES = {
+    "ublox": ("GGA", "GLL", "GSA", "GSV", "RMC", "VTG"),
+    "mtk": ("GGA", "GSA", "GSV", "RMC", "VTG"),
+    "generic": ("GGA", "GSA", "GSV", "RMC", "VTG"),
+}
+UBX_NMEA_IDS = {0x00: "GGA", 0x01: "GLL", 0x02: "GSA", 0x03: "GSV", 0x04: "RMC", 0x05: "VTG"}
+PMTK314_FIELDS = ("GLL", "RMC", "VTG", "GGA", "GSA", "GSV")
+
+
+def nmea_checksum(body):
+    cs = 0
+    for c in body.encode("ascii"):
+        cs ^= c
+    return f"{cs:02X}"
+
+
+def nmea_sentence(body):
+    return f"${body}*{nmea_checksum(body)}\r\n"
+
+
+def _ddmm(value, is_lat):
+    hemi = ("N" if value >= 0 else "S") if is_lat else ("E" if value >= 0 else "W")
+    value = abs(value)
+    deg = int(value)
+    minutes = (value - deg) * 60
+    return (f"{deg:02d}{minutes:07.4f}" if is_lat else f"{deg:03d}{minutes:07.4f}"), hemi
+
+
+def synthetic_epoch(t, lat0=47.25, lon0=9.6, radius_m=500.0, period_s=120.0):
+    # Kreisfahrt um lat0/lon0, liefert GGA + RMC für Sekunde t
+    angle = 2 * math.pi * (t % period_s) / period_s
+    lat = lat0 + (radius_m * math.cos(angle)) / 111320.0
+    lon = lon0 + (radius_m * math.sin(angle)) / (111320.0 * math.cos(math.radians(lat0)))
+    speed_kn = (2 * math.pi * radius_m / period_s) * 3600 / 1852
+    course = (math.degrees(angle) + 90) % 360
+
+    utc = time.gmtime(t)
+    hms = time.strftime("%H%M%S", utc) + ".00"
+    dmy = time.strftime("%d%m%y", utc)
+    la, ns = _ddmm(lat, True)
+    lo, ew = _ddmm(lon, False)
+    return [
+        nmea_sentence(f"GPGGA,{hms},{la},{ns},{lo},{ew},1,08,0.9,450.0,M,47.0,M,,"),
+        nmea_sentence(f"GPRMC,{hms},A,{la},{ns},{lo},{ew},{speed_kn:.1f},{course:.1f},{dmy},,,A"),
+    ]
+
+
+def receiver_epoch(t, sentences):
+    # Wie synthetic_epoch(), dazu GLL/GSA/GSV/VTG wie bei einem echten Empfänger
+    gga, rmc = synthetic_epoch(t)
+    f = rmc.split(",")
+    extra = {
+        "GLL": [nmea_sentence(f"GPGLL,{f[3]},{f[4]},{f[5]},{f[6]},{f[1]},A,A")],
+        "GSA": [nmea_sentence("GPGSA,A,3,04,05,09,12,24,25,29,31,,,,,1.8,0.9,1.5")],
+        "GSV": [nmea_sentence("GPGSV,3,1,11,04,45,120,42,05,30,200,38,09,60,310,45,12,10,050,30"),
+                nmea_sentence("GPGSV,3,2,11,24,70,090,47,25,20,270,33,29,55,150,44,31,15,330,29"),
+                nmea_sentence("GPGSV,3,3,11,02,05,010,,14,08,100,,32,03,250,")],
+        "VTG": [nmea_sentence(f"GPVTG,{f[8]},T,,M,{f[7]},N,{float(f[7]) * 1.852:.1f},K,A")],
+        "GGA": [gga],
+        "RMC": [rmc],
+    }
+    return [line for name in ("GGA", "GLL", "GSA", "GSV", "RMC", "VTG") if name in sentences
+            for line in extra[name]]
+
+
+def ubx_frame(cls, msg_id, payload=b""):
+    body = struct.pack("<BBH", cls, msg_id, len(payload)) + payload
+    a = b = 0
+    for c in body:
+        a = (a + c) & 0xFF
+        b = (b + a) & 0xFF
+    return b"\xb5\x62" + body + bytes((a, b))
+
+
+def read_epochs(path):
+    # Gruppiert eine Aufzeichnung in Sekunden-Blöcke (neuer Block bei jedem GGA)
+    epochs, current = [], []
+    with open(path, "r", encoding="ascii", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("$"):
+                continue
+            if line[3:6] == "GGA" and current:
+                epochs.append(current)
+                current = []
+            current.append(line + "\r\n")
+    if current:
+        epochs.append(current)
+    return epochs
+
+
+class NmeaEmulator:
+    def __init__(self, path=None, speed=1.0, loop=True, receiver=None, baudrate=9600):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.sent_epochs = 0
+        self.sent_sentences = 0
+        self.sent_bytes = 0
+        self.on_epoch = None  # optional: Callback(epoch_index, sentences, time.monotonic())
+
+        # Empfänger-Emulation (None = nur abspielen wie bisher)
+        self.receiver = receiver
+        self.baudrate = baudrate
+        self.sentences = set(DEFAULT_SENTENCES.get(receiver, ()))
+        self.rate_ms = 1000
+        self.dyn_model = None
+        self.commands = []  # empfangene Befehle (Text), zur Kontrolle
+        self._rx = b""
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="nmea-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def close(self):
+        self.stop()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def done(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    def _epochs(self):
+        if self.path:
+            epochs = read_epochs(self.path)
+            while True:
+                yield from epochs
+                if not self.loop:
+                    return
+        t = int(time.time())
+        while True:
+            if self.receiver:
+                yield receiver_epoch(t, self.sentences)
+            else:
+                yield synthetic_epoch(t)
+            t += 1
+
+    def _host_baud_ok(self):
+        # Baudrate, die der Host am pty eingestellt hat, mit der eigenen vergleichen
+        try:
+            ospeed = termios.tcgetattr(self._slave)[5]
+        except termios.error:
+            return True
+        return ospeed == getattr(termios, f"B{self.baudrate}", None)
+
+    def _write(self, data):
+        if self.receiver and not self._host_baud_ok():
+            # Falsche Baudrate: der Host sieht nur Datenmüll
+            data = bytes((c * 7 + 0x80) & 0xFF for c in data)
+        os.write(self._master, data)
+        self.sent_bytes += len(data)
+
+    def _poll_commands(self, timeout):
+        # Befehle vom Host lesen und beantworten, bis timeout abgelaufen ist
+        deadline = time.monotonic() + timeout
+        while not self._stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            ready, _, _ = select.select([self._master], [], [], min(remaining, 0.05))
+            if not ready:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                return
+            if not self._host_baud_ok():
+                continue  # bei falscher Baudrate kommt nichts Verwertbares an
+            self._rx += data
+            self._handle_rx()
+
+    def _handle_rx(self):
+        while True:
+            ubx = self._rx.find(b"\xb5\x62")
+            nmea = self._rx.find(b"$")
+            if ubx < 0 and nmea < 0:
+                self._rx = b""
+                return
+            if ubx >= 0 and (nmea < 0 or ubx < nmea):
+                frame = self._rx[ubx:]
+                if len(frame) < 8:
+                    return
+                length = struct.unpack_from("<H", frame, 4)[0]
+                if len(frame) < 8 + length:
+                    return
+                self._rx = frame[8 + length:]
+                if ubx_frame(frame[2], frame[3], frame[6:6 + length]) == frame[:8 + length]:
+                    self._ubx(frame[2], frame[3], frame[6:6 + length])
+            else:
+                end = self._rx.find(b"\n", nmea)
+                if end < 0:
+                    return
+                line = self._rx[nmea:end].strip().decode("ascii", errors="replace")
+                self._rx = self._rx[end + 1:]
+                body, _, cs = line[1:].partition("*")
+                if cs.upper() == nmea_checksum(body) and body.startswith("PMTK"):
+                    self._pmtk(body)
+
+    def _ubx(self, cls, msg_id, payload):
+        if self.receiver != "ublox":
+            return
+        self.commands.append(f"UBX {cls:02X}-{msg_id:02X} {payload.hex()}")
+        ack = ubx_frame(0x05, 0x01, bytes((cls, msg_id)))
+        if (cls, msg_id) == (0x0A, 0x04) and not payload:
+            sw = b"ROM CORE 3.01 (107888)".ljust(30, b"\0")
+            self._write(ubx_frame(0x0A, 0x04, sw + b"00080000".ljust(10, b"\0")))
+        elif (cls, msg_id) == (0x06, 0x01) and len(payload) in (3, 8) and payload[0] == 0xF0:
+            name = UBX_NMEA_IDS.get(payload[1])
+            rate = payload[2] if len(payload) == 3 else payload[3]  # aktueller Port bzw. UART1
+            if name is not None:
+                (self.sentences.add if rate else self.sentences.discard)(name)
+            self._write(ack)
+        elif (cls, msg_id) == (0x06, 0x08) and len(payload) == 6:
+            self.rate_ms = struct.unpack_from("<H", payload)[0]
+            self._write(ack)
+        elif (cls, msg_id) == (0x06, 0x24) and len(payload) == 36:
+            if struct.unpack_from("<H", payload)[0] & 0x01:
+                self.dyn_model = payload[2]
+            self._write(ack)
+        elif (cls, msg_id) == (0x06, 0x00) and len(payload) == 20 and payload[0] == 1:
+            # ACK noch mit der alten Baudrate, dann umschalten
+            self._write(ack)
+            self.baudrate = struct.unpack_from("<I", payload, 8)[0]
+        else:
+            self._write(ubx_frame(0x05, 0x00, bytes((cls, msg_id))))
+
+    def _pmtk(self, body):
+        if self.receiver != "mtk":
+            return
+        self.commands.append(body)
+        cmd, *fields = body[4:].split(",")
+
+        def ack(flag=3):
+            self._write(nmea_sentence(f"PMTK001,{cmd},{flag}").encode())
+
+        if cmd == "605":
+            self._write(nmea_sentence("PMTK705,AXN_2.10_3339_2012072601,5223,PA6H,1.0").encode())
+        elif cmd == "314" and len(fields) >= len(PMTK314_FIELDS):
+            self.sentences = {name for name, f in zip(PMTK314_FIELDS, fields) if f not in ("", "0")}
+            ack()
+        elif cmd == "220" and fields and fields[0].isdigit():
+            self.rate_ms = int(fields[0])
+            ack()
+        elif cmd == "886" and fields and fields[0].isdigit():
+            self.dyn_model = int(fields[0])
+            ack()
+        elif cmd == "251" and fields and fields[0].isdigit():
+            self.baudrate = int(fields[0])  # ohne ACK, sofort umgeschaltet
+        else:
+            ack(1)
+
+    def run(self):
+        next_tick = time.monotonic()
+        for epoch in self._epochs():
+            if self._stopping.is_set():
+                return
+            data = "".join(epoch).encode("ascii", errors="replace")
+            try:
+                self._write(data)
+            except OSError:
+                return
+            if self.on_epoch is not None:
+                self.on_epoch(self.sent_epochs, epoch, time.monotonic())
+            self.sent_epochs += 1
+            self.sent_sentences += len(epoch)
+            interval = self.rate_ms / 1000.0 / self.speed if self.speed > 0 else 0.0
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if self.receiver:
+                self._poll_commands(max(delay, 0.0))
+            elif delay > 0:
+                self._stopping.wait(delay)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="NMEA-Emulator über pty")
+    ap.add_argument("--file", help="NMEA-Aufzeichnung (ohne: synthetische Kreisfahrt)")
+    ap.add_argument("--speed", type=float, default=1.0, help="Zeitraffer-Faktor (0 = so schnell wie möglich)")
+    ap.add_argument("--once", action="store_true", help="Aufzeichnung nur einmal abspielen")
+    ap.add_argument("--receiver", choices=RECEIVERS,
+                    help="Empfänger mit Werkseinstellung und Konfigurationsbefehlen nachbilden")
+    ap.add_argument("--baudrate", type=int, default=9600, help="Baudrate des Empfängers beim Start")
+    args = ap.parse_args()
+
+    sim = NmeaEmulator(args.file, args.speed, loop=not args.once, receiver=args.receiver,
+                       baudrate=args.baudrate)
+    print(f"NMEA-Emulator läuft auf {sim.device}")
+    try:
+        sim.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+
+
+if __name__ == "__main__":
+    main()
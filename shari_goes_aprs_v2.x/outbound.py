@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# outbound.py
+# Autor: OE9SAU
+# Beschreibung: Ausgangsstufe vor APRS-IS: Duplikatsperre (Paketinhalt ohne Zeitstempel,
+#               gleitendes Zeitfenster) und Token-Bucket je Rufzeichen und gesamt.
+#               Zustand wird in einer kleinen Datei gehalten, damit auch eine
+#               Neustart-Schleife (systemd Restart=on-failure) nicht doppelt sendet.
+# Version: 1.0
+#
+# Selbsttest:  python3 outbound.py --selftest
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+
+REASONS = ("duplicate", "rate_call", "rate_global")
+
+
+def payload_key(packet):
+    # Quelle, Ziel (bei Mic-E Teil der Position) und Inhalt; Pfad und Zeitstempel
+    # (@/ + DDHHMMz, HHMMSSh, DDHHMM/) werden ignoriert
+    head, _, body = packet.partition(":")
+    src, _, dest = head.partition(">")
+    dest = dest.split(",")[0]
+    if body[:1] in ("@", "/") and len(body) >= 8 and body[1:7].isdigit() and body[7] in "zh/":
+        body = body[0] + body[8:]
+    return hashlib.blake2b(f"{src}>{dest}:{body}".encode("utf-8", "replace"),
+                           digest_size=8).hexdigest()
+
+
+def packet_call(packet):
+    return packet.split(">", 1)[0]
+
+
+class TokenBucket:
+    def __init__(self, rate_per_min, burst):
+        self.rate = rate_per_min / 60.0
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.stamp = None  # time.time() der letzten Auffüllung
+
+    def _refill(self, now):
+        if self.stamp is not None:
+            # Uhrsprung rückwärts (NTP nach dem Booten) füllt nichts auf
+            self.tokens = min(self.burst, self.tokens + max(0.0, now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now):
+        # Sekunden, bis ein Token frei ist
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, now):
+        # Darf negativ werden: gleichzeitige Pakete reservieren ihren Platz nacheinander
+        self._refill(now)
+        self.tokens -= 1
+
+    def state(self):
+        return [self.tokens, self.stamp]
+
+    def restore(self, state):
+        self.tokens, self.stamp = min(float(state[0]), self.burst), state[1]
+
+
+class Outbound:
+    def __init__(self, dedupe_window=30, call_rate=12, call_burst=10, global_rate=60,
+                 global_burst=30, max_delay=10, state_file=None, save_interval=10.0):
+        self.dedupe_window = dedupe_window
+        self.call_rate = call_rate
+        self.call_burst = call_burst
+        self.max_delay = max_delay
+        self.state_file = state_file
+        self.save_interval = save_interval
+        self._dirty = False
+        self._last_save = None  # erstes Paket nach dem Start sofort speichern (Neustart-Schleife)
+
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.call_buckets = {}
+        self.seen = {}  # payload_key -> time.time() des Sendens
+
+        self.passed = 0
+        self.drops = Counter()
+        self.delays = Counter()
+        self.delay_total = 0.0
+        self._load()
+
+    @classmethod
+    def from_config(cls, section):
+        return cls(
+            dedupe_window=section.getfloat('DEDUPE_WINDOW', 30),
+            call_rate=section.getfloat('CALL_RATE', 12),
+            call_burst=section.getint('CALL_BURST', 10),
+            global_rate=section.getfloat('GLOBAL_RATE', 60),
+            global_burst=section.getint('GLOBAL_BURST', 30),
+            max_delay=section.getfloat('MAX_DELAY', 10),
+            state_file=section.get('STATE_FILE', 'shari_aprs_outbound.json') or None,
+            save_interval=section.getfloat('SAVE_INTERVAL', 10),
+        )
+
+    def _bucket(self, call):
+        bucket = self.call_buckets.get(call)
+        if bucket is None:
+            bucket = self.call_buckets[call] = TokenBucket(self.call_rate, self.call_burst)
+        return bucket
+
+    def _expire(self, now):
+        for key, t in list(self.seen.items()):
+            if not now - self.dedupe_window < t <= now + self.dedupe_window:
+                del self.seen[key]
+
+    def is_duplicate(self, packet, now=None):
+        now = time.time() if now is None else now
+        t = self.seen.get(payload_key(packet))
+        return t is not None and now - self.dedupe_window < t <= now + self.dedupe_window
+
+    async def admit(self, packet, max_delay=-1):
+        # None = senden, sonst Grund (REASONS). max_delay=None wartet ohne Reservierung, bis
+        # ein Token frei ist (nachgesendete Positionen: nie verwerfen, aktuelle haben Vorrang).
+        if max_delay == -1:
+            max_delay = self.max_delay
+        if self.is_duplicate(packet):
+            self.drops["duplicate"] += 1
+            return "duplicate"
+
+        call_bucket = self._bucket(packet_call(packet))
+        waited = 0.0
+        reason = None
+        while True:
+            now = time.time()
+            call_wait = call_bucket.wait_time(now)
+            global_wait = self.global_bucket.wait_time(now)
+            wait = max(call_wait, global_wait)
+            if wait <= 0:
+                break
+            reason = "rate_call" if call_wait >= global_wait else "rate_global"
+            if max_delay is None:
+                waited += wait
+                await asyncio.sleep(wait)
+                continue
+            if wait > max_delay:
+                self.drops[reason] += 1
+                return reason
+            call_bucket.take(now)
+            self.global_bucket.take(now)
+            self.delays[reason] += 1
+            self.delay_total += wait
+            self.passed += 1
+            await asyncio.sleep(wait)
+            return None
+
+        if reason is not None:
+            self.delays[reason] += 1
+            self.delay_total += waited
+        call_bucket.take(now)
+        self.global_bucket.take(now)
+        self.passed += 1
+        return None
+
+    def sent(self, packet):
+        # Erst nach erfolgreichem Senden sperren, sonst würde die zwischengespeicherte
+        # Position beim Nachsenden als Duplikat verworfen
+        now = time.time()
+        self._expire(now)
+        self.seen[payload_key(packet)] = now
+        # Die SD-Karte sieht höchstens alle save_interval Sekunden einen Schreibzugriff
+        self._dirty = True
+        mono = time.monotonic()
+        if self._last_save is None or mono - self._last_save >= self.save_interval:
+            self._save()
+            self._last_save = mono
+
+    def close(self):
+        if self._dirty:
+            self._save()
+
+    def _load(self):
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.seen = {k: float(t) for k, t in state.get("seen", {}).items()}
+            if "global" in state:
+                self.global_bucket.restore(state["global"])
+            for call, s in state.get("calls", {}).items():
+                self._bucket(call).restore(s)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError, KeyError, IndexError, AttributeError) as e:
+            print(f"Ausgangsstufe: Zustand aus {self.state_file} nicht lesbar ({e}), starte leer.")
+            self.seen = {}
+            return
+        self._expire(time.time())
+
+    def _save(self):
+        if not self.state_file:
+            return
+        state = {
+            "seen": self.seen,
+            "global": self.global_bucket.state(),
+            "calls": {call: b.state() for call, b in self.call_buckets.items()},
+        }
+        tmp = self.state_file + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_file)
+            self._dirty = False
+        except OSError as e:
+            print(f"Ausgangsstufe: Zustand nicht gespeichert ({e}).")
+
+    def stats(self):
+        return {
+            "passed": self.passed,
+            "dropped": {r: self.drops[r] for r in REASONS},
+            "delayed": {r: self.delays[r] for r in REASONS[1:]},
+            "delay_total_s": self.delay_total,
+        }
+
+    def summary(self):
+        s = self.stats()
+        dropped = ", ".join(f"{r} {n}" for r, n in s["dropped"].items())
+        delayed = ", ".join(f"{r} {n}" for r, n in s["delayed"].items())
+        return (f"Ausgang: {s['passed']} Pakete durchgelassen, verworfen: {dropped}, "
+                f"verzögert: {delayed} ({s['delay_total_s']:.1f} s)")
+
+
+def _selftest():
+    import tempfile
+
+    a = "OE9SAU-9>APN100,TCPIP*:@134930h4715.00N/00936.00E(SHARI"
+    b = "OE9SAU-9>APN100,TCPIP*,qAC,T2:@134931h4715.00N/00936.00E(SHARI"
+    c = "OE9SAU-9>APN100,TCPIP*:@134931h4715.01N/00936.00E(SHARI"
+    d = "OE9SAU-9>APN100,TCPIP*:!4715.00N/00936.00E(SHARI"
+    assert payload_key(a) == payload_key(b)
+    assert payload_key(a) != payload_key(c)
+    assert payload_key(a) != payload_key(d)
+    # Mic-E: Ziel gehört zur Position
+    assert payload_key("N0CALL>T4PQRS:`abc") != payload_key("N0CALL>T4PQRT:`abc")
+
+    async def run(path):
+        out = Outbound(dedupe_window=30, call_rate=60, call_burst=2, global_rate=600,
+                       global_burst=100, max_delay=0.5, state_file=path)
+        assert await out.admit(a) is None
+        out.sent(a)
+        assert await out.admit(b) == "duplicate"
+        assert await out.admit(c) is None  # zweites Token
+        out.sent(c)
+        t0 = time.monotonic()
+        assert await out.admit(d) == "rate_call"  # 1 s > max_delay
+        assert await out.admit(d, max_delay=2) is None
+        out.sent(d)
+        assert time.monotonic() - t0 >= 0.9
+        assert out._dirty  # nur das erste Paket wurde sofort gespeichert
+        out.close()
+        # Neustart: Duplikatsperre und Bucket kommen aus der Datei
+        out = Outbound(dedupe_window=30, call_rate=60, call_burst=2, max_delay=0.5,
+                       state_file=path)
+        assert await out.admit(b) == "duplicate"
+        assert await out.admit(a.replace("SHARI", "TEST"), max_delay=0) == "rate_call"
+        print(out.summary())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(os.path.join(tmp, "state.json")))
+    print("Selbsttest OK")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Ausgangsstufe (Duplikate, Ratenlimit)")
+    ap.add_argument("--selftest", action="store_true")
+    args = ap.parse_args()
+    if args.selftest:
+        _selftest()
+    else:
+        ap.print_help()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# replay.py
+# Autor: OE9SAU
+# Beschreibung: Lasttest ohne Empfänger und ohne Internet: NMEA-Aufzeichnung über pty
+#               -> shari_aprs_v2.1.py -> lokaler Fake-APRS-IS. Misst Latenz Fix->Paket,
+#               Pakete pro simulierter Stunde und CPU-Zeit pro NMEA-Satz.
+# Version: 1.0
+#
+# Start:  python3 replay.py --file fahrt.nmea --speed 10
+#         python3 replay.py --duration 3600 --speed 20 --set BEACON.SMARTBEACON=true
+#         python3 replay.py --servers 3 --server-delay 80,10,40 --fail-at 900   (Failover)
+# Ohne --file wird die synthetische Kreisfahrt aus nmea_sim.py abgespielt.
+
+import argparse
+import bisect
+import configparser
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from aprs_packet import decode_position
+from fake_aprsis import FakeAprsIsServer, aprs_passcode
+from nmea import Gga, Rmc, parse_sentence
+from nmea_sim import NmeaEmulator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DAEMON = os.path.join(HERE, "shari_aprs_v2.1.py")
+
+# Zeitwerte (Sekunden), die mit dem Zeitraffer-Faktor mitskaliert werden
+SCALED = {
+    "BEACON": ("SEND_INTERVAL", "FAST_RATE", "SLOW_RATE", "MIN_TURN_TIME"),
+    "QUEUE": ("DRAIN_INTERVAL",),
+    "APRS": ("REPROBE_INTERVAL",),
+    "TELEMETRY": ("SAMPLE_INTERVAL", "INTERVAL", "DEFINITION_INTERVAL"),
+    "OUTBOUND": ("DEDUPE_WINDOW", "MAX_DELAY"),
+}
+# Raten pro Minute werden entsprechend vervielfacht
+RATES = {"OUTBOUND": ("CALL_RATE", "GLOBAL_RATE")}
+# Auflösung der Position im Paket in Grad (Zuordnung Paket -> NMEA-Epoche)
+TOLERANCE = {"uncompressed": 1 / 6000.0, "compressed": 1e-4, "mice": 1 / 6000.0}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+def proc_cpu(pid):
+    # Verbrauchte CPU-Zeit (user + system) eines Prozesses in Sekunden, nur Linux
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def epoch_position(sentences):
+    for line in sentences:
+        msg = parse_sentence(line.strip().encode("ascii", errors="replace"))
+        if isinstance(msg, (Gga, Rmc)) and msg.lat is not None and msg.lon is not None:
+            return msg.lat, msg.lon
+    return None
+
+
+def write_config(base, path, overrides, speed, server_ports, device, workdir):
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(base)
+
+    aprs = config["APRS"]
+    if not aprs.get("MYCALL") or " " in aprs["MYCALL"]:
+        aprs["MYCALL"] = "N0CALL-9"
+    aprs["PASSCODE"] = str(aprs_passcode(aprs["MYCALL"]))
+    aprs["SERVER"] = ", ".join(f"127.0.0.1:{port}" for port in server_ports)
+    aprs["PORT"] = str(server_ports[0])
+
+    gps = config["GPS"]
+    for key in list(gps):
+        if key.lower() == "gps_source":
+            del gps[key]
+    gps["gps_source"] = "usb"
+    gps["DEVICE"] = device
+
+    for section, key, value in overrides:
+        if not config.has_section(section):
+            config.add_section(section)
+        config[section][key] = value
+
+    for section, keys in SCALED.items():
+        for key in keys:
+            if config.has_section(section) and key in config[section]:
+                value = float(config[section][key])
+                config[section][key] = str(max(1, int(round(value / speed))))
+    for section, keys in RATES.items():
+        for key in keys:
+            if config.has_section(section) and key in config[section]:
+                config[section][key] = str(float(config[section][key]) * speed)
+
+    # Warteschlange und Fahrtenbuch im Arbeitsverzeichnis, nie im echten Verzeichnis
+    if config.has_section("QUEUE"):
+        config["QUEUE"]["FILE"] = os.path.join(workdir, "queue.db")
+    if config.has_section("TRACK"):
+        config["TRACK"]["DIR"] = os.path.join(workdir, "tracks")
+    if config.has_section("OUTBOUND"):
+        config["OUTBOUND"]["STATE_FILE"] = os.path.join(workdir, "outbound.json")
+
+    with open(path, "w", encoding="utf-8") as f:
+        config.write(f)
+    return config
+
+
+class Replay:
+    def __init__(self, path=None, speed=10.0, duration=3600, config="shari_aprs.conf",
+                 overrides=(), verbose=False, keep=False, server_delays=(0.0,), fail_at=None):
+        self.path = path
+        self.speed = speed
+        self.duration = duration
+        self.base_config = config
+        self.overrides = overrides
+        self.verbose = verbose
+        self.keep = keep
+        self.server_delays = server_delays  # ein Fake-Server pro Eintrag, Sekunden bis logresp
+        self.fail_at = fail_at  # simulierte Sekunde, zu der der aktive Server ausfällt
+
+        self.failed_server = None
+        self.fail_time = None
+        self.epochs = []  # (Schreibzeit, (lat, lon) oder None)
+        self._lock = threading.Lock()
+
+    def _on_epoch(self, index, sentences, _monotonic):
+        pos = epoch_position(sentences)
+        with self._lock:
+            self.epochs.append((time.time(), pos))
+
+    def run(self):
+        workdir = tempfile.mkdtemp(prefix="shari_replay_")
+        servers = [FakeAprsIsServer(name=f"FAKE{i + 1}", delay=d).start()
+                   for i, d in enumerate(self.server_delays)]
+        sim = NmeaEmulator(self.path, self.speed, loop=self.path is None)
+        sim.on_epoch = self._on_epoch
+        config = write_config(self.base_config, os.path.join(workdir, "shari_aprs.conf"),
+                              self.overrides, self.speed, [srv.port for srv in servers],
+                              sim.device, workdir)
+        fmt = config["APRS"].get("FORMAT", "uncompressed").lower()
+
+        log = None if self.verbose else open(os.path.join(workdir, "shari_aprs.log"), "w")
+        proc = subprocess.Popen([sys.executable, DAEMON], cwd=workdir, stdout=log,
+                                stderr=subprocess.STDOUT,
+                                env=dict(os.environ, PYTHONUNBUFFERED="1"))
+        try:
+            # Erst abspielen, wenn der Daemon eingeloggt ist (Start zählt nicht zur Messung)
+            deadline = time.monotonic() + 30
+            while (not any(srv.logins for srv in servers) and proc.poll() is None
+                   and time.monotonic() < deadline):
+                time.sleep(0.05)
+            if not any(srv.logins for srv in servers):
+                raise RuntimeError(f"shari_aprs hat sich nicht angemeldet, Log: {workdir}")
+
+            cpu_start = proc_cpu(proc.pid)
+            t_start = time.monotonic()
+            sim.start()
+            end = t_start + self.duration / self.speed
+            fail = t_start + self.fail_at / self.speed if self.fail_at is not None else None
+            while proc.poll() is None and not sim.done() and time.monotonic() < end:
+                if fail is not None and time.monotonic() >= fail:
+                    fail = None
+                    self._fail_active(servers)
+                time.sleep(0.05)
+            sim.stop()
+            # Nachzügler abwarten, danach CPU-Zeit vor dem Beenden ablesen
+            time.sleep(0.5)
+            cpu_end = proc_cpu(proc.pid)
+            elapsed = time.monotonic() - t_start
+        finally:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            if log is not None:
+                log.close()
+            sim.close()
+            for i, srv in enumerate(servers):
+                if i != self.failed_server:
+                    srv.stop()
+
+        result = self.evaluate(servers, sim, fmt, elapsed, cpu_start, cpu_end)
+        result["exit_code"] = proc.returncode
+        if self.keep or proc.returncode not in (0, -signal.SIGTERM):
+            result["workdir"] = workdir
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+        return result
+
+    def _fail_active(self, servers):
+        # Server mit dem jüngsten Login und offener Verbindung ausfallen lassen
+        active = [(srv.logins[-1][0], i) for i, srv in enumerate(servers)
+                  if srv.logins and srv.connections]
+        if not active:
+            return
+        self.failed_server = max(active)[1]
+        self.fail_time = time.time()
+        servers[self.failed_server].stop()
+        print(f"Server FAKE{self.failed_server + 1} ausgefallen")
+
+    def evaluate(self, servers, sim, fmt, elapsed, cpu_start, cpu_end):
+        packets = sorted(p + (i,) for i, srv in enumerate(servers) for p in srv.packets)
+        errors = [e for srv in servers for e in srv.errors]
+        logins = sorted(l + (i,) for i, srv in enumerate(servers) for l in srv.logins)
+        with self._lock:
+            epochs = list(self.epochs)
+        times = [t for t, _ in epochs]
+        tol = TOLERANCE.get(fmt, 1e-4) + 1e-7
+
+        latencies, unmatched = [], 0
+        for arrival, call, verified, line, _ in packets:
+            try:
+                pos = decode_position(line)
+            except ValueError:
+                continue
+            if "lat" not in pos:
+                continue
+            # Jüngste Epoche vor der Ankunft mit passender Position suchen
+            i = bisect.bisect_right(times, arrival) - 1
+            while i >= 0:
+                p = epochs[i][1]
+                if p is not None and abs(p[0] - pos["lat"]) <= tol and abs(p[1] - pos["lon"]) <= tol:
+                    latencies.append(arrival - times[i])
+                    break
+                i -= 1
+            else:
+                unmatched += 1
+
+        failover = None
+        if self.fail_time is not None:
+            # Zeit vom Ausfall bis zum ersten Paket über einen anderen Server
+            after = [p[0] for p in packets if p[0] >= self.fail_time and p[4] != self.failed_server]
+            failover = {
+                "server": f"FAKE{self.failed_server + 1}",
+                "first_packet_s": round(after[0] - self.fail_time, 3) if after else None,
+                "relogin_s": next((round(l[0] - self.fail_time, 3) for l in logins
+                                   if l[0] >= self.fail_time), None),
+            }
+
+        sim_hours = sim.sent_epochs / 3600.0
+        cpu = cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None
+        return {
+            "format": fmt,
+            "speed": self.speed,
+            "epochs": sim.sent_epochs,
+            "sentences": sim.sent_sentences,
+            "simulated_s": sim.sent_epochs,
+            "elapsed_s": round(elapsed, 3),
+            "packets": len(packets),
+            "packets_per_server": {srv.name: len(srv.packets) for srv in servers},
+            "invalid": len(errors),
+            "invalid_examples": [f"{e}: {line}" for _, line, e in errors[:5]],
+            "unverified": sum(1 for p in packets if not p[2]),
+            "unmatched": unmatched,
+            # Beim parallelen Anmelden zählen auch die abgebrochenen Verbindungen mit
+            "logins": len(logins),
+            "failover": failover,
+            "packets_per_sim_hour": round(len(packets) / sim_hours, 1) if sim_hours else None,
+            "latency_ms": {
+                "p50": _ms(percentile(latencies, 50)),
+                "p90": _ms(percentile(latencies, 90)),
+                "p99": _ms(percentile(latencies, 99)),
+                "max": _ms(max(latencies) if latencies else None),
+            },
+            "cpu_s": round(cpu, 3) if cpu is not None else None,
+            "cpu_us_per_sentence": (round(cpu / sim.sent_sentences * 1e6, 1)
+                                    if cpu is not None and sim.sent_sentences else None),
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def print_report(r):
+    lat = r["latency_ms"]
+    print(f"Format {r['format']}, Zeitraffer {r['speed']:g}x: {r['epochs']} Epochen / "
+          f"{r['sentences']} NMEA-Sätze ({r['simulated_s'] / 3600:.2f} h simuliert) "
+          f"in {r['elapsed_s']:.1f} s")
+    print(f"Pakete: {r['packets']} ({r['packets_per_sim_hour']} pro simulierter Stunde), "
+          f"ungültig {r['invalid']}, unverified {r['unverified']}, ohne Zuordnung {r['unmatched']}, "
+          f"Logins {r['logins']}")
+    if len(r["packets_per_server"]) > 1:
+        print("Pakete pro Server: " + ", ".join(f"{k} {v}" for k, v in r["packets_per_server"].items()))
+    if r["failover"] is not None:
+        f = r["failover"]
+        print(f"Ausfall {f['server']}: neuer Login nach {f['relogin_s']} s, "
+              f"erstes Paket über anderen Server nach {f['first_packet_s']} s")
+    for example in r["invalid_examples"]:
+        print(f"  ungültig: {example}")
+    print(f"Latenz Fix->Paket: p50 {lat['p50']} ms, p90 {lat['p90']} ms, p99 {lat['p99']} ms, "
+          f"max {lat['max']} ms")
+    if r["cpu_s"] is not None:
+        print(f"CPU shari_aprs: {r['cpu_s']:.3f} s = {r['cpu_us_per_sentence']} µs pro NMEA-Satz")
+    if "workdir" in r:
+        print(f"Arbeitsverzeichnis mit Log und Konfiguration: {r['workdir']}")
+
+
+def _override(text):
+    key, sep, value = text.partition("=")
+    section, dot, option = key.partition(".")
+    if not sep or not dot:
+        raise argparse.ArgumentTypeError("Format: SECTION.KEY=WERT")
+    return section, option, value
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lasttest: NMEA-Aufzeichnung -> shari_aprs -> Fake-APRS-IS")
+    ap.add_argument("--file", help="NMEA-Aufzeichnung (ohne: synthetische Kreisfahrt)")
+    ap.add_argument("--speed", type=float, default=10.0, help="Zeitraffer-Faktor (Standard 10)")
+    ap.add_argument("--duration", type=float, default=3600,
+                    help="Simulierte Sekunden (bei --file höchstens die Länge der Aufzeichnung)")
+    ap.add_argument("--config", default=os.path.join(HERE, "shari_aprs.conf"),
+                    help="Basis-Konfiguration")
+    ap.add_argument("--set", dest="overrides", action="append", type=_override, default=[],
+                    metavar="SECTION.KEY=WERT", help="Konfigurationswert überschreiben (mehrfach)")
+    ap.add_argument("--servers", type=int, default=1, help="Anzahl Fake-APRS-IS Server")
+    ap.add_argument("--server-delay", default="",
+                    help="Login-Verzögerung je Server in ms, durch Komma getrennt (z.B. 80,10,40)")
+    ap.add_argument("--fail-at", type=float,
+                    help="Simulierte Sekunde, zu der der aktive Server ausfällt")
+    ap.add_argument("--json", help="Ergebnis zusätzlich als JSON in diese Datei schreiben")
+    ap.add_argument("--verbose", action="store_true", help="Ausgabe von shari_aprs anzeigen")
+    ap.add_argument("--keep", action="store_true", help="Arbeitsverzeichnis nicht löschen")
+    args = ap.parse_args()
+
+    if args.speed <= 0:
+        ap.error("--speed muss größer 0 sein (Zeitwerte werden damit skaliert)")
+
+    delays = [float(d) / 1000.0 for d in args.server_delay.split(",") if d.strip()]
+    delays = (delays + [0.0] * args.servers)[:max(args.servers, len(delays))]
+
+    result = Replay(args.file, args.speed, args.duration, args.config, args.overrides,
+                    args.verbose, args.keep, delays, args.fail_at).run()
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,174 @@
 # shari_aprs.py
 # Autor: OE9SAU
-# Beschreibung: GPS-Daten werden per APRS-IS gesendet über ncat
+# Beschreibung: GPS-Daten werden per APRS-IS gesendet (dauerhafte Verbindung, asyncio)
 # Version: 2.1
 
-import serial
+import asyncio
+import os
+import signal
 import time
-import subprocess
 import configparser
 
+from aprs_is import AprsIsClient, parse_servers
+from aprs_rx import Receiver, SpatialIndex
+from beacon_queue import BeaconQueue
+from fix_shm import DEFAULT_PATH as FIX_SHM_PATH, FixPublisher
+from gps_config import ReceiverConfig
+from gps_reader import GpsFix, GpsReader
+from gpsd_client import GpsdClient
+from kiss import KissTnc
+from metrics import Registry
+from outbound import Outbound
+from stations import BeaconScheduler, build_station, load_stations, merged_section
+from telemetry import Telemetry
+from track import TrackWriter
+
+CONFIG_FILE = 'shari_aprs.conf'
+# Diese Abschnitte werden beim Neuladen nicht übernommen (offene Dateien, Sockets, Tasks)
+RESTART_SECTIONS = ('QUEUE', 'TRACK', 'RECEIVE', 'OUTBOUND', 'METRICS', 'KISS', 'SHM')
+# In [GPS] gelten nur diese Werte sofort, die Quelle selbst erst nach einem Neustart
+GPS_RELOAD_KEYS = ('timeout', 'latitude', 'longitude')
+
 # Konfigurationsdatei einlesen
 config = configparser.ConfigParser()
-config.read('shari_aprs.conf')
+config.read(CONFIG_FILE)
+
+
+def aprs_settings(cfg):
+    # Login und Server aus [APRS], wirft KeyError/ValueError bei fehlenden oder ungültigen Werten
+    sec = cfg['APRS']
+    return {
+        # Ein oder mehrere Server (host[:port], durch Komma getrennt), der schnellste wird verwendet
+        'servers': parse_servers(sec['SERVER'], int(sec['PORT'])),
+        'user': sec['MYCALL'],
+        'password': sec['PASSCODE'],
+        'keepalive': int(sec.get('KEEPALIVE', 60)),
+        'dns_ttl': sec.getint('DNS_TTL', 300),
+        'reprobe_interval': sec.getint('REPROBE_INTERVAL', 3600),
+    }
+
 
 # APRS-Konfiguration
-user = config['APRS']['MYCALL']
-password = config['APRS']['PASSCODE']
-server = config['APRS']['SERVER']
-port = int(config['APRS']['PORT'])
-senduser = user
-table = config['APRS']['SYMBOL_TABLE']
-symbol = config['APRS']['SYMBOL']
-comment = config['APRS']['COMMENT']
+aprs = aprs_settings(config)
+senduser = aprs['user']
 
 # GPS-Konfiguration
-gps_source = config['GPS']['gps_source'].lower()  # Quelle für GPS (usb, gpio, config)
-gps_device = config['GPS'].get('DEVICE', '/dev/ttyACM0')  # Standard für USB, falls nicht gesetzt
-gps_baudrate = int(config['GPS'].get('BAUDRATE', 9600))
+gps_source = config['GPS']['gps_source'].lower()  # Quelle für GPS (usb, gpio, gpsd, config)
 gps_timeout = int(config['GPS'].get('TIMEOUT', 10))
 print(f"GPS-Quelle: '{gps_source}'")
 
-# Beacon-Konfiguration
-send_interval = int(config['BEACON']['SEND_INTERVAL'])
-send_on_move_only = config['BEACON'].getboolean('SEND_ON_MOVE_ONLY')
+# Warteschlange für Positionen während APRS-IS Ausfällen
+beacon_queue = None
+if config.has_section('QUEUE') and config['QUEUE'].getboolean('ENABLED', False):
+    beacon_queue = BeaconQueue(
+        config['QUEUE'].get('FILE', 'shari_aprs_queue.db'),
+        max_entries=config['QUEUE'].getint('MAX_ENTRIES', 10000),
+        max_age_days=config['QUEUE'].getfloat('MAX_AGE_DAYS', 7),
+        drain_interval=config['QUEUE'].getfloat('DRAIN_INTERVAL', 2),
+    )
+
+# Ausgangsstufe: Duplikatsperre und Ratenlimit für alle Pakete an APRS-IS
+outbound = None
+if config.has_section('OUTBOUND') and config['OUTBOUND'].getboolean('ENABLED', False):
+    outbound = Outbound.from_config(config['OUTBOUND'])
+
+# Fahrtenbuch: jeder Fix wird binär mitgeschrieben (Export mit track.py)
+track_writer = None
+if config.has_section('TRACK') and config['TRACK'].getboolean('ENABLED', False):
+    track_writer = TrackWriter(
+        config['TRACK'].get('DIR', 'tracks'),
+        max_file_size=config['TRACK'].getint('MAX_FILE_SIZE_KB', 4096) * 1024,
+        max_files=config['TRACK'].getint('MAX_FILES', 50),
+        flush_interval=config['TRACK'].getfloat('FLUSH_INTERVAL', 10),
+    )
+
+# Telemetrie (Last, Temperatur, RAM, SD-Karte, Satelliten, APRS-IS Zustand)
+telemetry = None
+if config.has_section('TELEMETRY') and config['TELEMETRY'].getboolean('ENABLED', False):
+    telemetry = Telemetry.from_config(senduser, config['TELEMETRY'])
+
+# Empfang: Stationen im Umkreis (APRS-IS Filter r/lat/lon/km), Abfrage über Unix-Socket
+receiver = None
+query_socket = None
+if config.has_section('RECEIVE') and config['RECEIVE'].getboolean('ENABLED', False):
+    receiver = Receiver(
+        SpatialIndex(max_entries=config['RECEIVE'].getint('MAX_STATIONS', 2000),
+                     ttl=config['RECEIVE'].getint('TTL', 3600)),
+        range_km=config['RECEIVE'].getfloat('RANGE_KM', 50),
+    )
+    query_socket = config['RECEIVE'].get('QUERY_SOCKET', '/tmp/shari_aprs.sock')
+
+# Metriken für Prometheus (HTTP GET /metrics und/oder Unix-Socket)
+metrics_http = None
+metrics_socket = None
+if config.has_section('METRICS') and config['METRICS'].getboolean('ENABLED', False):
+    if config['METRICS'].getint('PORT', 9108):
+        metrics_http = (config['METRICS'].get('HOST', '127.0.0.1'),
+                        config['METRICS'].getint('PORT', 9108))
+    metrics_socket = config['METRICS'].get('SOCKET', '') or None
+
+# Funk über KISS-TNC (Direwolf/Hardware-TNC): both = zusätzlich zu APRS-IS,
+# fallback = nur wenn APRS-IS nicht erreichbar ist
+kiss_mode = None
+if config.has_section('KISS') and config['KISS'].getboolean('ENABLED', False):
+    kiss_mode = config['KISS'].get('MODE', 'fallback').lower()
+    if kiss_mode not in ('both', 'fallback'):
+        raise ValueError(f"[KISS] MODE muss both oder fallback sein, nicht '{kiss_mode}'")
+
+# Letzten Fix für OLED-Anzeige, SVXLink und Dashboard bereitstellen (fix_shm.FixReader)
+fix_shm_path = None
+if config.has_section('SHM') and config['SHM'].getboolean('ENABLED', False):
+    fix_shm_path = config['SHM'].get('PATH', FIX_SHM_PATH)
+
+gps_reader = None
+aprs_client = None
+kiss_tnc = None
+fix_publisher = None
+scheduler = None
+stations = []  # eigene Station zuerst, dann [STATION:<call>]
+sources = {}  # ('serial', Gerät) bzw. ('gpsd', Host, Port) -> FixSource
+source_tasks = []
+source_added = None  # asyncio.Event, gesetzt wenn beim Neuladen eine Quelle dazukommt
+config_generation = 1
+loaded_mtime = None  # Stand der zuletzt gelesenen Datei (auch wenn sie ungültig war)
+
+
+class LatencyStats:
+    # Zeit vom Empfang des Fixes bis das Paket an APRS-IS übergeben ist
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+    def summary(self):
+        if not self.count:
+            return "Fix->Paket: noch keine Messung"
+        return (f"Fix->Paket: letzte {self.last * 1000:.1f} ms, "
+                f"Mittel {self.total / self.count * 1000:.1f} ms, "
+                f"max {self.max * 1000:.1f} ms ({self.count} Pakete)")
+
+
+fix_latency = LatencyStats()
 
-def convert_to_decimal(degree_min, direction):
-    degrees = int(degree_min) // 100
-    minutes = degree_min - degrees * 100
-    decimal = degrees + minutes / 60
-    if direction in ['S', 'W']:
-        decimal *= -1
-    return decimal
+# Zähler werden immer geführt (eine Addition), Text entsteht nur beim Abruf
+metrics = Registry()
+packets_sent = metrics.counter('packets_sent_total', 'An APRS-IS übergebene Pakete')
+packets_failed = metrics.counter('packets_failed_total',
+                                 'Pakete ohne APRS-IS Verbindung (zwischengespeichert oder verloren)')
+send_latency = metrics.histogram('send_latency_seconds', 'Dauer bis das Paket an APRS-IS übergeben ist')
+fix_to_packet = metrics.histogram('fix_to_packet_seconds', 'Empfang des Fixes bis Paket gesendet')
+rf_sent = metrics.counter('rf_packets_sent_total', 'An den KISS-TNC übergebene Pakete')
+rf_failed = metrics.counter('rf_packets_failed_total', 'Pakete, die der KISS-TNC nicht annehmen konnte')
+rf_latency = metrics.histogram('rf_send_latency_seconds', 'Dauer bis der Rahmen beim KISS-TNC ist')
 
-def read_gps_data():
+async def read_gps_data():
     if gps_source == 'config':
         try:
             latitude = float(config['GPS']['LATITUDE'])
@@ -49,93 +176,515 @@ def read_gps_data():
             altitude = 0.0  # Optional: Standardhöhe
             speed_kmh = 0.0  # Optional: Standardgeschwindigkeit
             print("GPS-Daten aus der Konfiguration verwendet.")
-            return latitude, longitude, altitude, speed_kmh
+            return GpsFix(latitude, longitude, altitude, speed_kmh, time.monotonic(), 0)
         except KeyError:
             print("Fehler: LATITUDE oder LONGITUDE fehlen in der Konfigurationsdatei.")
-            return None, None, None, None
+            return None
 
-    if gps_source == 'usb' or gps_source == 'gpio':
-        ser = serial.Serial(gps_device, baudrate=gps_baudrate, timeout=gps_timeout)
-        latitude = longitude = altitude = speed_kmh = None
-        start_time = time.time()
+    if gps_reader is not None:
+        fix = gps_reader.latest()
+        if fix is None:
+            # Beim Start auf den ersten Fix warten
+            fix = await gps_reader.wait_for_fix(timeout=gps_timeout)
+        # Fixe älter als TIMEOUT gelten als ungültig (Empfang verloren)
+        if fix is not None and fix.age() < gps_timeout:
+            return fix
+        return None
 
-        while time.time() - start_time < gps_timeout:
-            line = ser.readline().decode('ascii', errors='replace').strip()
+    print("Fehler: Ungültige GPS-Quelle.")
+    return None
 
-            if line.startswith('$GPGGA') or line.startswith('$GNGGA'):
-                parts = line.split(',')
-                try:
-                    if parts[2] and parts[4]:
-                        latitude = convert_to_decimal(float(parts[2]), parts[3])
-                        longitude = convert_to_decimal(float(parts[4]), parts[5])
-                    if parts[9]:
-                        altitude = float(parts[9])
-                except (ValueError, IndexError):
-                    continue
-
-            elif line.startswith('$GPRMC') or line.startswith('$GNRMC'):
-                parts = line.split(',')
+async def admit(packet, max_delay=-1):
+    # Ausgangsstufe: False = Paket verwerfen (Duplikat oder Ratenlimit)
+    if outbound is None:
+        return True
+    reason = await outbound.admit(packet, max_delay)
+    if reason is None:
+        return True
+    print(f"Paket verworfen ({reason}): {packet}")
+    return False
+
+async def send_packet(packet, wait=0.0):
+    latency = await aprs_client.send(packet, wait=wait)
+    if latency is None:
+        packets_failed.inc()
+        return None
+    packets_sent.inc()
+    send_latency.observe(latency)
+    if outbound is not None:
+        outbound.sent(packet)
+    return latency
+
+async def send_rf(packet):
+    latency = await kiss_tnc.send(packet)
+    if latency is None:
+        rf_failed.inc()
+        return None
+    rf_sent.inc()
+    rf_latency.observe(latency)
+    print(f"Über KISS-TNC {kiss_tnc.name} auf Funk gesendet ({latency * 1000:.1f} ms)")
+    return latency
+
+async def send_aprs_data(data):
+    # Nur beim Start kurz auf die erste Verbindung warten, bei Ausfall sofort zwischenspeichern
+    wait = aprs_client.timeout if aprs_client.connected_since is None else 0
+    if kiss_mode == 'both':
+        # Beide Wege gleichzeitig
+        latency, rf = await asyncio.gather(send_packet(data, wait=wait), send_rf(data))
+    else:
+        latency = await send_packet(data, wait=wait)
+        rf = await send_rf(data) if kiss_mode == 'fallback' and latency is None else None
+    if latency is not None:
+        print(f"APRS-Daten erfolgreich gesendet ({latency * 1000:.1f} ms): {data}")
+        return True
+    print(f"Fehler beim Senden der APRS-Daten: keine Verbindung zu APRS-IS "
+          f"({', '.join(f'{h}:{p}' for h, p in aprs_client.servers)})")
+    if rf is not None:
+        # Auf Funk gesendet: ein IGate bringt es ins APRS-IS, nicht zwischenspeichern
+        if outbound is not None:
+            outbound.sent(data)
+        return True
+    return False
+
+async def beacon(station, fix):
+    packet = station.build_packet(fix)
+    if not await admit(packet):
+        return
+    if await send_aprs_data(packet):
+        fix_latency.add(time.monotonic() - fix.timestamp)
+        fix_to_packet.observe(fix_latency.last)
+        print(fix_latency.summary())
+    elif beacon_queue is not None:
+        beacon_queue.push(fix, station.call)
+        print(f"Position zwischengespeichert (Warteschlange: {beacon_queue.depth}).")
+
+    print(f"\n--- Neue Messung ({station.call}) ---")
+    print(f"Latitude   : {fix.latitude:.6f}")
+    print(f"Longitude  : {fix.longitude:.6f}")
+    print(f"Altitude   : {fix.altitude:.2f} m")
+    print(f"Speed      : {fix.speed_kmh:.2f} km/h")
+
+async def run_queue_drain():
+    # Zwischengespeicherte Positionen gedrosselt nachsenden, sobald APRS-IS erreichbar ist
+    while True:
+        await asyncio.sleep(beacon_queue.drain_interval)
+        if not beacon_queue.depth:
+            continue
+        if not aprs_client.connected:
+            await aprs_client.wait_connected()
+            continue
+        entry = beacon_queue.peek()
+        if entry is None:
+            beacon_queue.depth = 0
+            continue
+        # Einträge ohne Rufzeichen (ältere Warteschlange) gehören zur eigenen Station
+        if entry.call is None:
+            station = stations[0]
+        else:
+            station = next((st for st in stations if st.call == entry.call), None)
+            if station is None:
+                # Station entfernt oder umbenannt: nicht unter fremdem Rufzeichen senden
+                print(f"Zwischengespeicherte Position von {entry.call} verworfen "
+                      f"(Station nicht mehr konfiguriert).")
+                beacon_queue.discard(entry)
+                continue
+        # Mic-E hat keinen Zeitstempel, nachgesendete Positionen daher komprimiert
+        fmt = 'compressed' if station.packet_format == 'mice' else None
+        packet = station.build_packet(entry, fmt)
+        # Nachgesendete Positionen warten auf einen freien Platz statt verworfen zu werden
+        if not await admit(packet, max_delay=None):
+            beacon_queue.discard(entry)
+            continue
+        if await send_packet(packet) is not None:
+            beacon_queue.remove(entry)
+            s = beacon_queue.stats()
+            print(f"Zwischengespeicherte Position nachgesendet "
+                  f"(noch {s['depth']}, {s['drain_rate_per_min']:.0f}/min).")
+
+async def run_telemetry():
+    # Messwerte im eigenen Takt sammeln, alle INTERVAL Sekunden ein T#-Paket über dieselbe Verbindung
+    next_frame = time.monotonic() + telemetry.interval
+    while True:
+        fix = gps_reader.latest() if gps_reader is not None else None
+        fresh = fix is not None and fix.age() < gps_timeout
+        telemetry.sample(sats=fix.sats if fresh else 0,
+                         fix=fresh or gps_source == 'config',
+                         verified=aprs_client.connected and aprs_client.verified,
+                         reconnects=aprs_client.reconnects,
+                         queued=beacon_queue is not None and beacon_queue.depth > 0)
+
+        now = time.monotonic()
+        if now >= next_frame:
+            next_frame = now + telemetry.interval
+            frame = telemetry.frame()
+            # Ohne Verbindung wird das Paket verworfen, Telemetrie wird nicht zwischengespeichert
+            if aprs_client.connected:
+                if telemetry.definitions_due(now):
+                    for packet in telemetry.definitions():
+                        if not await admit(packet) or await send_packet(packet) is None:
+                            break
+                    else:
+                        telemetry.definitions_sent = now
+                if await admit(frame) and await send_packet(frame) is not None:
+                    print(f"Telemetrie gesendet: {frame}")
+
+        await asyncio.sleep(telemetry.sample_interval)
+
+async def run_receive():
+    # Serverfilter der eigenen Position nachführen
+    while True:
+        if gps_source == 'config':
+            fix = await read_gps_data() if receiver.position is None else None
+        else:
+            fix = await read_gps_data()
+        if fix is not None:
+            rx_filter = receiver.update_position(fix.latitude, fix.longitude)
+            if rx_filter is not None:
+                print(f"Empfangsfilter: {rx_filter}")
                 try:
-                    if parts[3] and parts[5]:
-                        latitude = convert_to_decimal(float(parts[3]), parts[4])
-                        longitude = convert_to_decimal(float(parts[5]), parts[6])
-                    if parts[7]:
-                        speed_knots = float(parts[7])
-                        speed_kmh = speed_knots * 1.852
-                except (ValueError, IndexError):
-                    continue
-
-            if latitude and longitude and altitude is not None and speed_kmh is not None:
-                ser.close()
-                return latitude, longitude, altitude, speed_kmh
-
-        ser.close()
-        return None, None, None, None
+                    await aprs_client.set_filter(rx_filter)
+                except OSError:
+                    pass  # wird beim nächsten Login mitgeschickt
+        await asyncio.sleep(10)
 
-    print("Fehler: Ungültige GPS-Quelle.")
-    return None, None, None, None
+def print_stats():
+    print(fix_latency.summary())
+    if outbound is not None:
+        print(outbound.summary())
+
+def source_label(key):
+    # ('serial', '/dev/ttyS0') -> 'serial:/dev/ttyS0'
+    return ':'.join(str(part) for part in key)
+
+def register_metrics():
+    # Werte anderer Module werden erst beim Abruf gelesen, der Empfangspfad bleibt unberührt
+    def per_source(value, kind=None):
+        return lambda: [({'source': source_label(key)}, value(src)) for key, src in sources.items()
+                        if kind is None or isinstance(src, kind)]
+
+    def nmea_rejected():
+        return [({'source': source_label(key), 'reason': reason}, getattr(src.parser.stats, field))
+                for key, src in sources.items() if isinstance(src, GpsReader)
+                for reason, field in (('checksum', 'checksum_errors'), ('malformed', 'malformed'),
+                                      ('ignored', 'ignored'))]
 
-def send_aprs_data(lat, lon, alt, speed):
-    aprsauth = f"user {user} pass {password}"
-    timestamp = time.strftime("%H%M%Sz", time.gmtime())  # UTC-Zeit z.B. 142530z
-    data = f"{senduser}>APN100,TCPIP*:@{timestamp}{lat}{table}{lon}{symbol}{comment} Alt:{alt:.0f}m Speed:{speed:.0f}km/h"
+    metrics.collect('fix_acquisition_seconds', 'histogram',
+                    'Zeit bis zum gültigen Fix nach Öffnen der Quelle oder Fixverlust',
+                    per_source(lambda src: src.acquisition))
+    metrics.collect('fix_age_seconds', 'gauge', 'Alter des letzten Fixes',
+                    per_source(lambda src: src.latest().age() if src.latest() else None))
+    metrics.collect('nmea_sentences_total', 'counter', 'Gültige NMEA-Sätze',
+                    per_source(lambda src: src.parser.stats.sentences, GpsReader))
+    metrics.collect('nmea_rejected_total', 'counter',
+                    'Verworfene NMEA-Zeilen (checksum = Prüfsummenfehler)', nmea_rejected)
+    metrics.collect('gpsd_reports_total', 'counter', 'TPV/SKY Berichte von gpsd',
+                    per_source(lambda src: src.reports, GpsdClient))
+    if outbound is not None:
+        metrics.collect('packets_suppressed_total', 'counter',
+                        'Von der Ausgangsstufe verworfene Pakete',
+                        lambda: [({'reason': r}, n) for r, n in outbound.stats()['dropped'].items()])
+        metrics.collect('packets_delayed_total', 'counter', 'Wegen Ratenlimit verzögerte Pakete',
+                        lambda: [({'reason': r}, n) for r, n in outbound.stats()['delayed'].items()])
+    metrics.collect('aprsis_connected', 'gauge', 'APRS-IS verbunden (1) oder nicht (0)',
+                    lambda: int(aprs_client.connected))
+    metrics.collect('aprsis_verified', 'gauge', 'Login mit gültigem Passcode',
+                    lambda: int(aprs_client.connected and aprs_client.verified))
+    metrics.collect('aprsis_uptime_seconds', 'gauge', 'Dauer der aktuellen APRS-IS Verbindung',
+                    lambda: time.monotonic() - aprs_client.connected_since
+                    if aprs_client.connected else 0)
+    metrics.collect('aprsis_reconnects_total', 'counter', 'Neue APRS-IS Verbindungen nach der ersten',
+                    lambda: aprs_client.reconnects)
+    metrics.collect('aprsis_logins_total', 'counter', 'Erfolgreiche Logins je Server',
+                    lambda: [({'server': f'{st.host}:{st.port}'}, st.logins)
+                             for st in aprs_client.stats.values()])
+    metrics.collect('aprsis_login_rtt_seconds', 'gauge', 'Verbindungsaufbau bis logresp (gemittelt)',
+                    lambda: [({'server': f'{st.host}:{st.port}'}, st.rtt)
+                             for st in aprs_client.stats.values() if st.rtt is not None])
+    if beacon_queue is not None:
+        metrics.collect('queue_depth', 'gauge', 'Zwischengespeicherte Positionen',
+                        lambda: beacon_queue.depth)
+        metrics.collect('queue_removed_total', 'counter',
+                        'Aus der Warteschlange entfernt (nachgesendet, verdrängt, verworfen)',
+                        lambda: [({'reason': reason}, beacon_queue.stats()[f'{reason}_total'])
+                                 for reason in ('drained', 'evicted', 'discarded')])
+    if track_writer is not None:
+        metrics.collect('track_records_total', 'counter', 'Ins Fahrtenbuch geschriebene Fixe',
+                        lambda: track_writer.records)
+        metrics.collect('track_duplicates_total', 'counter', 'Verworfene Fixe mit doppeltem Zeitstempel',
+                        lambda: track_writer.duplicates)
+        metrics.collect('track_time_jumps_total', 'counter', 'Zeitsprünge zurück (neue Track-Datei begonnen)',
+                        lambda: track_writer.time_jumps)
+    if kiss_tnc is not None:
+        metrics.collect('kiss_connected', 'gauge', 'KISS-TNC verbunden (1) oder nicht (0)',
+                        lambda: int(kiss_tnc.connected))
+        metrics.collect('kiss_frames_received_total', 'counter', 'Vom KISS-TNC gehörte Rahmen',
+                        lambda: kiss_tnc.frames_received)
+    if receiver is not None:
+        metrics.collect('rx_packets_total', 'counter', 'Empfangene APRS-IS Pakete',
+                        lambda: receiver.packets)
+        metrics.collect('rx_stations', 'gauge', 'Bekannte Stationen im Umkreis',
+                        lambda: len(receiver.index))
+    metrics.collect('config_generation', 'gauge', 'Anzahl geladener Konfigurationen',
+                    lambda: config_generation)
+    metrics.collect('process_cpu_seconds_total', 'counter', 'CPU-Zeit des Prozesses',
+                    time.process_time)
 
+def source_key(kind, section):
+    if kind == 'gpsd':
+        return ('gpsd', section.get('GPSD_HOST', '127.0.0.1'), section.getint('GPSD_PORT', 2947))
+    return ('serial', section.get('DEVICE', '/dev/ttyACM0'))
 
+def make_source(kind, key, section):
+    # Nur anlegen, geöffnet wird erst im Task (start_source)
+    if kind == 'gpsd':
+        # Empfänger wird über gpsd mit SVXLink, chrony usw. geteilt
+        return GpsdClient(key[1], key[2])
+    # Schnittstelle bleibt die ganze Laufzeit offen, der Task liefert laufend den letzten Fix
+    return GpsReader(key[1], baudrate=section.getint('BAUDRATE', 9600),
+                     autoconfig=ReceiverConfig.from_config(section))
+
+def start_source(key, source):
+    sources[key] = source
+    source_tasks.append(asyncio.ensure_future(source.run()))
+    if source_added is not None:
+        source_added.set()  # main() nimmt den Task in die Überwachung auf
+
+def open_source(kind, section):
+    # Jede GPS-Quelle (Gerät bzw. gpsd) wird nur einmal geöffnet, auch wenn mehrere
+    # Stationen sie verwenden
+    key = source_key(kind, section)
+    if key not in sources:
+        start_source(key, make_source(kind, key, section))
+    return sources[key]
+
+def primary_station(cfg):
+    # Eigene Station aus [APRS]/[GPS]/[BEACON]
+    fixed = None
+    if gps_source == 'config':
+        try:
+            fixed = (float(cfg['GPS']['LATITUDE']), float(cfg['GPS']['LONGITUDE']))
+        except KeyError:
+            print("Fehler: LATITUDE oder LONGITUDE fehlen in der Konfigurationsdatei.")
+    return build_station('BEACON', cfg['APRS']['MYCALL'], merged_section(cfg, 'BEACON'),
+                         gps_reader, fixed)
+
+def scheduled_stations(cfg, all_stations):
+    # ENABLED=false: nur weitere Stationen bzw. Empfang, kein eigenes Beacon
+    if cfg['BEACON'].getboolean('ENABLED', True):
+        return all_stations
+    return all_stations[1:]
+
+def config_mtime():
     try:
-        process = subprocess.run(
-            ['ncat', '--send-only', server, str(port)],
-            input=f"{aprsauth}\n{data}\n",
-            text=True,
-            capture_output=True,
-            check=True
-        )
-        print(f"APRS-Daten erfolgreich gesendet: {data}")
-    except subprocess.CalledProcessError as e:
-        print(f"Fehler beim Senden der APRS-Daten: {e}")
-        print(f"Fehlerdetails: {e.stderr}")
-
-# Hauptschleife
-last_lat, last_lon = None, None
-
-while True:
-    lat, lon, alt, speed = read_gps_data()
-
-    if lat is not None:
-        lat_ddmm = f"{int(abs(lat)):02d}{(abs(lat) % 1) * 60:05.2f}{'N' if lat >= 0 else 'S'}"
-        lon_ddmm = f"{int(abs(lon)):03d}{(abs(lon) % 1) * 60:05.2f}{'E' if lon >= 0 else 'W'}"
-
-        if not send_on_move_only or lat != last_lat or lon != last_lon:
-            send_aprs_data(lat_ddmm, lon_ddmm, alt, speed)
-            last_lat, last_lon = lat, lon
-
-            print(f"\n--- Neue Messung ---")
-            print(f"Latitude   : {lat_ddmm}")
-            print(f"Longitude  : {lon_ddmm}")
-            print(f"Altitude   : {alt:.2f} m")
-            print(f"Speed      : {speed:.2f} km/h")
+        return os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def _section(cfg, name):
+    return dict(cfg[name]) if cfg.has_section(name) else None
+
+def reload_config():
+    # Neue Datei erst vollständig prüfen, dann nur die geänderten Teile übernehmen.
+    # Die APRS-IS Verbindung und offene GPS-Quellen bleiben bestehen.
+    global config, senduser, gps_timeout, config_generation, loaded_mtime
+    loaded_mtime = config_mtime()
+    new = configparser.ConfigParser()
+    new_sources = {}  # neue Quellen werden erst geöffnet, wenn die ganze Datei gültig ist
+
+    def prepare_source(kind, section):
+        key = source_key(kind, section)
+        if key in sources:
+            return sources[key]
+        if key not in new_sources:
+            new_sources[key] = make_source(kind, key, section)
+        return new_sources[key]
+
+    try:
+        if not new.read(CONFIG_FILE):
+            raise OSError(f"{CONFIG_FILE} nicht lesbar")
+        settings = aprs_settings(new)
+        new_stations = [primary_station(new)] + load_stations(new, prepare_source)
+        new_timeout = int(new['GPS'].get('TIMEOUT', 10))
+        scheduled_stations(new, new_stations)  # [BEACON] ENABLED prüfen
+        new_telemetry = (Telemetry.from_config(settings['user'], new['TELEMETRY'])
+                         if telemetry is not None and new.has_section('TELEMETRY') else None)
+    except (OSError, KeyError, ValueError, configparser.Error) as e:
+        print(f"Fehler: Konfiguration nicht übernommen, alte bleibt aktiv: {e!r}")
+        return
+
+    changed = [name for name in dict.fromkeys(config.sections() + new.sections())
+               if _section(config, name) != _section(new, name)]
+    if not changed:
+        print("Konfiguration unverändert.")
+        return
+
+    restart = [name for name in changed if name in RESTART_SECTIONS]
+    old_gps, new_gps = _section(config, 'GPS') or {}, _section(new, 'GPS') or {}
+    if any(old_gps.get(k) != new_gps.get(k) for k in set(old_gps) | set(new_gps)
+           if k not in GPS_RELOAD_KEYS):
+        restart.append('GPS')
+    if telemetry is not None and new_telemetry is None:
+        restart.append('TELEMETRY')
+
+    for key, source in new_sources.items():
+        start_source(key, source)
+
+    if aprs_client.reconfigure(**settings):
+        print(f"APRS-IS: neue Anmeldung als {settings['user']}")
+    senduser = settings['user']
+    gps_timeout = new_timeout
+
+    # Bestehende Stationen (gleiches Rufzeichen) behalten ihren Zustand und Zeitplan
+    old = {station.call: station for station in stations}
+    merged = []
+    for station in new_stations:
+        if station.call in old:
+            old[station.call].update_from(station)
+            station = old[station.call]
+        merged.append(station)
+    stations[:] = merged
+    scheduler.update(scheduled_stations(new, stations))
+
+    if new_telemetry is not None:
+        telemetry.call = new_telemetry.call
+        telemetry.sample_interval = new_telemetry.sample_interval
+        telemetry.interval = new_telemetry.interval
+        telemetry.definition_interval = new_telemetry.definition_interval
+        if telemetry.title != new_telemetry.title:
+            telemetry.title = new_telemetry.title
+            telemetry.definitions_sent = None
+
+    config = new
+    config_generation += 1
+    print(f"Konfiguration neu geladen (Generation {config_generation}): {', '.join(changed)}")
+    if restart:
+        print(f"Änderungen in {', '.join(restart)} gelten erst nach einem Neustart.")
+
+async def run_config_watch(interval):
+    # Datei auf Änderungen prüfen (z.B. vom Dashboard geschrieben). Neu geladen wird erst,
+    # wenn sie eine Prüfung lang unverändert ist, damit keine halb geschriebene Datei gilt.
+    seen = loaded_mtime
+    while True:
+        await asyncio.sleep(interval)
+        current = config_mtime()
+        if current != seen:
+            seen = current
+        elif current != loaded_mtime and current is not None:
+            reload_config()
+
+async def main():
+    global gps_reader, aprs_client, kiss_tnc, fix_publisher, scheduler, loaded_mtime
+    global source_added
+
+    aprs_client = AprsIsClient(aprs['servers'], aprs['user'], aprs['password'],
+                               keepalive=aprs['keepalive'], dns_ttl=aprs['dns_ttl'],
+                               reprobe_interval=aprs['reprobe_interval'])
+    tasks = [asyncio.ensure_future(aprs_client.run())]
+    if kiss_mode is not None:
+        kiss_tnc = KissTnc.from_config(config['KISS'])
+        tasks.append(asyncio.ensure_future(kiss_tnc.run()))
+
+    if gps_source in ('usb', 'gpio', 'gpsd'):
+        gps_reader = open_source(gps_source, config['GPS'])
+    elif gps_source != 'config':
+        print("Fehler: Ungültige GPS-Quelle.")
+    if gps_reader is not None:
+        if track_writer is not None:
+            gps_reader.listeners.append(track_writer.add)
+    elif track_writer is not None:
+        print("Fahrtenbuch benötigt gps_source=usb, gpio oder gpsd.")
+
+    if fix_shm_path:
+        try:
+            fix_publisher = FixPublisher(fix_shm_path)
+        except OSError as e:
+            print(f"Fehler: Fix kann nicht in {fix_shm_path} bereitgestellt werden: {e}")
         else:
-            print("Keine Änderung der GPS-Daten (Lat/Lon), keine Daten gesendet.")
-    else:
-        print("\nKeine gültigen GPS-Daten empfangen.")
+            if gps_reader is not None:
+                gps_reader.listeners.append(fix_publisher.publish)
+            elif gps_source == 'config':
+                fix = await read_gps_data()
+                if fix is not None:
+                    # Feste Position einmal veröffentlichen (Fix-Nummer 0 bedeutet "kein Fix")
+                    fix_publisher.publish(GpsFix(fix.latitude, fix.longitude, fix.altitude,
+                                                 fix.speed_kmh, fix.timestamp, 1))
+
+    if config['BEACON'].getboolean('SMARTBEACON', False) and gps_reader is None:
+        print("SmartBeacon benötigt gps_source=usb, gpio oder gpsd, verwende SEND_INTERVAL.")
+    # Weitere Stationen ([STATION:<call>]) laufen über dieselbe APRS-IS Verbindung
+    stations[:] = [primary_station(config)] + load_stations(config, open_source)
+    for station in stations[1:]:
+        print(f"Station {station.call}: "
+              f"{'SmartBeacon' if station.smartbeacon else f'alle {station.send_interval} s'}")
+    scheduler = BeaconScheduler(scheduled_stations(config, stations), beacon)
+    tasks.append(asyncio.ensure_future(scheduler.run()))
+
+    if beacon_queue is not None:
+        tasks.append(asyncio.ensure_future(run_queue_drain()))
+
+    if telemetry is not None:
+        tasks.append(asyncio.ensure_future(run_telemetry()))
+
+    if receiver is not None:
+        aprs_client.listeners.append(receiver.handle_line)
+        tasks.append(asyncio.ensure_future(run_receive()))
+        if query_socket:
+            tasks.append(asyncio.ensure_future(receiver.serve(query_socket)))
+
+    register_metrics()
+    if metrics_http is not None:
+        tasks.append(asyncio.ensure_future(metrics.serve_http(*metrics_http)))
+    if metrics_socket:
+        tasks.append(asyncio.ensure_future(metrics.serve_unix(metrics_socket)))
+
+    # Konfiguration neu laden: SIGHUP oder Änderung der Datei (RELOAD WATCH)
+    loaded_mtime = config_mtime()
+    if config.has_section('RELOAD') and config['RELOAD'].getboolean('WATCH', False):
+        tasks.append(asyncio.ensure_future(
+            run_config_watch(config['RELOAD'].getfloat('INTERVAL', 2))))
+
+    # SIGTERM (systemd) und SIGINT beenden sauber, SIGUSR1 gibt die Latenz- und Ausgangsstatistik aus
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    loop.add_signal_handler(signal.SIGUSR1, print_stats)
+    loop.add_signal_handler(signal.SIGHUP, reload_config)
+
+    stopped = asyncio.ensure_future(stop.wait())
+    source_added = asyncio.Event()
+    while True:
+        # Beim Neuladen geöffnete Quellen kommen mit in die Überwachung
+        source_added.clear()
+        added = asyncio.ensure_future(source_added.wait())
+        done, _ = await asyncio.wait(tasks + source_tasks + [stopped, added],
+                                     return_when=asyncio.FIRST_COMPLETED)
+        done.discard(added)
+        if done:
+            break
+    added.cancel()
+    for task in done:
+        if task is not stopped and task.exception() is not None:
+            print(f"Fehler: Task beendet: {task.exception()!r}")
+
+    print("Beende shari_aprs ...")
+    tasks += source_tasks  # auch Quellen, die erst beim Neuladen geöffnet wurden
+    for task in tasks + [stopped]:
+        task.cancel()
+    await asyncio.gather(*tasks, stopped, return_exceptions=True)
+    aprs_client.close()
+    if kiss_tnc is not None:
+        kiss_tnc.close()
+    if fix_publisher is not None:
+        fix_publisher.close()
+    if outbound is not None:
+        outbound.close()
+    if beacon_queue is not None:
+        beacon_queue.close()
+    if track_writer is not None:
+        track_writer.close()
+    print_stats()
 
-    time.sleep(send_interval)
+# Hauptprogramm
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+# smartbeacon.py
+# Autor: OE9SAU
+# Beschreibung: SmartBeaconing (Beacon-Rate abhängig von Geschwindigkeit und Kursänderung)
+# Version: 1.0
+
+import math
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    # Haversine, Entfernung in Metern
+    r = 6371000.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+def heading_change(a, b):
+    d = abs(a - b) % 360
+    return 360 - d if d > 180 else d
+
+
+class SmartBeacon:
+    # Geschwindigkeiten in km/h, Zeiten in Sekunden, Winkel in Grad
+    def __init__(self, fast_rate=60, slow_rate=1800, fast_speed=90, slow_speed=5,
+                 min_turn_angle=28, turn_slope=240, min_turn_time=30):
+        self.fast_rate = fast_rate
+        self.slow_rate = slow_rate
+        self.fast_speed = fast_speed
+        self.slow_speed = slow_speed
+        self.min_turn_angle = min_turn_angle
+        self.turn_slope = turn_slope
+        self.min_turn_time = min_turn_time
+
+        self.last_time = None
+        self.last_course = None
+
+    @classmethod
+    def from_config(cls, section):
+        return cls(
+            fast_rate=section.getint('FAST_RATE', 60),
+            slow_rate=section.getint('SLOW_RATE', 1800),
+            fast_speed=section.getfloat('FAST_SPEED', 90),
+            slow_speed=section.getfloat('SLOW_SPEED', 5),
+            min_turn_angle=section.getfloat('MIN_TURN_ANGLE', 28),
+            turn_slope=section.getfloat('TURN_SLOPE', 240),
+            min_turn_time=section.getint('MIN_TURN_TIME', 30),
+        )
+
+    def rate(self, speed_kmh):
+        if speed_kmh < self.slow_speed:
+            return self.slow_rate
+        if speed_kmh >= self.fast_speed:
+            return self.fast_rate
+        return self.fast_rate * self.fast_speed / speed_kmh
+
+    def check(self, speed_kmh, course, now):
+        # Liefert den Grund für ein Beacon ("start", "rate", "turn") oder None
+        if self.last_time is None:
+            return "start"
+        elapsed = now - self.last_time
+
+        if speed_kmh >= self.slow_speed and course is not None and self.last_course is not None:
+            threshold = self.min_turn_angle + self.turn_slope / speed_kmh
+            if (heading_change(course, self.last_course) > threshold
+                    and elapsed >= self.min_turn_time):
+                return "turn"
+
+        if elapsed >= self.rate(speed_kmh):
+            return "rate"
+        return None
+
+    def sent(self, course, now):
+        self.last_time = now
+        if course is not None:
+            self.last_course = course
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# stations.py
+# Autor: OE9SAU
+# Beschreibung: Mehrere Stationen (Rufzeichen, GPS-Quelle, Beacon-Regeln) in einem Prozess
+#               über eine gemeinsame APRS-IS Verbindung. Ein Zeitplan (Heap) für alle
+#               Stationen, gleiche GPS-Quellen werden nur einmal geöffnet.
+# Version: 1.1
+#
+# Benchmark:  python3 stations.py --bench 100
+
+import asyncio
+import configparser
+import heapq
+import math
+import time
+
+from aprs_packet import FORMATS, MICE_MESSAGES, PacketTemplate
+from gps_reader import GpsFix
+from smartbeacon import SmartBeacon, distance_m
+
+SECTION_PREFIX = "STATION:"
+
+
+class BeaconStation:
+    # Werte aus der Konfiguration, werden beim Neuladen übernommen (update_from)
+    CONFIG_ATTRS = ("table", "symbol", "comment", "packet_format", "compressed_ext",
+                    "mice_message", "source", "fixed", "send_interval", "send_on_move_only",
+                    "min_move_distance", "gps_timeout", "template")
+
+    def __init__(self, call, table, symbol, comment, packet_format="uncompressed",
+                 compressed_ext="course", mice_message="en_route", source=None, fixed=None,
+                 send_interval=300, send_on_move_only=False, min_move_distance=50,
+                 smartbeacon=None, gps_timeout=10):
+        self.call = call
+        self.table = table
+        self.symbol = symbol
+        self.comment = comment
+        self.packet_format = packet_format
+        self.compressed_ext = compressed_ext
+        self.mice_message = mice_message
+        self.source = source  # FixSource oder None
+        self.fixed = fixed  # (lat, lon) bei fester Position
+        self.send_interval = send_interval
+        self.send_on_move_only = send_on_move_only
+        self.min_move_distance = min_move_distance
+        self.smartbeacon = smartbeacon
+        self.gps_timeout = gps_timeout
+        # Statischer Teil der Pakete, einmal je Konfiguration
+        self.template = PacketTemplate(packet_format, call, table, symbol, comment,
+                                       compressed_ext=compressed_ext, mice_message=mice_message)
+
+        self.beacons = 0
+        self.lost = False  # GPS-Verlust bereits gemeldet
+        self.next_due = None  # time.monotonic() der nächsten Intervall-Prüfung
+        self._last_pos = None
+
+    def build_packet(self, fix, fmt=None):
+        return self.template.build(fix.latitude, fix.longitude, fix.altitude, fix.speed_kmh,
+                                   fix.course, fix.utc, fmt)
+
+    def update_from(self, other):
+        # Neue Konfiguration übernehmen, letzte Position und SmartBeacon-Zustand bleiben
+        for name in self.CONFIG_ATTRS:
+            setattr(self, name, getattr(other, name))
+        if other.smartbeacon is not None and self.smartbeacon is not None:
+            other.smartbeacon.last_time = self.smartbeacon.last_time
+            other.smartbeacon.last_course = self.smartbeacon.last_course
+        self.smartbeacon = other.smartbeacon
+
+    def current_fix(self):
+        if self.fixed is not None:
+            return GpsFix(self.fixed[0], self.fixed[1], 0.0, 0.0, time.monotonic(), 0)
+        fix = self.source.latest() if self.source is not None else None
+        # Fixe älter als TIMEOUT gelten als ungültig (Empfang verloren)
+        if fix is not None and fix.age() < self.gps_timeout:
+            return fix
+        return None
+
+    def moved(self, fix):
+        return (self._last_pos is None
+                or distance_m(fix.latitude, fix.longitude, *self._last_pos) >= self.min_move_distance)
+
+    def sent(self, fix, now):
+        self.beacons += 1
+        self._last_pos = (fix.latitude, fix.longitude)
+        if self.smartbeacon is not None:
+            self.smartbeacon.sent(fix.course, now)
+
+
+class BeaconScheduler:
+    # Intervall-Stationen liegen in einem Heap nach Fälligkeit, SmartBeacon-Stationen werden
+    # von ihrer GPS-Quelle bei jedem Fix geprüft. Ein Task für alle Stationen.
+    def __init__(self, stations, beacon):
+        self.stations = stations
+        self.beacon = beacon  # async fn(station, fix)
+        self._heap = []
+        self._count = 0
+        self._wake = None
+        self._smart = {}  # id(FixSource) -> SmartBeacon-Stationen dieser Quelle
+        self._listening = set()  # id(FixSource) mit eingetragenem Listener
+        self._pending = {}  # id(Station) -> neuester Fix, höchstens ein SmartBeacon-Eintrag
+
+    def _push(self, due, station, fix=None):
+        self._count += 1
+        heapq.heappush(self._heap, (due, self._count, station, fix))
+
+    def _on_fix(self, source, fix):
+        now = time.monotonic()
+        for station in self._smart.get(id(source), ()):
+            if station.smartbeacon.check(fix.speed_kmh, fix.course, now) is not None:
+                # Solange ein Eintrag wartet oder gesendet wird, nur dessen Fix erneuern
+                if id(station) not in self._pending:
+                    self._push(0.0, station, fix)
+                    self._wake.set()
+                self._pending[id(station)] = fix
+
+    def _schedule(self, now):
+        # Heap aus der aktuellen Stationsliste aufbauen, bereits fällige SmartBeacon-Fixe bleiben
+        active = {id(station) for station in self.stations}
+        self._heap = [e for e in self._heap if e[3] is not None and id(e[2]) in active]
+        heapq.heapify(self._heap)
+        self._pending = {key: fix for key, fix in self._pending.items() if key in active}
+        self._smart = {}
+        for station in self.stations:
+            source = station.source
+            if station.smartbeacon is not None and source is not None:
+                self._smart.setdefault(id(source), []).append(station)
+                if id(source) not in self._listening:
+                    self._listening.add(id(source))
+                    source.listeners.append(lambda fix, src=source: self._on_fix(src, fix))
+                continue
+            if station.next_due is None:
+                station.next_due = now
+            else:
+                # Kürzeres SEND_INTERVAL gilt sofort
+                station.next_due = min(station.next_due, now + station.send_interval)
+            self._push(station.next_due, station)
+
+    def update(self, stations):
+        # Neue Stationsliste nach dem Neuladen der Konfiguration
+        self.stations = stations
+        if self._wake is not None:
+            self._schedule(time.monotonic())
+            self._wake.set()
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        self._schedule(time.monotonic())
+
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, station, fix = heapq.heappop(self._heap)
+                if fix is not None:
+                    # SmartBeacon: Grund wurde schon beim Fix geprüft, gesendet wird der neueste
+                    # Fix; was während des Sendens eintrifft, ist mit diesem Paket erledigt
+                    fix = self._pending.get(id(station), fix)
+                    try:
+                        await self.beacon(station, fix)
+                        station.sent(fix, time.monotonic())
+                    finally:
+                        self._pending.pop(id(station), None)
+                    continue
+                if due != station.next_due:
+                    continue  # durch update() ersetzter Eintrag
+                station.next_due = now + await self._interval(station)
+                self._push(station.next_due, station)
+
+            self._wake.clear()
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _interval(self, station):
+        # Liefert die Pause bis zur nächsten Prüfung
+        fix = station.current_fix()
+        if fix is None:
+            if not station.lost:
+                print(f"{station.call}: Keine gültigen GPS-Daten empfangen.")
+            station.lost = True
+            if station.source is not None and station.source.latest() is None:
+                # Beim Start: auf den ersten Fix nicht ein ganzes Intervall warten
+                return min(station.gps_timeout, station.send_interval)
+            return station.send_interval
+        station.lost = False
+        if station.send_on_move_only and not station.moved(fix):
+            return station.send_interval
+        await self.beacon(station, fix)
+        station.sent(fix, time.monotonic())
+        return station.send_interval
+
+
+def station_sections(config):
+    return [name for name in config.sections() if name.upper().startswith(SECTION_PREFIX)]
+
+
+def merged_section(config, name):
+    # Was im Abschnitt fehlt, kommt aus [APRS] und [BEACON], TIMEOUT aus [GPS]
+    values = {}
+    for base in ('APRS', 'BEACON'):
+        if config.has_section(base):
+            values.update(config[base])
+    if config.has_section('GPS') and 'timeout' in config['GPS']:
+        values['timeout'] = config['GPS']['timeout']
+    values.update(config[name])
+    merged = configparser.ConfigParser(interpolation=None)
+    merged.read_dict({name: values})
+    return merged[name]
+
+
+def build_station(name, call, sec, source=None, fixed=None):
+    # sec: zusammengeführter Abschnitt (merged_section), wirft KeyError/ValueError bei ungültigen Werten
+    packet_format = sec.get('FORMAT', 'uncompressed').lower()
+    if packet_format not in FORMATS:
+        print(f"Fehler: {name}: Unbekanntes FORMAT '{packet_format}', verwende uncompressed.")
+        packet_format = 'uncompressed'
+    mice_message = sec.get('MICE_MESSAGE', 'en_route').lower()
+    if mice_message not in MICE_MESSAGES:
+        print(f"Fehler: {name}: Unbekannte MICE_MESSAGE '{mice_message}', verwende en_route.")
+        mice_message = 'en_route'
+
+    smartbeacon = None
+    if sec.getboolean('SMARTBEACON', False) and source is not None:
+        smartbeacon = SmartBeacon.from_config(sec)
+    return BeaconStation(
+        call,
+        sec['SYMBOL_TABLE'],
+        sec['SYMBOL'],
+        sec.get('COMMENT', ''),
+        packet_format=packet_format,
+        compressed_ext=sec.get('COMPRESSED_EXT', 'course').lower(),
+        mice_message=mice_message,
+        source=source,
+        fixed=fixed,
+        send_interval=sec.getint('SEND_INTERVAL', 300),
+        send_on_move_only=sec.getboolean('SEND_ON_MOVE_ONLY', False),
+        min_move_distance=sec.getfloat('MIN_MOVE_DISTANCE', 50),
+        smartbeacon=smartbeacon,
+        gps_timeout=sec.getint('TIMEOUT', 10),
+    )
+
+
+def load_stations(config, open_source):
+    # [STATION:<call>]-Abschnitte, open_source(kind, section) liefert eine gemeinsame
+    # FixSource je Gerät bzw. gpsd
+    stations = []
+    for name in station_sections(config):
+        sec = merged_section(config, name)
+        call = name[len(SECTION_PREFIX):].strip().upper()
+        source_kind = sec.get('SOURCE', 'config').lower()
+
+        source = fixed = None
+        if source_kind == 'config':
+            try:
+                fixed = (float(sec['LATITUDE']), float(sec['LONGITUDE']))
+            except KeyError:
+                print(f"Fehler: {name}: LATITUDE oder LONGITUDE fehlen, Station wird ignoriert.")
+                continue
+        elif source_kind in ('usb', 'gpio', 'gpsd'):
+            source = open_source(source_kind, config[name])
+        else:
+            print(f"Fehler: {name}: Unbekannte SOURCE '{source_kind}', Station wird ignoriert.")
+            continue
+        stations.append(build_station(name, call, sec, source, fixed))
+    return stations
+
+
+def _bench(counts=(1, 10, 100), seconds=10.0):
+    import gc
+    import tracemalloc
+
+    from aprs_is import AprsIsClient
+    from fake_aprsis import FakeAprsIsServer, aprs_passcode
+    from gps_reader import FixSource
+
+    class SimSource(FixSource):
+        # Kreisfahrt mit 1 Hz, wie nmea_sim/fake_gpsd, aber ohne pty
+        def __init__(self, phase):
+            super().__init__()
+            self.phase = phase
+
+        async def run(self):
+            t = 0
+            while True:
+                angle = 2 * math.pi * ((t + self.phase) % 120) / 120
+                self._publish(GpsFix(47.25 + 0.0045 * math.cos(angle),
+                                     9.6 + 0.0066 * math.sin(angle), 450.0, 94.0,
+                                     time.monotonic(), self.next_seq(),
+                                     course=(math.degrees(angle) + 90) % 360, sats=8,
+                                     utc=time.time()))
+                t += 1
+                await asyncio.sleep(1)
+
+    async def run(n):
+        srv = FakeAprsIsServer().start()
+        client = AprsIsClient([("127.0.0.1", srv.port)], "N0CALL", aprs_passcode("N0CALL"),
+                              keepalive=60)
+        # Je 10 Stationen teilen sich eine GPS-Quelle (wie mehrere Rufzeichen an einem gpsd)
+        sources = [SimSource(i * 7) for i in range((n + 9) // 10)]
+        stations = []
+        for i in range(n):
+            if i % 2:
+                sb = SmartBeacon(fast_rate=2, slow_rate=10, min_turn_time=1)
+                stations.append(BeaconStation(f"N0S{i:03d}", "/", ">", "Bench",
+                                              source=sources[i // 10], smartbeacon=sb))
+            else:
+                stations.append(BeaconStation(f"N0F{i:03d}", "/", "-", "Bench",
+                                              fixed=(47.0 + i * 0.001, 9.5), send_interval=2))
+
+        async def beacon(station, fix):
+            await client.send(station.build_packet(fix))
+
+        tasks = [asyncio.ensure_future(client.run())]
+        await client.wait_connected(5)
+        tasks += [asyncio.ensure_future(s.run()) for s in sources]
+        gc.collect()
+        tracemalloc.start()
+        mem0 = tracemalloc.get_traced_memory()[0]
+        cpu0 = time.process_time()
+        tasks.append(asyncio.ensure_future(BeaconScheduler(stations, beacon).run()))
+        await asyncio.sleep(seconds)
+        cpu = time.process_time() - cpu0
+        mem = tracemalloc.get_traced_memory()[0] - mem0
+        tracemalloc.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        client.close()
+        await asyncio.sleep(0.1)
+        srv.stop()
+        beacons = sum(s.beacons for s in stations)
+        print(f"{n:4d} Stationen ({len(sources)} GPS-Quellen): {beacons} Pakete in {seconds:.0f}s, "
+              f"{len(srv.packets)} beim Server, {len(srv.logins)} Login, "
+              f"CPU {cpu * 1000:.0f} ms = {cpu / max(beacons, 1) * 1e6:.0f} µs/Paket, "
+              f"Speicher {mem / 1024:.0f} KB")
+
+    for n in counts:
+        asyncio.run(run(n))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Mehrere Stationen in einem Prozess")
+    ap.add_argument("--bench", type=int, metavar="N", help="N simulierte Stationen messen")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    args = ap.parse_args()
+    if args.bench:
+        _bench(sorted({1, 10, args.bench}), args.seconds)
+    else:
+        ap.print_help()
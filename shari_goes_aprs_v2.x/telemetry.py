@@ -0,0 +1,145 @@
+# telemetry.py
+# Autor: OE9SAU
+# Beschreibung: APRS-Telemetrie (T#, PARM/UNIT/EQNS/BITS) mit dem Zustand des Knotens:
+#               Last, CPU-Temperatur, RAM, SD-Karte, Satelliten, APRS-IS Zustand
+# Version: 1.0
+#
+# Die Messwerte kommen aus denselben Quellen wie in RPI_Status_OLED/oled_sh1106.py,
+# hier aber als Zahlen (das OLED-Skript liefert Anzeigetexte und braucht luma).
+
+import shutil
+
+from aprs_packet import PATH, TOCALL
+
+# Analogkanäle: Name (max. 7/7/6/6/5 Zeichen), Einheit, Faktor b aus EQNS (Wert = Rohwert * b)
+ANALOG = (
+    ("Load", "load", 0.02),  # 0 .. 5.1
+    ("Temp", "degC", 0.5),  # 0 .. 127.5 °C
+    ("RAM", "%", 0.5),
+    ("Disk", "%", 0.5),
+    ("Sats", "sats", 1),
+)
+# Digitalkanäle: Name (max. 6/5/4/4 Zeichen), Einheit
+BITS = (
+    ("Fix", "ok"),  # gültiger GPS-Fix
+    ("Verif", "ok"),  # APRS-IS Login verifiziert
+    ("Recn", "yes"),  # APRS-IS Reconnect seit dem letzten Telemetrie-Paket
+    ("Buf", "yes"),  # Positionen in der Warteschlange
+)
+
+
+def load1():
+    try:
+        with open("/proc/loadavg", "r", encoding="utf-8") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def cpu_temp_c():
+    try:
+        with open("/sys/class/thermal/thermal_zone0/temp", "r", encoding="utf-8") as f:
+            return int(f.read()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+def mem_percent():
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            info = {l.split(":")[0]: int(l.split()[1]) for l in f}
+        return (info["MemTotal"] - info["MemAvailable"]) * 100.0 / info["MemTotal"]
+    except (OSError, ValueError, KeyError, IndexError, ZeroDivisionError):
+        return None
+
+
+def disk_percent(path="/"):
+    try:
+        du = shutil.disk_usage(path)
+    except OSError:
+        return None
+    return du.used * 100.0 / du.total if du.total else None
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+class Telemetry:
+    def __init__(self, call, sample_interval=60, interval=600, definition_interval=21600,
+                 title="SHARI Node"):
+        self.call = call
+        self.sample_interval = sample_interval
+        self.interval = interval
+        self.definition_interval = definition_interval
+        self.title = title
+
+        self.seq = 0
+        self.sent = 0
+        self._samples = []  # (load, temp, ram, disk, sats)
+        self._fix = self._verified = self._queued = False
+        self._reconnects_sent = 0
+        self._reconnects = 0
+        self.definitions_sent = None  # time.monotonic() der letzten PARM/UNIT/EQNS/BITS
+
+    @classmethod
+    def from_config(cls, call, section):
+        return cls(
+            call,
+            sample_interval=section.getint('SAMPLE_INTERVAL', 60),
+            interval=section.getint('INTERVAL', 600),
+            definition_interval=section.getint('DEFINITION_INTERVAL', 21600),
+            title=section.get('TITLE', 'SHARI Node'),
+        )
+
+    def sample(self, sats=None, fix=False, verified=False, reconnects=0, queued=False):
+        # Systemwerte lesen und für das nächste Paket sammeln
+        self._samples.append((load1(), cpu_temp_c(), mem_percent(), disk_percent(), sats))
+        self._fix = fix
+        self._verified = verified
+        self._reconnects = reconnects
+        self._queued = queued
+
+    def definitions_due(self, now):
+        return (self.definitions_sent is None
+                or now - self.definitions_sent >= self.definition_interval)
+
+    def _message(self, text):
+        # Telemetrie-Definitionen sind Nachrichten an das eigene Rufzeichen
+        return f"{self.call}>{TOCALL},{PATH}::{self.call:<9}:{text}"
+
+    def definitions(self):
+        names = [n for n, _, _ in ANALOG] + [n for n, _ in BITS]
+        units = [u for _, u, _ in ANALOG] + [u for _, u in BITS]
+        eqns = ",".join(f"0,{b:g},0" for _, _, b in ANALOG)
+        sense = "1" * len(BITS) + "0" * (8 - len(BITS))
+        return [
+            self._message("PARM." + ",".join(names)),
+            self._message("UNIT." + ",".join(units)),
+            self._message("EQNS." + eqns),
+            self._message(f"BITS.{sense},{self.title}"),
+        ]
+
+    def frame(self):
+        # Mittelwerte (Last, Temperatur, RAM) bzw. letzter Wert (Disk, Satelliten) der Messungen
+        samples, self._samples = self._samples, []
+        if not samples:
+            return None
+        columns = list(zip(*samples))
+        values = [_mean(columns[0]), _mean(columns[1]), _mean(columns[2]),
+                  next((v for v in reversed(columns[3]) if v is not None), None),
+                  next((v for v in reversed(columns[4]) if v is not None), None)]
+        raw = [min(255, max(0, int(round(v / b)))) if v is not None else 0
+               for v, (_, _, b) in zip(values, ANALOG)]
+
+        reconnected = self._reconnects > self._reconnects_sent
+        self._reconnects_sent = self._reconnects
+        bits = (self._fix, self._verified, reconnected, self._queued)
+        bits = "".join("1" if b else "0" for b in bits).ljust(8, "0")
+
+        packet = (f"{self.call}>{TOCALL},{PATH}:T#{self.seq:03d},"
+                  + ",".join(f"{r:03d}" for r in raw) + f",{bits}")
+        self.seq = (self.seq + 1) % 1000
+        self.sent += 1
+        return packet
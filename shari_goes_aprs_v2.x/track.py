@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# track.py
+# Autor: OE9SAU
+# Beschreibung: Fahrtenbuch im Binärformat (feste 32-Byte-Datensätze, nur Anhängen,
+#               Rotation nach Dateigröße) und Export nach GPX/KML
+# Version: 1.1
+#
+# Export:     python3 track.py export --dir tracks --from "2024-05-01 08:00" --to "2024-05-01 18:00" -o fahrt.gpx
+# Übersicht:  python3 track.py info --dir tracks
+# Benchmark:  python3 track.py bench --days 3
+
+import argparse
+import bisect
+import calendar
+import heapq
+import math
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"SHTRK\x01"
+HEADER = struct.Struct("<6sHH6x")  # Kennung, Version, Datensatzgröße
+# UTC, Lat/Lon in 1e-7 Grad, Höhe m, Geschwindigkeit km/h, Kurs (NaN = unbekannt),
+# Satelliten, Fix-Qualität, HDOP * 100
+RECORD = struct.Struct("<diifffBBH")
+VERSION = 1
+SCALE = 1e7
+
+
+class TrackWriter:
+    def __init__(self, directory, max_file_size=4 * 1024 * 1024, max_files=50,
+                 flush_interval=10.0):
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.rotations = 0
+        self.duplicates = 0
+        self.time_jumps = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._file = None
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._last_utc = None
+
+    def _open(self, utc, new=False):
+        # new: nie an eine bestehende Datei anhängen (nach einem Zeitsprung könnte sie jüngere Datensätze enthalten)
+        base = time.strftime("track_%Y%m%d_%H%M%S", time.gmtime(utc))
+        path = os.path.join(self.directory, base + ".trk")
+        n = 0
+        while os.path.exists(path) and (new or os.path.getsize(path) + RECORD.size > self.max_file_size):
+            n += 1
+            path = os.path.join(self.directory, f"{base}_{n}.trk")
+        # Großer Puffer: die SD-Karte sieht nur alle flush_interval Sekunden einen Schreibzugriff
+        self._file = open(path, "ab", buffering=64 * 1024)
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self._size = HEADER.size
+        self._prune()
+
+    def _prune(self):
+        files = track_files(self.directory)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def add(self, fix):
+        utc = fix.utc if fix.utc is not None else time.time()
+        jump = False
+        if self._last_utc is not None and utc <= self._last_utc:
+            if utc == self._last_utc:
+                # Derselbe Fix doppelt geliefert
+                self.duplicates += 1
+                return
+            # Zeitsprung zurück (Empfängerfehler, Uhr korrigiert): neue Datei beginnen,
+            # damit jede Datei zeitlich sortiert bleibt (Voraussetzung für die Binärsuche)
+            self.time_jumps += 1
+            jump = True
+        self._last_utc = utc
+
+        if self._file is None or jump or self._size + RECORD.size > self.max_file_size:
+            if self._file is not None:
+                self._file.close()
+                self.rotations += 1
+            self._open(utc, new=jump)
+
+        course = fix.course if fix.course is not None else math.nan
+        hdop = int(min(fix.hdop * 100, 65535)) if fix.hdop is not None else 0
+        self._file.write(RECORD.pack(
+            utc, int(round(fix.latitude * SCALE)), int(round(fix.longitude * SCALE)),
+            fix.altitude or 0.0, fix.speed_kmh or 0.0, course,
+            min(fix.sats or 0, 255), fix.quality or 0, hdop))
+        self._size += RECORD.size
+        self.records += 1
+
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def track_files(directory):
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.startswith("track_") and n.endswith(".trk"))
+    except OSError:
+        return []
+    return [os.path.join(directory, n) for n in names]
+
+
+class _UtcIndex:
+    # Sequenz der Zeitstempel direkt aus dem mmap, für bisect ohne alles zu laden
+    def __init__(self, buf, count):
+        self.buf = buf
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return struct.unpack_from("<d", self.buf, HEADER.size + i * RECORD.size)[0]
+
+
+def read_range(path, start=None, end=None):
+    # Liefert Datensätze (Tupel) mit start <= utc <= end aus einer Datei
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size + RECORD.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            magic, version, recsize = HEADER.unpack_from(buf, 0)
+            if magic != MAGIC or recsize != RECORD.size:
+                raise ValueError(f"{path}: kein Track-Format v{VERSION}")
+            count = (size - HEADER.size) // RECORD.size
+            index = _UtcIndex(buf, count)
+            lo = bisect.bisect_left(index, start) if start is not None else 0
+            hi = bisect.bisect_right(index, end) if end is not None else count
+            # In Blöcken iterieren, damit große Dateien nie komplett im Speicher landen
+            step = 4096
+            for block in range(lo, hi, step):
+                stop = min(block + step, hi)
+                view = memoryview(buf)[HEADER.size + block * RECORD.size:HEADER.size + stop * RECORD.size]
+                try:
+                    yield from RECORD.iter_unpack(view)
+                finally:
+                    view.release()
+
+
+def read_tracks(directory, start=None, end=None):
+    # Nach einem Zeitsprung können sich Dateien zeitlich überlappen: solche Gruppen
+    # werden zusammengeführt, damit der Export chronologisch bleibt
+    group, group_end = [], None
+    for path in track_files(directory):
+        # Dateien, die erst nach dem Ende beginnen, überspringen (Name = Startzeit)
+        if end is not None and _file_start(path) > end:
+            break
+        last = _file_end(path)
+        if last is None or (start is not None and last < start):
+            continue
+        if group and _file_start(path) > group_end:
+            yield from _merge(group, start, end)
+            group = []
+        group_end = last if not group else max(group_end, last)
+        group.append(path)
+    if group:
+        yield from _merge(group, start, end)
+
+
+def _merge(paths, start, end):
+    if len(paths) == 1:
+        return read_range(paths[0], start, end)
+    return heapq.merge(*(read_range(p, start, end) for p in paths), key=lambda rec: rec[0])
+
+
+def _file_start(path):
+    name = os.path.basename(path)[len("track_"):len("track_YYYYmmdd_HHMMSS")]
+    return calendar.timegm(time.strptime(name, "%Y%m%d_%H%M%S"))
+
+
+def _file_end(path):
+    # UTC des letzten Datensatzes oder None bei leerer Datei
+    try:
+        with open(path, "rb") as f:
+            count = (os.fstat(f.fileno()).st_size - HEADER.size) // RECORD.size
+            if count <= 0:
+                return None
+            f.seek(HEADER.size + (count - 1) * RECORD.size)
+            return RECORD.unpack(f.read(RECORD.size))[0]
+    except OSError:
+        return None
+
+
+def _iso(utc):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(utc)) + f".{int(utc % 1 * 1000):03d}Z"
+
+
+def export_gpx(records, out, name="SHARI Track"):
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<gpx version="1.1" creator="shari_aprs" xmlns="http://www.topografix.com/GPX/1/1">\n'
+              f'<trk><name>{name}</name><trkseg>\n')
+    n = 0
+    for utc, lat, lon, alt, speed, course, sats, quality, hdop in records:
+        out.write(f'<trkpt lat="{lat / SCALE:.7f}" lon="{lon / SCALE:.7f}"><ele>{alt:.1f}</ele>'
+                  f'<time>{_iso(utc)}</time><sat>{sats}</sat><hdop>{hdop / 100:.2f}</hdop></trkpt>\n')
+        n += 1
+    out.write('</trkseg></trk>\n</gpx>\n')
+    return n
+
+
+def export_kml(records, out, name="SHARI Track", chunk=65536):
+    # Lange Strecken als mehrere gx:Track, damit der Speicherbedarf begrenzt bleibt
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n'
+              f'<Document><name>{name}</name><Placemark><name>{name}</name><gx:MultiTrack>\n')
+    n = 0
+    when, coords = [], []
+
+    def flush():
+        out.write('<gx:Track><altitudeMode>absolute</altitudeMode>\n')
+        out.write("".join(when))
+        out.write("".join(coords))
+        out.write('</gx:Track>\n')
+        when.clear()
+        coords.clear()
+
+    for utc, lat, lon, alt, speed, course, sats, quality, hdop in records:
+        when.append(f'<when>{_iso(utc)}</when>\n')
+        coords.append(f'<gx:coord>{lon / SCALE:.7f} {lat / SCALE:.7f} {alt:.1f}</gx:coord>\n')
+        n += 1
+        if len(when) >= chunk:
+            flush()
+    if when:
+        flush()
+    out.write('</gx:MultiTrack></Placemark></Document>\n</kml>\n')
+    return n
+
+
+def _parse_time(text):
+    if text is None:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(text, fmt))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Ungültige Zeit (UTC erwartet): {text}")
+
+
+def _cmd_export(args):
+    records = read_tracks(args.dir, _parse_time(args.start), _parse_time(args.end))
+    fmt = args.format or ("kml" if args.output.endswith(".kml") else "gpx")
+    with open(args.output, "w", encoding="utf-8", buffering=1024 * 1024) as out:
+        if fmt == "kml":
+            n = export_kml(records, out)
+        else:
+            n = export_gpx(records, out)
+    print(f"{n} Punkte nach {args.output} exportiert.")
+
+
+def _cmd_info(args):
+    for path in track_files(args.dir):
+        size = os.path.getsize(path)
+        count = max(0, (size - HEADER.size) // RECORD.size)
+        first = None
+        for rec in read_range(path):
+            first = rec[0]
+            break
+        last = _file_end(path)
+        span = f"{_iso(first)} .. {_iso(last)}" if first is not None else "-"
+        print(f"{os.path.basename(path)}  {count:8d} Punkte  {size / 1024:8.0f} KB  {span}")
+
+
+def _cmd_bench(args):
+    import tempfile
+    from gps_reader import GpsFix
+
+    n = int(args.days * 86400 * args.rate)
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = TrackWriter(tmp, max_file_size=args.max_size * 1024, max_files=100000)
+        t0_utc = 1700000000.0
+        fixes = [GpsFix(47.25 + (i % 1000) * 1e-5, 9.6 + (i % 777) * 1e-5, 450.0, 54.0, 0, i,
+                        course=123.0, sats=8, hdop=0.9, utc=0.0) for i in range(1000)]
+        t0 = time.perf_counter()
+        for i in range(n):
+            fix = fixes[i % 1000]
+            fix.utc = t0_utc + i / args.rate
+            writer.add(fix)
+        writer.close()
+        t_write = time.perf_counter() - t0
+        files = track_files(tmp)
+        total = sum(os.path.getsize(p) for p in files)
+        print(f"Schreiben: {n} Fixe ({args.days} Tage bei {args.rate} Hz) in {t_write:.2f}s "
+              f"= {n / t_write:.0f} Fixe/s, {len(files)} Dateien, {total / 1024 / 1024:.1f} MB")
+
+        class _Null:
+            def write(self, s):
+                return len(s)
+
+        for label, start, end in (
+                ("alles", None, None),
+                ("1 Stunde am 2. Tag", t0_utc + 86400 + 3600, t0_utc + 86400 + 7200)):
+            t0 = time.perf_counter()
+            count = export_gpx(read_tracks(tmp, start, end), _Null())
+            dt = time.perf_counter() - t0
+            print(f"GPX-Export {label}: {count} Punkte in {dt:.3f}s = {count / dt:.0f} Punkte/s")
+        t0 = time.perf_counter()
+        count = sum(1 for _ in read_tracks(tmp))
+        dt = time.perf_counter() - t0
+        print(f"Nur Lesen (mmap): {count} Datensätze in {dt:.3f}s = {count / dt:.0f}/s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SHARI Fahrtenbuch")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("export", help="Zeitraum nach GPX/KML exportieren")
+    p.add_argument("--dir", default="tracks")
+    p.add_argument("--from", dest="start", help="Start (UTC), z.B. '2024-05-01 08:00'")
+    p.add_argument("--to", dest="end", help="Ende (UTC)")
+    p.add_argument("--format", choices=("gpx", "kml"))
+    p.add_argument("-o", "--output", required=True)
+    p.set_defaults(func=_cmd_export)
+
+    p = sub.add_parser("info", help="Track-Dateien auflisten")
+    p.add_argument("--dir", default="tracks")
+    p.set_defaults(func=_cmd_info)
+
+    p = sub.add_parser("bench", help="Schreib- und Exportgeschwindigkeit messen")
+    p.add_argument("--days", type=float, default=3)
+    p.add_argument("--rate", type=float, default=1.0, help="Fixe pro Sekunde")
+    p.add_argument("--max-size", type=int, default=4096, help="Dateigröße in KB")
+    p.set_defaults(func=_cmd_bench)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()